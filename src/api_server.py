@@ -0,0 +1,362 @@
+# src/api_server.py
+"""
+Serviço HTTP (sem interface) para consultas ao Kosmos-Synesis.
+
+Endpoints:
+- POST /retrieve: trechos mais relevantes para uma pergunta.
+- POST /answer: resposta do Gemini com base nos trechos (RAG).
+- POST /hypothesis: nova hipótese de pesquisa sobre um tópico.
+- GET /health e GET /metrics (formato do Prometheus).
+
+Todas as requisições compartilham um `RAGEngine` e um `GeminiAPI`. Os
+embeddings das perguntas que chegam juntas são calculados em lote, em uma
+única chamada ao modelo (`QueryEmbeddingBatcher`), e o número de requisições
+em andamento é limitado (`AdmissionControl`): acima do limite elas esperam
+em uma fila curta e, com a fila cheia, recebem 503 com `Retry-After`.
+
+Uso:
+    python src/api_server.py --port 8000
+"""
+
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool
+
+from context_packer import ContextPacker
+from gemini_api import GenerationError
+from metrics import registry
+
+ANSWER_CONTEXT_TOKENS = 3000
+HYPOTHESIS_CONTEXT_TOKENS = 12000
+
+
+class RetrieveRequest(BaseModel):
+    query: str = Field(min_length=1)
+    n_results: int = Field(5, ge=1, le=100)
+    mode: Literal["vector", "lexical", "hybrid"] = "hybrid"
+    partitions: Optional[List[str]] = Field(None, min_length=1)
+
+
+class AnswerRequest(RetrieveRequest):
+    stream: bool = False
+
+
+class HypothesisRequest(AnswerRequest):
+    n_results: int = Field(30, ge=1, le=200)
+    # Síntese hierárquica (map-reduce) dos papers antes da hipótese
+    hierarchical: bool = False
+
+
+class Overloaded(Exception):
+    """
+    O serviço atingiu o limite de requisições em andamento e em espera.
+    """
+
+
+class AdmissionControl:
+    """
+    Limita as requisições em andamento (`max_concurrent`) e as que esperam
+    por uma vaga (`max_queue`). Requisições além disso, ou que esperam mais
+    que `queue_timeout`, são recusadas com `Overloaded`.
+    """
+    def __init__(self, max_concurrent=32, max_queue=256, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class QueryEmbeddingBatcher:
+    """
+    Agrupa os embeddings de perguntas concorrentes em lotes.
+
+    O primeiro pedido abre um lote, que é fechado quando atinge
+    `max_batch_size` ou depois de `max_wait_ms`. Enquanto um lote roda no
+    modelo, os pedidos seguintes se acumulam no próximo, então os lotes
+    crescem sozinhos com a carga.
+    """
+    def __init__(self, rag_eng, executor, max_batch_size=64, max_wait_ms=5.0):
+        self.rag_eng = rag_eng
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    async def embed(self, query):
+        """
+        Retorna o embedding de `query`, calculado junto com os de outras
+        perguntas que chegarem ao mesmo tempo.
+        """
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            queries = [query for query, _ in batch]
+            try:
+                embeddings = await loop.run_in_executor(self.executor, self.rag_eng.embed_queries, queries)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
+def _hits(results):
+    """
+    Converte o resultado de `RAGEngine.retrieve` em uma lista de trechos.
+    """
+    if not results or not results.get("ids") or not results["ids"][0]:
+        return []
+    scores = results.get("scores") or results.get("distances")
+    key = "score" if results.get("scores") else "distance"
+    return [
+        {"id": chunk_id, "document": document, "metadata": metadata, key: scores[0][i] if scores else None}
+        for i, (chunk_id, document, metadata) in enumerate(zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0]
+        ))
+    ]
+
+
+def create_app(rag_eng=None, gemini_api=None, max_concurrent=32, max_queue=256, queue_timeout=10.0,
+               max_batch_size=64, max_wait_ms=5.0):
+    """
+    Cria a aplicação FastAPI.
+
+    Args:
+        rag_eng (RAGEngine): Motor de busca compartilhado. Se None, é criado
+                             na inicialização do serviço.
+        gemini_api (GeminiAPI): Cliente do Gemini compartilhado. Se None, é
+                                criado na inicialização (requer GEMINI_API_KEY).
+        max_concurrent (int): Requisições processadas ao mesmo tempo.
+        max_queue (int): Requisições em espera antes de recusar com 503.
+        queue_timeout (float): Espera máxima (s) por uma vaga.
+        max_batch_size (int): Perguntas por lote de embedding.
+        max_wait_ms (float): Espera máxima (ms) para completar um lote.
+
+    Returns:
+        FastAPI: A aplicação.
+    """
+    state = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if rag_eng is None or gemini_api is None:
+            from gemini_api import GeminiAPI
+            from rag_engine import RAGEngine
+            from response_cache import SemanticResponseCache
+            from summary_cache import SummaryCache
+            response_cache = SemanticResponseCache()
+            state["rag_eng"] = rag_eng or RAGEngine(db_path=os.getenv("CHROMADB_PATH", "data/embeddings"))
+            state["rag_eng"].add_change_listener(response_cache.invalidate_chunks)
+            state["gemini_api"] = gemini_api or GeminiAPI(response_cache=response_cache,
+                                                          summary_cache=SummaryCache())
+        else:
+            state["rag_eng"], state["gemini_api"] = rag_eng, gemini_api
+        state["rag_eng"].warmup(background=True)
+        state["gemini_api"].warmup(background=True)
+        # Uma thread por requisição em andamento (busca e Gemini são bloqueantes),
+        # mais uma para os lotes de embedding
+        state["executor"] = ThreadPoolExecutor(max_workers=max_concurrent + 1, thread_name_prefix="api")
+        state["admission"] = AdmissionControl(max_concurrent, max_queue, queue_timeout)
+        state["batcher"] = QueryEmbeddingBatcher(state["rag_eng"], state["executor"],
+                                                 max_batch_size, max_wait_ms)
+        yield
+        await state["batcher"].close()
+        state["executor"].shutdown(wait=False)
+
+    app = FastAPI(title="Kosmos-Synesis", lifespan=lifespan)
+
+    @app.exception_handler(Overloaded)
+    async def overloaded(request, exc):
+        registry.inc("kosmos_api_requests_total", endpoint=request.url.path, status="503")
+        return JSONResponse({"detail": "Serviço sobrecarregado, tente novamente."}, status_code=503,
+                            headers={"Retry-After": "1"})
+
+    async def run_blocking(function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(state["executor"], lambda: function(*args, **kwargs))
+
+    async def retrieve(body):
+        rag = state["rag_eng"]
+        if body.partitions is not None:
+            # Erros do cliente viram 400; `RAGEngine.retrieve` só informaria uma falha genérica
+            available = await run_blocking(rag.partitions)
+            if not available:
+                raise HTTPException(status_code=400, detail="O índice não é particionado.")
+            unknown = sorted(set(body.partitions) - set(available))
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Partições desconhecidas: {', '.join(unknown)}.")
+        query_embedding = None
+        if body.mode != "lexical":
+            query_embedding = await state["batcher"].embed(body.query)
+        results = await run_blocking(rag.retrieve, body.query, n_results=body.n_results, mode=body.mode,
+                                     partitions=body.partitions, query_embedding=query_embedding)
+        if results is None:
+            raise HTTPException(status_code=500, detail="Erro durante a busca.")
+        return results, query_embedding
+
+    async def generate(endpoint, body, max_tokens, method):
+        """
+        Busca, empacota (ou sintetiza, com `hierarchical`) o contexto e gera o
+        texto com `method` (generate_response ou generate_hypothesis),
+        liberando a vaga da requisição ao final.
+        """
+        admission = state["admission"]
+        await admission.acquire()
+        released = False
+        try:
+            with registry.span("api_request", endpoint=endpoint):
+                results, query_embedding = await retrieve(body)
+                if getattr(body, "hierarchical", False):
+                    # Resumos por paper e sínteses entre papers (ver GeminiAPI.synthesize_context)
+                    packed = await run_blocking(state["gemini_api"].synthesize_context, body.query, results)
+                else:
+                    packed = ContextPacker(max_tokens=max_tokens).pack(results)
+                if not packed["docs"]:
+                    raise HTTPException(status_code=404,
+                                        detail="Nenhum trecho relevante encontrado nos papers indexados.")
+                if query_embedding is None:
+                    query_embedding = await state["batcher"].embed(body.query)
+                output = await run_blocking(method, body.query, packed["docs"], stream=body.stream,
+                                            query_embedding=query_embedding, chunk_ids=packed["ids"])
+                first = None
+                if body.stream:
+                    # O primeiro trecho é lido antes de responder, para que uma
+                    # falha do Gemini vire 502 em vez de um 200 com a mensagem de erro
+                    first = await run_blocking(next, output, None)
+                    failed = output.failed
+                else:
+                    failed = isinstance(output, GenerationError)
+                if failed:
+                    raise HTTPException(status_code=502, detail=str(first if body.stream else output))
+            registry.inc("kosmos_api_requests_total", endpoint=endpoint, status="200")
+            if not body.stream:
+                return {"text": output, "citations": packed["citations"], "chunk_ids": packed["ids"],
+                        "tokens_sent": packed["tokens_sent"], "tokens_dropped": packed["tokens_dropped"]}
+
+            async def chunks():
+                # A vaga só é liberada quando o texto termina de ser enviado
+                try:
+                    if first is not None:
+                        yield first
+                    async for part in iterate_in_threadpool(output):
+                        yield part
+                finally:
+                    admission.release()
+
+            released = True
+            return StreamingResponse(chunks(), media_type="text/plain; charset=utf-8")
+        except HTTPException as e:
+            registry.inc("kosmos_api_requests_total", endpoint=endpoint, status=str(e.status_code))
+            raise
+        finally:
+            if not released:
+                admission.release()
+
+    @app.post("/retrieve")
+    async def retrieve_endpoint(body: RetrieveRequest):
+        await state["admission"].acquire()
+        try:
+            with registry.span("api_request", endpoint="/retrieve"):
+                results, _ = await retrieve(body)
+            registry.inc("kosmos_api_requests_total", endpoint="/retrieve", status="200")
+            return {"hits": _hits(results)}
+        except HTTPException as e:
+            registry.inc("kosmos_api_requests_total", endpoint="/retrieve", status=str(e.status_code))
+            raise
+        finally:
+            state["admission"].release()
+
+    @app.post("/answer")
+    async def answer_endpoint(body: AnswerRequest):
+        return await generate("/answer", body, ANSWER_CONTEXT_TOKENS, state["gemini_api"].generate_response)
+
+    @app.post("/hypothesis")
+    async def hypothesis_endpoint(body: HypothesisRequest):
+        return await generate("/hypothesis", body, HYPOTHESIS_CONTEXT_TOKENS,
+                              state["gemini_api"].generate_hypothesis)
+
+    @app.get("/health")
+    async def health():
+        admission = state["admission"]
+        return {"status": "ok", "active": admission.active, "waiting": admission.waiting,
+                "max_concurrent": admission.max_concurrent, "max_queue": admission.max_queue}
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serviço HTTP de consultas do Kosmos-Synesis.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrent", type=int, default=32,
+                        help="Requisições processadas ao mesmo tempo.")
+    parser.add_argument("--max-queue", type=int, default=256,
+                        help="Requisições em espera antes de responder 503.")
+    parser.add_argument("--queue-timeout", type=float, default=10.0, help="Espera máxima (s) por uma vaga.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Perguntas por lote de embedding.")
+    parser.add_argument("--batch-wait-ms", type=float, default=5.0,
+                        help="Espera máxima (ms) para completar um lote de embedding.")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(max_concurrent=args.max_concurrent, max_queue=args.max_queue,
+                           queue_timeout=args.queue_timeout, max_batch_size=args.batch_size,
+                           max_wait_ms=args.batch_wait_ms),
+                host=args.host, port=args.port)
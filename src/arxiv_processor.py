@@ -4,70 +4,355 @@ Módulo responsável por interagir com a API do arXiv e processar os papers.
 
 Funcionalidades:
 - Buscar artigos no arXiv por palavra-chave.
-- Baixar o PDF do artigo.
-- Extrair texto e metadados do PDF usando PyMuPDF.
-- Salvar o conteúdo processado para uso posterior.
+- Baixar os PDFs em paralelo, de forma retomável (ver `bulk_downloader`).
+- Registrar os papers vistos no índice de metadados (ver `paper_store`) e
+  sincronizar buscas salvas de forma incremental.
+- Extrair texto e metadados do PDF usando PyMuPDF, página a página ou em
+  lote com um pool de processos.
+- Salvar o conteúdo processado para uso posterior (ver `extraction_cache`).
 """
 
-import arxiv
-import fitz  # PyMuPDF
+import multiprocessing
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from bulk_downloader import BulkDownloader
+from extraction_cache import ExtractionCache, read_pages, write_pages
+from metrics import registry
+from paper_store import PaperStore
+
+# `arxiv` e `fitz` (PyMuPDF) são importados apenas quando usados, para não
+# pesar na inicialização da aplicação.
+
+# Deve ser incrementada sempre que a extração mudar de forma a alterar o texto
+# produzido, invalidando as entradas antigas do cache.
+EXTRACTOR_REVISION = 1
+
+
+@lru_cache(maxsize=None)
+def extractor_version():
+    """
+    Versão do extrator usada na chave do cache: revisão local + versão do PyMuPDF.
+    """
+    import fitz
+    return f"pymupdf-{getattr(fitz, 'VersionBind', 'unknown')}-v{EXTRACTOR_REVISION}"
+
+
+def iter_pdf_pages(filepath):
+    """
+    Gera (número_da_página, texto) de um PDF, carregando uma página por vez.
+    A memória usada não depende do tamanho do documento.
+    """
+    import fitz  # PyMuPDF
+    doc = fitz.open(filepath)
+    try:
+        for page_index in range(doc.page_count):
+            page = doc.load_page(page_index)
+            yield page_index + 1, page.get_text()
+    finally:
+        doc.close()
+
+
+def _extract_worker(filepath, output_path, compression):
+    """
+    Extrai o texto de um PDF em um processo do pool, gravando-o página a
+    página em `output_path` (ver `extraction_cache.write_pages`), de modo que
+    nem o worker nem o processo principal mantêm o documento inteiro em memória.
+
+    Retorna (filepath, páginas, erro, segundos) para que falhas não derrubem o lote.
+    """
+    started = time.perf_counter()
+    try:
+        n_pages, _ = write_pages(output_path, (text for _, text in iter_pdf_pages(filepath)), compression)
+        return filepath, n_pages, None, time.perf_counter() - started
+    except Exception as e:
+        return filepath, 0, str(e), time.perf_counter() - started
+
 
 class ArxivProcessor:
     """
     Processa papers do arXiv, desde a busca até a extração de texto.
     """
-    def __init__(self, data_path="data/papers"):
+    def __init__(self, data_path="data/papers", cache_dir="data/cache/extraction",
+                 store_path="data/papers.sqlite3"):
+        """
+        Args:
+            data_path (str): Diretório onde os PDFs são salvos.
+            cache_dir (str): Diretório do cache de texto extraído. None desativa o cache.
+            store_path (str): Arquivo SQLite do índice de metadados dos papers.
+                              None desativa o índice (e a sincronização incremental).
+        """
         self.data_path = data_path
         if not os.path.exists(self.data_path):
             os.makedirs(self.data_path)
+        self.cache = ExtractionCache(cache_dir) if cache_dir else None
+        self.store = PaperStore(store_path) if store_path else None
 
-    def search_and_download(self, query, max_results=1000):
+    def search_and_download(self, query, max_results=1000, max_workers=4, min_interval=1.0,
+                            on_result=None, stop_event=None):
         """
         Busca papers no arXiv e baixa os PDFs.
         Retorna uma lista de metadados dos papers baixados.
+
+        Os downloads são feitos por um pool limitado de threads, respeitando um
+        intervalo mínimo entre requisições. PDFs já presentes em `data_path`
+        (conferidos pelo manifesto) não são baixados de novo, então uma busca
+        interrompida pode simplesmente ser repetida.
+
+        Args:
+            query (str): Termos de busca.
+            max_results (int): Número máximo de papers.
+            max_workers (int): Downloads simultâneos.
+            min_interval (float): Intervalo mínimo (s) entre requisições de PDF.
+            on_result (callable): Chamado com o status ("downloaded", "skipped"
+                                  ou "error") de cada paper concluído.
+            stop_event (threading.Event): Interrompe a busca e novos downloads
+                                          quando sinalizado.
         """
+        import arxiv
         # Expandido de 5 para 1000 papers por busca.
         search = arxiv.Search(
             query=query,
             max_results=max_results,
             sort_by=arxiv.SortCriterion.SubmittedDate
         )
+        return self._download_results(query, search.results(), max_workers, min_interval, on_result, stop_event)
+
+    def sync_and_download(self, query, max_results=1000, max_workers=4, min_interval=1.0,
+                          on_result=None, stop_event=None):
+        """
+        Sincronização incremental de uma busca salva: baixa apenas os papers
+        publicados ou atualizados (nova versão) depois da marca d'água da busca.
+
+        A busca é ordenada pela data de atualização, da mais recente para a mais
+        antiga, e para ao alcançar a marca d'água. Papers cuja versão já está
+        indexada são pulados sem download. Na primeira sincronização, são
+        considerados os `max_results` papers mais recentes.
+
+        A marca d'água não é gravada aqui: o chamador deve gravar a retornada
+        em `store.set_watermark` depois de indexar os papers com sucesso.
+
+        Args:
+            Os mesmos de `search_and_download`. Nas sincronizações seguintes,
+            `max_results` limita os papers novos por execução; se o limite for
+            atingido, a marca d'água não avança e a próxima execução continua
+            de onde esta parou.
+
+        Returns:
+            tuple: (papers, marca_d_água). Papers com uma versão anterior já
+                   conhecida trazem a chave `replaces` com o `id` da versão
+                   substituída. A marca d'água é None se não deve avançar.
+        """
+        import arxiv
+        if self.store is None:
+            raise ValueError("A sincronização incremental requer o índice de metadados (store_path).")
+        watermark = self.store.get_watermark(query)
+        search = arxiv.Search(
+            query=query,
+            max_results=None if watermark else max_results,
+            sort_by=arxiv.SortCriterion.LastUpdatedDate,
+            sort_order=arxiv.SortOrder.Descending
+        )
+        state = {"newest": watermark, "truncated": False}
+
+        def changed():
+            count = 0
+            for result in search.results():
+                if watermark is not None and result.updated <= watermark:
+                    break
+                if state["newest"] is None or result.updated > state["newest"]:
+                    state["newest"] = result.updated
+                if self.store.is_indexed(result.entry_id):
+                    continue
+                if count >= max_results:
+                    state["truncated"] = True
+                    break
+                count += 1
+                yield result
+
+        papers = self._download_results(query, changed(), max_workers, min_interval, on_result, stop_event)
+        new_watermark = state["newest"]
+        if state["truncated"] and watermark is not None:
+            new_watermark = None
+        print(f"Sincronização de '{query}': {len(papers)} papers novos ou atualizados.")
+        return papers, new_watermark
+
+    def _download_results(self, query, results, max_workers, min_interval, on_result, stop_event):
+        """
+        Baixa os PDFs de resultados do `arxiv` e registra os papers no índice
+        de metadados.
+        """
+        downloader = BulkDownloader(self.data_path, max_workers=max_workers, min_interval=min_interval)
+
+        def items():
+            for result in results:
+                short_id = result.entry_id.split('/')[-1]
+                yield short_id, result.pdf_url, f"{short_id}.pdf", result
+
+        def report(result, filepath, status):
+            if on_result is not None:
+                on_result(status)
 
         downloaded_papers = []
-        for result in search.results():
-            try:
-                filename = f"{result.entry_id.split('/')[-1]}.pdf"
-                filepath = os.path.join(self.data_path, filename)
-                result.download_pdf(dirpath=self.data_path, filename=filename)
-                print(f"Paper '{result.title.encode('ascii', 'ignore').decode('ascii')}' baixado em: {filepath}")
-                downloaded_papers.append({
-                    "id": result.entry_id,
-                    "title": result.title,
-                    "summary": result.summary,
-                    "authors": [author.name for author in result.authors],
-                    "published": result.published,
-                    "filepath": filepath
-                })
-            except Exception as e:
-                print(f"Erro ao baixar o paper '{result.title.encode('ascii', 'ignore').decode('ascii')}': {e}")
+        for result, filepath, status in downloader.download_all(items(), on_result=report, stop_event=stop_event):
+            if status == "error":
+                continue
+            title = result.title.encode('ascii', 'ignore').decode('ascii')
+            if status == "skipped":
+                print(f"Paper '{title}' já presente em: {filepath}")
+            else:
+                print(f"Paper '{title}' baixado em: {filepath}")
+            paper = {
+                "id": result.entry_id,
+                "title": result.title,
+                "summary": result.summary,
+                "authors": [author.name for author in result.authors],
+                "published": result.published,
+                "updated": result.updated,
+                "primary_category": result.primary_category,
+                "filepath": filepath
+            }
+            if self.store is not None:
+                store_status, previous = self.store.record(paper, query=query)
+                if store_status == "new_version":
+                    paper["replaces"] = previous
+            downloaded_papers.append(paper)
         return downloaded_papers
 
     def extract_text_from_pdf(self, filepath):
         """
         Extrai o texto de um arquivo PDF.
+        As páginas são separadas por form feed (`\\f`), o que permite ao
+        `chunker` recuperar o número da página de cada trecho.
         """
         try:
-            doc = fitz.open(filepath)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
+            key = self._cache_key(filepath)
+            if key is not None:
+                text = self.cache.get(key)
+                if text is not None:
+                    return text
+            with registry.span("extract"):
+                text = "\f".join(text for _, text in iter_pdf_pages(filepath))
+            registry.inc("kosmos_pages_extracted_total", text.count("\f") + 1)
+            if key is not None:
+                self.cache.put(key, text)
             return text
         except Exception as e:
             print(f"Erro ao extrair texto de '{filepath}': {e}")
             return None
 
+    def iter_pages(self, filepath):
+        """
+        Extrai o texto página a página, como um gerador de (número, texto).
+        Permite que chunking e embedding comecem antes do fim do documento.
+        """
+        return iter_pdf_pages(filepath)
+
+    def extract_pages_parallel(self, filepaths, max_workers=None):
+        """
+        Extrai o texto de vários PDFs em um pool de processos, entregando cada
+        documento como um gerador de páginas.
+
+        Os workers gravam as páginas em disco (no cache de extração ou, sem
+        cache, em arquivos temporários) à medida que as extraem, e as páginas
+        são lidas de volta sob demanda. Assim, a memória usada não depende do
+        tamanho dos documentos. No máximo `2 * max_workers` documentos ficam em
+        andamento ao mesmo tempo, e os resultados são gerados à medida que
+        ficam prontos (não na ordem de entrada). PDFs já presentes no cache
+        são devolvidos sem passar pelo pool.
+
+        O pool usa o método de início "spawn": os jobs de ingestão o criam a
+        partir de threads, e um `fork` com outras threads ativas pode deixar o
+        processo filho travado em um lock herdado.
+
+        Args:
+            filepaths (iterable): Caminhos dos PDFs.
+            max_workers (int): Número de processos. Se None, usa o número de CPUs.
+
+        Yields:
+            tuple: (filepath, páginas), com as páginas como um gerador de
+                   (número_da_página, texto), ou None se a extração falhar.
+                   Sem cache, os arquivos temporários são removidos quando
+                   a iteração termina, então as páginas devem ser lidas antes.
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        max_pending = max_workers * 2
+        spool_dir = tempfile.mkdtemp(prefix="extract-") if self.cache is None else None
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                pending = {}
+                for index, filepath in enumerate(filepaths):
+                    try:
+                        key = self._cache_key(filepath)
+                    except OSError as e:
+                        print(f"Erro ao extrair texto de '{filepath}': {e}")
+                        yield filepath, None
+                        continue
+                    pages = self.cache.iter_pages(key) if key is not None else None
+                    if pages is not None:
+                        yield filepath, pages
+                        continue
+                    if key is not None:
+                        output_path, compression = self.cache.entry_path(key), self.cache.compression
+                    else:
+                        output_path, compression = os.path.join(spool_dir, f"{index}.txt"), None
+                    future = executor.submit(_extract_worker, filepath, output_path, compression)
+                    pending[future] = (key, output_path, compression)
+                    if len(pending) >= max_pending:
+                        done = next(as_completed(pending))
+                        yield self._unpack_extraction(done, *pending.pop(done))
+                for done in as_completed(list(pending)):
+                    yield self._unpack_extraction(done, *pending.pop(done))
+        finally:
+            if spool_dir is not None:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+
+    def extract_texts_parallel(self, filepaths, max_workers=None):
+        """
+        Como `extract_pages_parallel`, mas entrega o texto completo de cada
+        documento (páginas separadas por `\\f`). Conveniente para lotes
+        pequenos; para indexar, prefira as páginas, que não ocupam memória
+        proporcional ao tamanho do documento.
+
+        Yields:
+            tuple: (filepath, texto). O texto é None se a extração falhar.
+        """
+        for filepath, pages in self.extract_pages_parallel(filepaths, max_workers=max_workers):
+            yield filepath, "\f".join(text for _, text in pages) if pages is not None else None
+
+    def _cache_key(self, filepath):
+        if self.cache is None:
+            return None
+        return ExtractionCache.key_for(filepath, extractor_version())
+
+    def _unpack_extraction(self, future, key, output_path, compression):
+        filepath, n_pages, error, seconds = future.result()
+        # A extração roda em outro processo; a duração medida lá é registrada aqui
+        registry.observe("kosmos_span_seconds", seconds, span="extract")
+        if error is not None:
+            registry.inc("kosmos_errors_total", stage="extract")
+            print(f"Erro ao extrair texto de '{filepath}': {error}")
+            return filepath, None
+        registry.inc("kosmos_pages_extracted_total", n_pages)
+        if key is not None:
+            self.cache.add_entry(key)
+            return filepath, read_pages(open(output_path, "rb"), compression)
+        return filepath, self._spooled_pages(output_path)
+
+    @staticmethod
+    def _spooled_pages(path):
+        """
+        Páginas de um arquivo temporário da extração, removido após a leitura.
+        """
+        try:
+            yield from read_pages(open(path, "rb"))
+        finally:
+            os.remove(path)
+
 if __name__ == '__main__':
     # Exemplo de uso
     processor = ArxivProcessor()
@@ -0,0 +1,235 @@
+# src/async_gemini.py
+"""
+Cliente assíncrono e concorrente para a API do Google Gemini.
+
+Responsabilidades:
+- Limitar o número de chamadas simultâneas (semáforo).
+- Respeitar a cota de requisições por minuto (token bucket).
+- Repetir chamadas com erros transitórios, com backoff exponencial e jitter.
+- Disparar muitos prompts em lote (ex.: sumarizar 200 papers) e reunir os resultados.
+
+Os prompts são os mesmos de `GeminiAPI`. O modelo pode ser injetado, o que
+permite testar com um objeto falso que implemente `generate_content`.
+"""
+
+import asyncio
+import random
+import time
+
+from gemini_api import GeminiAPI, GenerationError, record_tokens
+from metrics import registry
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _RETRYABLE_EXCEPTIONS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+except ImportError:  # google-api-core vem com google-generativeai
+    _RETRYABLE_EXCEPTIONS = ()
+
+_RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    """
+    Indica se um erro da API é transitório e vale uma nova tentativa.
+    """
+    if isinstance(error, _RETRYABLE_EXCEPTIONS + (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return isinstance(code, int) and code in _RETRYABLE_STATUS_CODES
+
+
+class AsyncTokenBucket:
+    """
+    Rate limiter do tipo token bucket para corrotinas.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Tokens repostos por segundo.
+            capacity (float): Tamanho máximo de rajada. Se None, usa `rate`
+                              (no mínimo 1).
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1.0):
+        """
+        Aguarda até haver `tokens` disponíveis e os consome.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class AsyncGeminiAPI:
+    """
+    Variante assíncrona de `GeminiAPI`, para muitas chamadas concorrentes.
+    """
+    def __init__(self, model=None, max_concurrency=8, requests_per_minute=60,
+                 max_retries=5, base_delay=1.0, max_delay=30.0, timeout=120.0):
+        """
+        Args:
+            model: Objeto com `generate_content` (e opcionalmente
+                   `generate_content_async`). Se None, usa o modelo escolhido
+                   por `GeminiAPI`.
+            max_concurrency (int): Máximo de chamadas em andamento.
+            requests_per_minute (float): Cota de requisições por minuto.
+            max_retries (int): Novas tentativas para erros transitórios.
+            base_delay (float): Espera (s) antes da primeira nova tentativa.
+            max_delay (float): Espera máxima (s) entre tentativas.
+            timeout (float): Timeout (s) de cada chamada. Uma chamada síncrona
+                             (em thread) que estoura o timeout não pode ser
+                             interrompida: ela é repetida, mas continua
+                             ocupando uma vaga de `max_concurrency` até
+                             terminar.
+        """
+        self.model = model if model is not None else GeminiAPI().model
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        # Criados sob demanda para o event loop em uso
+        self._loop = None
+        self._semaphore = None
+        self._bucket = None
+
+    async def generate(self, prompt):
+        """
+        Envia um prompt e retorna o texto gerado.
+
+        Raises:
+            Exception: O último erro, se as tentativas se esgotarem ou o erro
+                       não for transitório.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bucket = AsyncTokenBucket(self.requests_per_minute / 60.0)
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            try:
+                with registry.span("gemini_generate"):
+                    response = await self._call(prompt)
+                text = getattr(response, 'text', str(response))
+                record_tokens(prompt, text, getattr(response, "usage_metadata", None))
+                return text
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                # Backoff exponencial com "full jitter"
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                print(f"Erro transitório na API da Gemini ({e}); tentativa {attempt} em {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def _call(self, prompt):
+        await self._semaphore.acquire()
+        if hasattr(self.model, "generate_content_async"):
+            try:
+                return await asyncio.wait_for(self.model.generate_content_async(prompt), self.timeout)
+            finally:
+                self._semaphore.release()
+        # O timeout não interrompe a thread; a vaga no semáforo só é liberada
+        # quando a chamada termina de fato, e não quando desistimos de esperar
+        call = asyncio.ensure_future(asyncio.to_thread(self.model.generate_content, prompt))
+        call.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(call), self.timeout)
+
+    def _release(self, call):
+        self._semaphore.release()
+        # Consome o erro de uma chamada abandonada, que ninguém mais aguarda
+        if not call.cancelled():
+            call.exception()
+
+    async def generate_batch(self, prompts, return_exceptions=True):
+        """
+        Envia vários prompts concorrentemente, respeitando os limites configurados.
+
+        Args:
+            prompts (iterable): Prompts a enviar.
+            return_exceptions (bool): Se True, erros são devolvidos na posição do
+                                      prompt correspondente em vez de propagados.
+
+        Returns:
+            list: Textos gerados (ou exceções), na ordem dos prompts.
+        """
+        return await asyncio.gather(
+            *(self.generate(prompt) for prompt in prompts),
+            return_exceptions=return_exceptions
+        )
+
+    async def generate_response(self, query, context_docs):
+        """
+        Versão assíncrona de `GeminiAPI.generate_response`. Em caso de falha,
+        retorna um `GenerationError`.
+        """
+        try:
+            return await self.generate(GeminiAPI.build_response_prompt(query, context_docs))
+        except Exception as e:
+            print(f"Erro ao gerar resposta com a API da Gemini: {e}")
+            return GenerationError("Ocorreu um erro ao contatar a API da Gemini.")
+
+    async def generate_hypothesis(self, topic, context_docs):
+        """
+        Versão assíncrona de `GeminiAPI.generate_hypothesis`. Em caso de falha,
+        retorna um `GenerationError`.
+        """
+        try:
+            return await self.generate(GeminiAPI.build_hypothesis_prompt(topic, context_docs))
+        except Exception as e:
+            print(f"Erro ao gerar hipótese com a API da Gemini: {e}")
+            return GenerationError("Ocorreu um erro ao gerar a hipótese.")
+
+    async def summarize_papers(self, papers):
+        """
+        Sumariza muitos papers em paralelo.
+
+        Args:
+            papers (list): Dicionários com "title" e "text".
+
+        Returns:
+            list: Resumos na ordem dos papers; None para os que falharam.
+        """
+        prompts = [GeminiAPI.build_summary_prompt(paper["title"], paper["text"]) for paper in papers]
+        results = await self.generate_batch(prompts)
+        summaries = []
+        for paper, result in zip(papers, results):
+            if isinstance(result, Exception):
+                print(f"Erro ao sumarizar '{paper['title']}': {result}")
+                summaries.append(None)
+            else:
+                summaries.append(result)
+        return summaries
+
+
+if __name__ == '__main__':
+    # Exemplo com um modelo falso, sem acesso à rede
+    class FakeModel:
+        def generate_content(self, prompt):
+            time.sleep(0.1)
+            return type("Response", (), {"text": f"resumo de {len(prompt)} caracteres"})()
+
+    client = AsyncGeminiAPI(model=FakeModel(), max_concurrency=4, requests_per_minute=600)
+    papers = [{"title": f"Paper {i}", "text": "texto " * i} for i in range(10)]
+    started = time.perf_counter()
+    print(asyncio.run(client.summarize_papers(papers)))
+    print(f"{len(papers)} resumos em {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,69 @@
+# src/benchmark_utils.py
+"""
+Utilitários comuns aos benchmarks e ao teste de carga.
+
+Responsabilidades:
+- Gerar um corpus sintético e determinístico de passagens e perguntas.
+- Calcular percentis de latência.
+
+Só usa a biblioteca padrão, para que ferramentas leves como o `load_test`
+não importem numpy, PyMuPDF ou os backends de embedding.
+"""
+
+import math
+import random
+
+_TOPICS = [
+    "large language models", "graph neural networks", "diffusion models", "reinforcement learning",
+    "quantum error correction", "dark matter halos", "protein folding", "gravitational waves",
+    "topological insulators", "federated learning", "speech recognition", "climate modeling",
+    "exoplanet atmospheres", "superconductivity", "neural machine translation", "causal inference",
+    "image segmentation", "retrieval-augmented generation", "spiking neural networks", "cosmic inflation",
+]
+_METHODS = [
+    "a transformer encoder", "contrastive pretraining", "Monte Carlo simulation", "variational inference",
+    "a convolutional architecture", "Bayesian optimization", "density functional theory",
+    "a mixture of experts", "knowledge distillation", "sparse attention",
+]
+_FINDINGS = [
+    "improves accuracy by a wide margin", "reduces the computational cost", "scales to larger datasets",
+    "is robust to distribution shift", "matches the theoretical prediction", "reveals an unexpected phase transition",
+    "lowers the sample complexity", "generalizes to unseen domains",
+]
+_TEMPLATES = [
+    "We study {topic} using {method} and show that it {finding}.",
+    "In this work on {topic}, {method} {finding} compared with previous baselines.",
+    "Our experiments on {topic} demonstrate that {method} {finding}.",
+    "A new approach to {topic} based on {method} {finding} across several benchmarks.",
+]
+
+
+def build_corpus(n_docs=1000, n_queries=100, seed=13):
+    """
+    Gera um corpus sintético e determinístico de passagens e perguntas.
+
+    Returns:
+        tuple: (passagens, perguntas).
+    """
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n_docs):
+        sentences = [
+            rng.choice(_TEMPLATES).format(topic=rng.choice(_TOPICS), method=rng.choice(_METHODS),
+                                          finding=rng.choice(_FINDINGS))
+            for _ in range(rng.randint(2, 5))
+        ]
+        docs.append(" ".join(sentences))
+    queries = [
+        f"How does {rng.choice(_METHODS)} help with {rng.choice(_TOPICS)}?"
+        for _ in range(n_queries)
+    ]
+    return docs, queries
+
+
+def percentile(values, fraction):
+    """
+    Percentil pelo método do posto mais próximo.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
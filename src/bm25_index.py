@@ -0,0 +1,260 @@
+# src/bm25_index.py
+"""
+Índice invertido persistente com ranking BM25.
+
+Responsabilidades:
+- Tokenizar o texto preservando termos técnicos (IDs do arXiv, "gpt-4", "self-attention").
+- Manter as listas de postings em SQLite, atualizadas de forma incremental.
+- Ranquear documentos com BM25 para uma query.
+
+É usado pelo `RAGEngine` ao lado do ChromaDB para o modo de busca híbrido.
+
+O mesmo arquivo pode ser escrito e lido por vários processos (ex.: um worker
+Celery indexa enquanto a interface e o serviço HTTP consultam). Por isso o
+número de documentos e a soma dos tamanhos ficam na tabela `stats`,
+atualizada na mesma transação que os documentos, e cada busca os lê na mesma
+transação de leitura que os postings.
+
+Para que a busca não percorra a lista inteira de termos muito frequentes, o
+tamanho do documento é repetido em cada posting, o df de cada termo fica na
+tabela `terms` e os postings de cada termo são guardados em ordem decrescente
+de tf. Assim a busca lê no máximo `max_postings` postings por termo, em
+sequência e sem junção com `docs`.
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+_TERM_RE = re.compile(r"[a-z0-9]+(?:[-.'][a-z0-9]+)*")
+_VERSIONED_ARXIV_ID_RE = re.compile(r"(\d{4}\.\d{4,5})v\d+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were which with we our their these those can also not".split()
+)
+
+
+def tokenize(text):
+    """
+    Converte texto em termos para o índice.
+    Termos compostos ("self-attention") também geram suas partes, e IDs do arXiv
+    com versão ("2305.12345v2") também geram o ID sem versão.
+    """
+    terms = []
+    for term in _TERM_RE.findall(text.lower()):
+        if term in _STOPWORDS:
+            continue
+        terms.append(term)
+        if "-" in term:
+            terms.extend(part for part in term.split("-") if part and part not in _STOPWORDS)
+        versioned = _VERSIONED_ARXIV_ID_RE.fullmatch(term)
+        if versioned:
+            terms.append(versioned.group(1))
+    return terms
+
+
+class BM25Index:
+    """
+    Índice BM25 persistido em um arquivo SQLite.
+    """
+    # Versão do esquema em `PRAGMA user_version`; índices antigos são migrados ao abrir
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path, k1=1.2, b=0.75, max_postings=2000):
+        """
+        Args:
+            path (str): Caminho do arquivo SQLite.
+            k1 (float): Saturação da frequência do termo.
+            b (float): Peso da normalização pelo tamanho do documento.
+            max_postings (int): Postings lidos por termo da query, os de maior
+                                tf. Só afeta termos presentes em mais
+                                documentos que isso, cujo idf é baixo. None lê
+                                todos (BM25 exato).
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_postings = max_postings
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                n_docs INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+            """
+        )
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                self._migrate()
+            # Índices criados antes da tabela `stats` têm os totais calculados uma vez
+            self._conn.execute(
+                "INSERT OR IGNORE INTO stats (id, n_docs, total_length) "
+                "SELECT 0, COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+            )
+
+    def _migrate(self):
+        # Os postings ficam ordenados, dentro de cada termo, do maior para o
+        # menor tf, o que permite ler só os primeiros. O tamanho do documento
+        # fica fora da chave: com o doc_id logo após o tf, os postings de um
+        # documento novo entram no fim do trecho de cada termo, e a ingestão
+        # não fica mais lenta. Índices anteriores à versão 1 (postings por
+        # (term, doc_id), sem df) são convertidos.
+        self._conn.execute(
+            """
+            CREATE TABLE postings_v1 (
+                term TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                doc_id TEXT NOT NULL,
+                PRIMARY KEY (term, tf DESC, doc_id)
+            ) WITHOUT ROWID
+            """
+        )
+        exists = self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'postings'")
+        if exists.fetchone():
+            self._conn.execute(
+                "INSERT INTO postings_v1 (term, tf, length, doc_id) "
+                "SELECT p.term, p.tf, d.length, p.doc_id FROM postings p JOIN docs d USING (doc_id)"
+            )
+            self._conn.execute("DROP TABLE postings")
+        self._conn.execute("ALTER TABLE postings_v1 RENAME TO postings")
+        self._conn.execute("CREATE INDEX postings_doc ON postings (doc_id)")
+        self._conn.execute("DELETE FROM terms")
+        self._conn.execute("INSERT INTO terms (term, df) SELECT term, COUNT(*) FROM postings GROUP BY term")
+        self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def count(self):
+        """
+        Número de documentos indexados.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT n_docs FROM stats").fetchone()[0]
+
+    def add_documents(self, doc_ids, texts):
+        """
+        Insere ou substitui documentos em uma única transação.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            n_docs, total_length, df = 0, 0, Counter()
+            for doc_id, text in zip(doc_ids, texts):
+                removed = self._delete(doc_id, df)
+                if removed is not None:
+                    n_docs -= 1
+                    total_length -= removed
+                term_counts = Counter(tokenize(text))
+                length = sum(term_counts.values())
+                self._conn.execute("INSERT INTO docs (doc_id, length) VALUES (?, ?)", (doc_id, length))
+                self._conn.executemany(
+                    "INSERT INTO postings (term, tf, length, doc_id) VALUES (?, ?, ?, ?)",
+                    ((term, tf, length, doc_id) for term, tf in term_counts.items())
+                )
+                df.update(term_counts.keys())
+                n_docs += 1
+                total_length += length
+            self._update_stats(n_docs, total_length, df)
+
+    def delete_documents(self, doc_ids):
+        """
+        Remove documentos do índice.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            n_docs, total_length, df = 0, 0, Counter()
+            for doc_id in doc_ids:
+                removed = self._delete(doc_id, df)
+                if removed is not None:
+                    n_docs -= 1
+                    total_length -= removed
+            self._update_stats(n_docs, total_length, df)
+
+    def clear(self):
+        """
+        Remove todos os documentos.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM terms")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("UPDATE stats SET n_docs = 0, total_length = 0")
+
+    def search(self, query, k=10):
+        """
+        Retorna os `k` documentos com maior pontuação BM25.
+
+        Termos presentes em mais de `max_postings` documentos contribuem só
+        para os `max_postings` documentos em que são mais frequentes (em
+        empates de tf, os de menor id).
+
+        Returns:
+            list: Pares (doc_id, score) em ordem decrescente de score.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scores = Counter()
+        with self._lock, self._conn:
+            # Os totais e os postings vêm do mesmo retrato do índice, incluindo
+            # o que outros processos gravaram desde a última busca
+            self._conn.execute("BEGIN")
+            n_docs, total_length = self._conn.execute("SELECT n_docs, total_length FROM stats").fetchone()
+            if not n_docs:
+                return []
+            avg_length = total_length / n_docs
+            limit = self.max_postings if self.max_postings is not None else -1
+            for term in terms:
+                row = self._conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+                if row is None:
+                    continue
+                idf = math.log(1 + (n_docs - row[0] + 0.5) / (row[0] + 0.5))
+                rows = self._conn.execute(
+                    "SELECT doc_id, tf, length FROM postings WHERE term = ? ORDER BY tf DESC LIMIT ?",
+                    (term, limit)
+                )
+                for doc_id, tf, length in rows:
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+    def _delete(self, doc_id, df):
+        # Retorna o tamanho do documento removido, ou None se ele não existia.
+        # Os termos do documento são descontados de `df`.
+        row = self._conn.execute("SELECT length FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        df.subtract(term for term, in self._conn.execute("SELECT term FROM postings WHERE doc_id = ?", (doc_id,)))
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        return row[0]
+
+    def _update_stats(self, n_docs, total_length, df):
+        # As variações de df são somadas na transação inteira, para gravar
+        # cada termo uma vez por lote
+        self._conn.executemany(
+            "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+            ((term, delta) for term, delta in df.items() if delta)
+        )
+        self._conn.executemany(
+            "DELETE FROM terms WHERE term = ? AND df <= 0", ((term,) for term, delta in df.items() if delta < 0)
+        )
+        if n_docs or total_length:
+            self._conn.execute(
+                "UPDATE stats SET n_docs = n_docs + ?, total_length = total_length + ?", (n_docs, total_length)
+            )
@@ -0,0 +1,247 @@
+# src/bulk_downloader.py
+"""
+Módulo de download em massa de PDFs do arXiv.
+
+Responsabilidades:
+- Baixar vários PDFs em paralelo com um pool limitado de threads.
+- Respeitar um intervalo mínimo entre requisições (rate limit educado do arXiv).
+- Pular arquivos já presentes em disco (verificando ID, tamanho e hash).
+- Gravar em arquivos temporários e renomear de forma atômica.
+- Manter um manifesto em disco para retomar execuções interrompidas.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from metrics import registry
+
+USER_AGENT = "kosmos-synesis/0.1 (+https://github.com/Martinzzs777/kosmos-synesis)"
+
+
+class RateLimiter:
+    """
+    Garante um intervalo mínimo entre o início de requisições, compartilhado
+    entre todas as threads.
+    """
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """
+        Bloqueia até que a próxima requisição possa ser feita.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DownloadManifest:
+    """
+    Manifesto JSON com os downloads concluídos, indexado pelo ID do paper.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Manifesto '{path}' ilegível, começando do zero: {e}")
+
+    def get(self, paper_id):
+        with self._lock:
+            return self.entries.get(paper_id)
+
+    def record(self, paper_id, entry):
+        """
+        Registra um download concluído e persiste o manifesto imediatamente.
+        """
+        with self._lock:
+            self.entries[paper_id] = entry
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".manifest-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def file_sha256(filepath, block_size=1 << 20):
+    """
+    Calcula o SHA-256 de um arquivo lendo-o em blocos.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BulkDownloader:
+    """
+    Baixa PDFs de forma concorrente, idempotente e retomável.
+    """
+    def __init__(self, data_path, max_workers=4, min_interval=1.0, timeout=60,
+                 verify_hash=False, manifest_name="manifest.json"):
+        """
+        Args:
+            data_path (str): Diretório onde os PDFs são salvos.
+            max_workers (int): Número máximo de downloads simultâneos.
+            min_interval (float): Intervalo mínimo (s) entre o início de duas requisições.
+            timeout (float): Timeout (s) de cada requisição HTTP.
+            verify_hash (bool): Se True, recalcula o SHA-256 dos arquivos já
+                                presentes antes de pulá-los (mais lento, mais seguro).
+            manifest_name (str): Nome do arquivo de manifesto dentro de `data_path`.
+        """
+        self.data_path = data_path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.verify_hash = verify_hash
+        self.rate_limiter = RateLimiter(min_interval)
+        if not os.path.exists(self.data_path):
+            os.makedirs(self.data_path)
+        self.manifest = DownloadManifest(os.path.join(self.data_path, manifest_name))
+
+    def is_downloaded(self, paper_id, filepath):
+        """
+        Verifica se o PDF já está em disco e confere com o manifesto.
+        Arquivos válidos ainda fora do manifesto são adotados.
+        """
+        if not os.path.exists(filepath):
+            return False
+        size = os.path.getsize(filepath)
+        entry = self.manifest.get(paper_id)
+        if entry is not None:
+            if entry.get("size") != size:
+                return False
+            if self.verify_hash:
+                return entry.get("sha256") == file_sha256(filepath)
+            return True
+
+        # Arquivo presente de uma execução anterior ao manifesto
+        with open(filepath, "rb") as f:
+            if f.read(5) != b"%PDF-":
+                return False
+        self.manifest.record(paper_id, self._entry(filepath, size, file_sha256(filepath), None))
+        return True
+
+    def download(self, paper_id, url, filename):
+        """
+        Baixa um único PDF para `data_path/filename`, se necessário.
+
+        Returns:
+            tuple: (filepath, status) onde status é "skipped" ou "downloaded".
+        """
+        filepath = os.path.join(self.data_path, filename)
+        if self.is_downloaded(paper_id, filepath):
+            return filepath, "skipped"
+
+        self.rate_limiter.wait()
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_path, prefix=f".{filename}-", suffix=".part")
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with registry.span("download"), os.fdopen(fd, "wb") as f, \
+                    urllib.request.urlopen(request, timeout=self.timeout) as response:
+                expected = response.headers.get("Content-Length")
+                for block in iter(lambda: response.read(1 << 16), b""):
+                    f.write(block)
+                    digest.update(block)
+                    size += len(block)
+            registry.inc("kosmos_download_bytes_total", size)
+            if expected is not None and int(expected) != size:
+                raise IOError(f"download incompleto ({size} de {expected} bytes)")
+            os.replace(tmp_path, filepath)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.manifest.record(paper_id, self._entry(filepath, size, digest.hexdigest(), url))
+        return filepath, "downloaded"
+
+    def download_all(self, items, on_result=None, stop_event=None):
+        """
+        Baixa vários PDFs em paralelo.
+
+        Args:
+            items (iterable): Tuplas (paper_id, url, filename, payload). O payload
+                              é devolvido intacto no resultado. O iterável é
+                              consumido à medida que há vagas no pool, então pode
+                              ser um gerador paginado.
+            on_result (callable): Chamado com (payload, filepath, status) a cada
+                                  download concluído, para relatório de progresso.
+            stop_event (threading.Event): Quando sinalizado, nenhum novo download
+                                          é iniciado; os em andamento terminam.
+
+        Returns:
+            list: Tuplas (payload, filepath, status) na ordem de entrada;
+                  status é "downloaded", "skipped" ou "error".
+        """
+        results = {}
+        max_pending = self.max_workers * 2
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            submitted = 0
+            iterator = iter(items)
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_pending:
+                    if stop_event is not None and stop_event.is_set():
+                        exhausted = True
+                        break
+                    try:
+                        paper_id, url, filename, payload = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(self.download, paper_id, url, filename)
+                    pending[future] = (submitted, paper_id, payload)
+                    submitted += 1
+                if not pending:
+                    break
+                done = next(as_completed(pending))
+                position, paper_id, payload = pending.pop(done)
+                try:
+                    filepath, status = done.result()
+                except Exception as e:
+                    print(f"Erro ao baixar o paper '{paper_id}': {e}")
+                    filepath, status = None, "error"
+                results[position] = (payload, filepath, status)
+                registry.inc("kosmos_downloads_total", status=status)
+                if on_result is not None:
+                    on_result(payload, filepath, status)
+        return [results[i] for i in sorted(results)]
+
+    @staticmethod
+    def _entry(filepath, size, sha256, url):
+        return {
+            "filename": os.path.basename(filepath),
+            "size": size,
+            "sha256": sha256,
+            "url": url,
+            "downloaded_at": datetime.now(timezone.utc).isoformat(),
+        }
@@ -0,0 +1,241 @@
+# src/chunker.py
+"""
+Módulo de chunking estrutural para o texto extraído dos papers.
+
+Responsabilidades:
+- Dividir o texto por página, seção e sentença.
+- Agrupar sentenças em chunks dentro de um orçamento de tokens, com sobreposição.
+- Anexar metadados a cada chunk (página, seção, offsets de caractere).
+
+O texto de entrada é o retornado por `ArxivProcessor.extract_text_from_pdf`,
+em que as páginas são separadas por form feed (`\\f`).
+"""
+
+import re
+
+PAGE_SEPARATOR = "\f"
+
+# Estimativa barata de tokens: palavras e sinais de pontuação isolados.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Fim de sentença: pontuação final seguida de espaço e de um início plausível.
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+_KNOWN_SECTIONS = (
+    "abstract", "introduction", "related work", "background", "preliminaries",
+    "method", "methods", "methodology", "approach", "model", "experiments",
+    "experimental setup", "evaluation", "results", "discussion", "limitations",
+    "conclusion", "conclusions", "future work", "references", "bibliography",
+    "acknowledgments", "acknowledgements", "appendix",
+)
+_NUMBERED_HEADING_RE = re.compile(r"^(?:\d+(?:\.\d+){0,3}\.?|[IVX]+\.|[A-H]\.)\s+[A-Z][^\n]{1,80}$")
+
+
+def estimate_tokens(text):
+    """
+    Estima o número de tokens de um texto sem carregar um tokenizer.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+def detect_heading(line):
+    """
+    Retorna o título da seção se a linha parecer um cabeçalho, senão None.
+    """
+    stripped = line.strip()
+    if not stripped or len(stripped) > 90:
+        return None
+    normalized = stripped.rstrip(":").lower()
+    normalized = re.sub(r"^(?:\d+(?:\.\d+)*\.?|[ivx]+\.)\s+", "", normalized)
+    if normalized in _KNOWN_SECTIONS:
+        return stripped.rstrip(":")
+    if _NUMBERED_HEADING_RE.match(stripped) and not stripped.endswith((".", ",", ";")):
+        # Linhas numeradas com muitos dígitos costumam ser tabelas, não cabeçalhos.
+        if sum(c.isdigit() for c in stripped) <= 6:
+            return stripped
+    return None
+
+
+class TextChunker:
+    """
+    Divide o texto de um paper em chunks adequados para embedding.
+    """
+    def __init__(self, max_tokens=200, overlap_tokens=30, min_tokens=8, token_counter=estimate_tokens):
+        """
+        Args:
+            max_tokens (int): Orçamento máximo de tokens por chunk. O padrão fica
+                              abaixo do limite de 256 wordpieces do all-MiniLM-L6-v2.
+            overlap_tokens (int): Tokens de sentenças finais repetidos no chunk seguinte.
+            min_tokens (int): Chunks menores que isso são descartados.
+            token_counter (callable): Função que conta tokens de um texto.
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens deve ser menor que max_tokens.")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+        self.count_tokens = token_counter
+
+    def chunk_text(self, text, base_metadata=None):
+        """
+        Divide o texto completo de um paper.
+
+        Args:
+            text (str): Texto extraído, com páginas separadas por `\\f`.
+            base_metadata (dict): Metadados copiados para todos os chunks
+                                  (ex.: paper_id, title).
+
+        Returns:
+            tuple: (text_chunks, metadata_chunks), no formato de `RAGEngine.index_paper`.
+        """
+        return self.chunk_pages(enumerate(text.split(PAGE_SEPARATOR), start=1), base_metadata)
+
+    def chunk_pages(self, pages, base_metadata=None):
+        """
+        Divide um iterável de páginas, permitindo processar o documento à medida
+        que é extraído.
+
+        Args:
+            pages (iterable): Pares (número_da_página, texto_da_página).
+            base_metadata (dict): Metadados copiados para todos os chunks.
+
+        Returns:
+            tuple: (text_chunks, metadata_chunks).
+        """
+        text_chunks, metadata_chunks = [], []
+        for chunk_text, metadata in self.iter_chunks(pages, base_metadata):
+            text_chunks.append(chunk_text)
+            metadata_chunks.append(metadata)
+        return text_chunks, metadata_chunks
+
+    def iter_chunks(self, pages, base_metadata=None):
+        """
+        Gera pares (texto, metadados) chunk a chunk.
+
+        Os offsets `char_start`/`char_end` referem-se ao texto completo do paper
+        (páginas unidas por `\\f`).
+        """
+        base_metadata = dict(base_metadata or {})
+        section = ""
+        page_offset = 0
+        chunk_index = 0
+        for page_number, page_text in pages:
+            for block_start, block_end, heading in self._blocks(page_text):
+                if heading is not None:
+                    section = heading
+                    continue
+                sentences = self._sentences(page_text, block_start, block_end)
+                for start, end, n_tokens in self._pack(sentences):
+                    if n_tokens < self.min_tokens:
+                        continue
+                    metadata = dict(base_metadata)
+                    metadata.update({
+                        "chunk_index": chunk_index,
+                        "page": page_number,
+                        "section": section,
+                        "char_start": page_offset + start,
+                        "char_end": page_offset + end,
+                        "n_tokens": n_tokens,
+                    })
+                    chunk_index += 1
+                    yield " ".join(page_text[start:end].split()), metadata
+            page_offset += len(page_text) + len(PAGE_SEPARATOR)
+
+    @staticmethod
+    def _blocks(page_text):
+        """
+        Separa a página em blocos de texto delimitados por cabeçalhos.
+        Gera (início, fim, None) para texto e (início, fim, título) para cabeçalhos.
+        """
+        block_start = 0
+        position = 0
+        for line in page_text.splitlines(keepends=True):
+            heading = detect_heading(line)
+            if heading is not None:
+                if position > block_start:
+                    yield block_start, position, None
+                yield position, position + len(line), heading
+                block_start = position + len(line)
+            position += len(line)
+        if position > block_start:
+            yield block_start, position, None
+
+    def _sentences(self, page_text, start, end):
+        """
+        Retorna as sentenças do bloco como (início, fim, tokens), quebrando as
+        que sozinhas excedem o orçamento.
+        """
+        sentences = []
+        cursor = start
+        boundaries = [m.start() for m in _SENTENCE_END_RE.finditer(page_text, start, end)] + [end]
+        for boundary in boundaries:
+            sentence = page_text[cursor:boundary]
+            stripped = sentence.lstrip()
+            if stripped:
+                sentence_start = cursor + len(sentence) - len(stripped)
+                n_tokens = self.count_tokens(stripped)
+                if n_tokens <= self.max_tokens:
+                    sentences.append((sentence_start, boundary, n_tokens))
+                else:
+                    sentences.extend(self._split_long(page_text, sentence_start, boundary))
+            cursor = boundary
+        return sentences
+
+    def _split_long(self, page_text, start, end):
+        """
+        Quebra uma sentença longa em janelas de palavras dentro do orçamento.
+        """
+        words = [(m.start() + start, m.end() + start) for m in re.finditer(r"\S+", page_text[start:end])]
+        pieces = []
+        piece_start = None
+        piece_tokens = 0
+        previous_end = start
+        for word_start, word_end in words:
+            n_tokens = self.count_tokens(page_text[word_start:word_end])
+            if piece_start is not None and piece_tokens + n_tokens > self.max_tokens:
+                pieces.append((piece_start, previous_end, piece_tokens))
+                piece_start, piece_tokens = None, 0
+            if piece_start is None:
+                piece_start = word_start
+            piece_tokens += n_tokens
+            previous_end = word_end
+        if piece_start is not None:
+            pieces.append((piece_start, previous_end, piece_tokens))
+        return pieces
+
+    def _pack(self, sentences):
+        """
+        Agrupa sentenças consecutivas em chunks de até `max_tokens`, repetindo
+        as últimas sentenças (até `overlap_tokens`) no chunk seguinte.
+        """
+        current = []
+        current_tokens = 0
+        for sentence in sentences:
+            if current and current_tokens + sentence[2] > self.max_tokens:
+                yield current[0][0], current[-1][1], current_tokens
+                overlap, overlap_tokens = [], 0
+                for previous in reversed(current):
+                    if overlap_tokens + previous[2] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_tokens += previous[2]
+                if overlap_tokens + sentence[2] > self.max_tokens:
+                    overlap, overlap_tokens = [], 0
+                current, current_tokens = overlap, overlap_tokens
+            current.append(sentence)
+            current_tokens += sentence[2]
+        if current:
+            yield current[0][0], current[-1][1], current_tokens
+
+
+if __name__ == '__main__':
+    # Exemplo de uso
+    sample = (
+        "Abstract\nWe study retrieval. It works well.\n"
+        "1 Introduction\nLarge language models are useful. They hallucinate, however.\f"
+        "2 Method\nWe combine BM25 with dense vectors. Results improve on arXiv 2305.12345."
+    )
+    chunker = TextChunker(max_tokens=12, overlap_tokens=4, min_tokens=1)
+    chunks, metadatas = chunker.chunk_text(sample, {"paper_id": "exemplo"})
+    for chunk, meta in zip(chunks, metadatas):
+        print(f"[p.{meta['page']} | {meta['section']}] {chunk}")
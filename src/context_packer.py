@@ -0,0 +1,131 @@
+# src/context_packer.py
+"""
+Empacotamento do contexto enviado ao Gemini.
+
+Fica entre `RAGEngine.retrieve` e os construtores de prompt de `GeminiAPI`:
+- Ordena os chunks recuperados por relevância.
+- Remove chunks quase idênticos (por exemplo, sobreposições entre chunks vizinhos).
+- Respeita um orçamento de tokens configurável.
+- Prefixa cada chunk com uma citação compacta (título, ID do arXiv, página, seção).
+- Informa quantos tokens foram enviados e quantos foram descartados.
+"""
+
+from chunker import estimate_tokens
+
+
+def _shingles(text, size=3):
+    """
+    Conjunto de n-gramas de palavras, usado para detectar quase-duplicatas.
+    """
+    words = text.lower().split()
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def format_citation(metadata):
+    """
+    Monta uma citação compacta a partir dos metadados de um chunk.
+    """
+    metadata = metadata or {}
+    parts = []
+    if metadata.get("title"):
+        parts.append(str(metadata["title"]))
+    if metadata.get("paper_id"):
+        parts.append(f"arXiv:{str(metadata['paper_id']).split('/')[-1]}")
+    if metadata.get("page"):
+        parts.append(f"p. {metadata['page']}")
+    if metadata.get("section"):
+        parts.append(str(metadata["section"]))
+    return ", ".join(parts) or "fonte desconhecida"
+
+
+class ContextPacker:
+    """
+    Seleciona e formata os chunks que cabem no orçamento de tokens do prompt.
+    """
+    def __init__(self, max_tokens=4000, dedup_threshold=0.8, token_counter=estimate_tokens):
+        """
+        Args:
+            max_tokens (int): Orçamento de tokens para o contexto (citações incluídas).
+            dedup_threshold (float): Similaridade de Jaccard entre n-gramas a
+                                     partir da qual um chunk é considerado duplicado.
+            token_counter (callable): Função que conta tokens de um texto.
+        """
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.count_tokens = token_counter
+
+    def pack(self, results):
+        """
+        Empacota o resultado de `RAGEngine.retrieve`.
+
+        Args:
+            results (dict): Resultado da busca, no formato do ChromaDB
+                            (com `distances` ou `scores`).
+
+        Returns:
+            dict: Com as chaves
+                - docs (list): Trechos formatados, prontos para o prompt.
+                - ids (list): IDs dos chunks enviados, na ordem dos trechos.
+                - citations (list): Citação de cada trecho enviado.
+                - tokens_sent (int): Tokens enviados.
+                - tokens_dropped (int): Tokens descartados (duplicatas + orçamento).
+                - duplicates_dropped (int): Chunks descartados por duplicação.
+                - budget_dropped (int): Chunks descartados por falta de orçamento.
+        """
+        packed = {
+            "docs": [], "ids": [], "citations": [],
+            "tokens_sent": 0, "tokens_dropped": 0,
+            "duplicates_dropped": 0, "budget_dropped": 0,
+        }
+        kept_shingles = []
+        for chunk_id, document, metadata in self._ranked(results):
+            shingles = _shingles(document)
+            if any(self._jaccard(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                packed["duplicates_dropped"] += 1
+                packed["tokens_dropped"] += self.count_tokens(document)
+                continue
+            citation = format_citation(metadata)
+            entry = f"[{len(packed['docs']) + 1}] ({citation})\n{document}"
+            n_tokens = self.count_tokens(entry)
+            if packed["tokens_sent"] + n_tokens > self.max_tokens:
+                # Continua tentando: um chunk menor, mais abaixo, ainda pode caber
+                packed["budget_dropped"] += 1
+                packed["tokens_dropped"] += self.count_tokens(document)
+                continue
+            kept_shingles.append(shingles)
+            packed["docs"].append(entry)
+            packed["ids"].append(chunk_id)
+            packed["citations"].append(citation)
+            packed["tokens_sent"] += n_tokens
+
+        print(f"Contexto: {len(packed['docs'])} trechos, {packed['tokens_sent']} tokens enviados, "
+              f"{packed['tokens_dropped']} descartados ({packed['duplicates_dropped']} duplicatas, "
+              f"{packed['budget_dropped']} fora do orçamento).")
+        return packed
+
+    @staticmethod
+    def _ranked(results):
+        """
+        Gera (id, documento, metadados) do mais ao menos relevante.
+        """
+        if not results or not results.get("ids") or not results["ids"][0]:
+            return []
+        ids = results["ids"][0]
+        documents = results["documents"][0]
+        metadatas = (results.get("metadatas") or [[None] * len(ids)])[0]
+        if results.get("scores"):
+            keys = [-score for score in results["scores"][0]]
+        elif results.get("distances"):
+            keys = results["distances"][0]
+        else:
+            keys = range(len(ids))
+        order = sorted(range(len(ids)), key=lambda i: keys[i])
+        return [(ids[i], documents[i], metadatas[i]) for i in order]
+
+    @staticmethod
+    def _jaccard(a, b):
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
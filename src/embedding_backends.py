@@ -0,0 +1,183 @@
+# src/embedding_backends.py
+"""
+Backends de embedding plugáveis para o `RAGEngine`.
+
+Todos os backends seguem a interface de `EmbeddingBackend`. Eles não são
+registrados como função de embedding do ChromaDB: o `RAGEngine` calcula os
+embeddings e os passa explicitamente em cada escrita e consulta.
+- "torch": sentence-transformers em PyTorch, precisão total (comportamento original).
+- "torch-int8": o mesmo modelo com as camadas lineares quantizadas para int8
+  (quantização dinâmica do PyTorch).
+- "onnx": o modelo executado pelo ONNX Runtime.
+- "onnx-int8": a variante ONNX quantizada para int8.
+
+Os backends ONNX requerem `optimum[onnxruntime]` e sentence-transformers >= 3.2.
+O tamanho do lote e o número de threads são configuráveis, e os vetores são
+devolvidos em float16 por padrão. Para comparar os backends, veja
+`embedding_benchmark.py`.
+"""
+
+import abc
+import os
+import threading
+
+from startup_timing import startup_timer
+
+# Arquivo ONNX quantizado publicado junto com os modelos do sentence-transformers.
+# A variante AVX2 roda em qualquer CPU x86-64 recente.
+QUANTIZED_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+class EmbeddingBackend(abc.ABC):
+    """
+    Interface comum dos backends. O modelo é carregado no primeiro uso.
+    Subclasses implementam `_load`.
+    """
+    name = None
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", batch_size=64, num_threads=None, dtype="float16"):
+        """
+        Args:
+            model_name (str): Nome do modelo do sentence-transformers.
+            batch_size (int): Textos por passada do modelo.
+            num_threads (int): Threads de inferência. Se None, usa o padrão
+                               da biblioteca (em geral, todos os núcleos).
+            dtype (str): Tipo dos vetores devolvidos por `embed` ("float16" ou "float32").
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.dtype = dtype
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    with startup_timer.span("rag:embedding_model"):
+                        self._model = self._load()
+        return self._model
+
+    @abc.abstractmethod
+    def _load(self):
+        """
+        Carrega e retorna o modelo, com um método `encode` no formato do
+        sentence-transformers.
+        """
+
+    def embed(self, texts):
+        """
+        Gera os embeddings de uma lista de textos.
+
+        Returns:
+            numpy.ndarray: Matriz (len(texts), dimensão) no tipo `dtype`.
+        """
+        vectors = self.model.encode(
+            list(texts), batch_size=self.batch_size,
+            convert_to_numpy=True, show_progress_bar=False
+        )
+        return vectors.astype(self.dtype, copy=False)
+
+    def __call__(self, input):
+        """
+        Como `embed`, mas com os vetores como listas de floats, no formato
+        aceito pelo ChromaDB.
+        """
+        return self.embed(input).tolist()
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    sentence-transformers em PyTorch, opcionalmente quantizado para int8.
+    """
+    def __init__(self, model_name="all-MiniLM-L6-v2", quantize=False, **kwargs):
+        """
+        Args:
+            quantize (bool): Se True, aplica quantização dinâmica int8 às
+                             camadas lineares (apenas CPU).
+            Os demais argumentos são os de `EmbeddingBackend`.
+        """
+        super().__init__(model_name, **kwargs)
+        self.quantize = quantize
+        self.name = "torch-int8" if quantize else "torch"
+
+    def _load(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.num_threads:
+            # Configuração global do processo no PyTorch
+            torch.set_num_threads(self.num_threads)
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+
+class ONNXBackend(EmbeddingBackend):
+    """
+    sentence-transformers executado pelo ONNX Runtime na CPU.
+    """
+    def __init__(self, model_name="all-MiniLM-L6-v2", onnx_file=None, **kwargs):
+        """
+        Args:
+            onnx_file (str): Arquivo ONNX dentro do repositório do modelo, por
+                             exemplo `QUANTIZED_ONNX_FILE`. Se None, usa o
+                             modelo ONNX padrão (exportado na hora se não existir).
+            Os demais argumentos são os de `EmbeddingBackend`.
+        """
+        super().__init__(model_name, **kwargs)
+        self.onnx_file = onnx_file
+        self.name = "onnx-int8" if onnx_file == QUANTIZED_ONNX_FILE else "onnx"
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if self.onnx_file:
+            model_kwargs["file_name"] = self.onnx_file
+        if self.num_threads:
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.num_threads
+            model_kwargs["session_options"] = options
+        return SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+
+BACKENDS = {
+    "torch": (SentenceTransformerBackend, {}),
+    "torch-int8": (SentenceTransformerBackend, {"quantize": True}),
+    "onnx": (ONNXBackend, {}),
+    "onnx-int8": (ONNXBackend, {"onnx_file": QUANTIZED_ONNX_FILE}),
+}
+
+
+def create_backend(name, model_name="all-MiniLM-L6-v2", **kwargs):
+    """
+    Cria um backend pelo nome (uma das chaves de `BACKENDS`).
+
+    Args:
+        name (str): Nome do backend.
+        model_name (str): Nome do modelo do sentence-transformers.
+        **kwargs: Argumentos de `EmbeddingBackend` (batch_size, num_threads, dtype).
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de embedding desconhecido: {name}. Opções: {', '.join(BACKENDS)}")
+    cls, options = BACKENDS[name]
+    return cls(model_name, **options, **kwargs)
+
+
+def backend_from_env(model_name="all-MiniLM-L6-v2"):
+    """
+    Cria o backend a partir das variáveis de ambiente EMBEDDING_BACKEND
+    (padrão "torch"), EMBEDDING_BATCH_SIZE e EMBEDDING_THREADS.
+    """
+    threads = os.getenv("EMBEDDING_THREADS")
+    return create_backend(
+        os.getenv("EMBEDDING_BACKEND", "torch"),
+        model_name=model_name,
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+        num_threads=int(threads) if threads else None,
+    )
@@ -0,0 +1,169 @@
+# src/embedding_benchmark.py
+"""
+Benchmark dos backends de embedding (ver `embedding_backends`).
+
+Cada backend roda em um processo separado, um de cada vez, sobre o mesmo
+corpus fixo. São medidos:
+- vazão (textos/s) e tempo de carregamento do modelo;
+- pico de memória residente do processo;
+- recall@k da busca por cosseno em relação ao primeiro backend da lista
+  (a referência), com os vetores em float32 e em float16.
+
+Uso:
+    python src/embedding_benchmark.py --backends torch torch-int8 onnx onnx-int8
+    python src/embedding_benchmark.py --corpus passagens.txt --queries perguntas.txt --output resultado.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from benchmark_utils import build_corpus
+from embedding_backends import create_backend
+
+try:
+    import resource
+except ImportError:  # indisponível no Windows
+    resource = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss é dado em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_backend(name, model_name, batch_size, num_threads, docs, queries):
+    """
+    Executa um backend no processo atual (chamado em um processo separado).
+    """
+    backend = create_backend(name, model_name=model_name, batch_size=batch_size,
+                             num_threads=num_threads, dtype="float32")
+    started = time.perf_counter()
+    backend.embed(["warmup"])
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    doc_vectors = backend.embed(docs)
+    embed_seconds = time.perf_counter() - started
+    query_vectors = backend.embed(queries)
+    return {
+        "load_seconds": load_seconds,
+        "embed_seconds": embed_seconds,
+        "texts_per_sec": len(docs) / embed_seconds if embed_seconds else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "doc_vectors": doc_vectors,
+        "query_vectors": query_vectors,
+    }
+
+
+def _top_k(doc_vectors, query_vectors, k):
+    docs = doc_vectors / numpy.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    queries = query_vectors / numpy.linalg.norm(query_vectors, axis=1, keepdims=True)
+    scores = queries @ docs.T
+    return numpy.argsort(-scores, axis=1)[:, :k]
+
+
+def _recall(reference, found):
+    hits = sum(len(set(ref) & set(got)) for ref, got in zip(reference.tolist(), found.tolist()))
+    return hits / reference.size
+
+
+def benchmark_backends(backends, docs, queries, model_name="all-MiniLM-L6-v2", k=10,
+                       batch_size=64, num_threads=None):
+    """
+    Compara os backends sobre o mesmo corpus.
+
+    Args:
+        backends (list): Nomes dos backends. O primeiro é a referência do recall.
+        docs (list): Passagens a indexar.
+        queries (list): Perguntas usadas no recall@k.
+        model_name (str): Modelo do sentence-transformers.
+        k (int): Profundidade do recall.
+        batch_size (int): Textos por passada do modelo.
+        num_threads (int): Threads de inferência por backend.
+
+    Returns:
+        list: Um dicionário de métricas por backend (backends que falharem
+              trazem apenas `error`).
+    """
+    context = multiprocessing.get_context("spawn")
+    reference = None
+    results = []
+    for name in backends:
+        print(f"Executando o backend '{name}'...")
+        try:
+            # Um processo novo por backend isola o pico de memória de cada um
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                run = executor.submit(_run_backend, name, model_name, batch_size, num_threads,
+                                      docs, queries).result()
+        except Exception as e:
+            print(f"Erro no backend '{name}': {e}")
+            results.append({"backend": name, "error": str(e)})
+            continue
+
+        doc_vectors, query_vectors = run.pop("doc_vectors"), run.pop("query_vectors")
+        top = _top_k(doc_vectors, query_vectors, k)
+        top_fp16 = _top_k(doc_vectors.astype("float16").astype("float32"),
+                          query_vectors.astype("float16").astype("float32"), k)
+        if reference is None:
+            reference = top
+        run.update({
+            "backend": name,
+            "dimension": doc_vectors.shape[1],
+            "vector_mb_float32": doc_vectors.astype("float32").nbytes / 2 ** 20,
+            "vector_mb_float16": doc_vectors.astype("float16").nbytes / 2 ** 20,
+            f"recall@{k}": _recall(reference, top),
+            f"recall@{k}_float16": _recall(reference, top_fp16),
+        })
+        results.append(run)
+    return results
+
+
+def print_results(results, k):
+    print(f"\n{'backend':<12}{'textos/s':>10}{'carga (s)':>11}{'pico RSS (MB)':>15}"
+          f"{f'recall@{k}':>11}{'fp16':>8}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:<12}erro: {result['error']}")
+            continue
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{result['backend']:<12}{result['texts_per_sec']:>10.1f}{result['load_seconds']:>11.2f}"
+              f"{rss:>15}{result[f'recall@{k}']:>11.3f}{result[f'recall@{k}_float16']:>8.3f}")
+
+
+def _read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark dos backends de embedding.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--corpus", help="Arquivo com uma passagem por linha (padrão: corpus sintético).")
+    parser.add_argument("--queries", help="Arquivo com uma pergunta por linha.")
+    parser.add_argument("--docs", type=int, default=1000, help="Tamanho do corpus sintético.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--output", help="Grava os resultados em JSON.")
+    args = parser.parse_args()
+
+    docs, queries = build_corpus(n_docs=args.docs)
+    if args.corpus:
+        docs = _read_lines(args.corpus)
+    if args.queries:
+        queries = _read_lines(args.queries)
+
+    results = benchmark_backends(args.backends, docs, queries, model_name=args.model, k=args.k,
+                                 batch_size=args.batch_size, num_threads=args.threads)
+    print_results(results, args.k)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
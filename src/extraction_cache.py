@@ -0,0 +1,332 @@
+# src/extraction_cache.py
+"""
+Cache persistente do texto extraído dos PDFs.
+
+Responsabilidades:
+- Endereçar entradas pelo hash do conteúdo do PDF e pela versão do extrator.
+- Armazenar o texto comprimido (zstd, se disponível, ou gzip).
+- Ler as entradas via mmap, sem cópias intermediárias do arquivo.
+- Gravar e ler as entradas página a página (`write_pages`, `iter_pages`), sem
+  manter o documento inteiro em memória.
+- Remover as entradas menos usadas (LRU) quando o tamanho máximo é excedido.
+- Contabilizar acertos e falhas.
+"""
+
+import gzip
+import io
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+
+from bulk_downloader import file_sha256
+from metrics import registry
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional
+    zstandard = None
+
+_SUFFIXES = {"zstd": ".txt.zst", "gzip": ".txt.gz", None: ".txt"}
+PAGE_SEPARATOR = "\f"
+
+
+def write_pages(path, pages, compression=None):
+    """
+    Grava as páginas de um documento em `path`, separadas por `\\f`, de forma
+    atômica e comprimindo à medida que são recebidas.
+
+    Args:
+        path (str): Arquivo de destino.
+        pages (iterable): Textos das páginas, em ordem.
+        compression (str): "zstd", "gzip" ou None.
+
+    Returns:
+        tuple: (número de páginas, número de caracteres).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or None, suffix=".tmp")
+    n_pages = n_chars = 0
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            if compression == "zstd":
+                binary = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+            elif compression == "gzip":
+                binary = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+            else:
+                binary = raw
+            f = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+            for text in pages:
+                if n_pages:
+                    f.write(PAGE_SEPARATOR)
+                f.write(text)
+                n_pages += 1
+                n_chars += len(text)
+            f.flush()
+            f.detach()
+            if binary is not raw:
+                # Finaliza o fluxo comprimido sem fechar o arquivo
+                binary.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return n_pages, n_chars
+
+
+def read_pages(f, compression=None, block_size=64 * 1024):
+    """
+    Gera (número_da_página, texto) de um arquivo gravado por `write_pages` (ou
+    de uma entrada do cache), lendo blocos de `block_size` caracteres.
+
+    Args:
+        f: Arquivo já aberto em modo binário. É fechado ao fim da leitura.
+        compression (str): "zstd", "gzip" ou None.
+    """
+    with f:
+        if compression == "zstd":
+            if zstandard is None:
+                raise ValueError("entrada zstd sem o pacote zstandard instalado")
+            binary = zstandard.ZstdDecompressor().stream_reader(f)
+        elif compression == "gzip":
+            binary = gzip.GzipFile(fileobj=f, mode="rb")
+        else:
+            binary = f
+        with io.TextIOWrapper(binary, encoding="utf-8", newline="") as reader:
+            page_number = 1
+            pending = ""
+            while True:
+                block = reader.read(block_size)
+                if not block:
+                    break
+                pages = (pending + block).split(PAGE_SEPARATOR)
+                pending = pages.pop()
+                for text in pages:
+                    yield page_number, text
+                    page_number += 1
+            yield page_number, pending
+
+
+class ExtractionCache:
+    """
+    Cache em disco de texto extraído, indexado por hash de conteúdo.
+    """
+    def __init__(self, cache_dir="data/cache/extraction", max_bytes=2 * 1024 ** 3, compression="zstd"):
+        """
+        Args:
+            cache_dir (str): Diretório das entradas.
+            max_bytes (int): Tamanho máximo do cache em disco.
+            compression (str): "zstd", "gzip" ou None. Se o pacote `zstandard`
+                               não estiver instalado, usa gzip.
+        """
+        if compression == "zstd" and zstandard is None:
+            compression = "gzip"
+        if compression not in _SUFFIXES:
+            raise ValueError(f"Compressão desconhecida: {compression}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key_for(filepath, extractor_version):
+        """
+        Calcula a chave de cache de um PDF: SHA-256 do conteúdo + versão do extrator.
+        """
+        version = "".join(c if c.isalnum() or c in ".-_" else "_" for c in extractor_version)
+        return f"{file_sha256(filepath)}-{version}"
+
+    def get(self, key):
+        """
+        Retorna o texto armazenado para `key`, ou None em caso de falha.
+        """
+        for compression, suffix in _SUFFIXES.items():
+            path = self._path(key, suffix)
+            try:
+                text = self._read(path, compression)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"Entrada de cache corrompida '{path}', descartando: {e}")
+                self._remove(path)
+                continue
+            os.utime(path)  # marca como usada recentemente (LRU)
+            with self._lock:
+                self.hits += 1
+            registry.inc("kosmos_cache_requests_total", cache="extraction", result="hit")
+            return text
+        with self._lock:
+            self.misses += 1
+        registry.inc("kosmos_cache_requests_total", cache="extraction", result="miss")
+        return None
+
+    def iter_pages(self, key):
+        """
+        Como `get`, mas gera (número_da_página, texto) sem descomprimir o
+        documento inteiro de uma vez. Retorna None em caso de falha.
+
+        Uma entrada corrompida só é detectada durante a leitura: ela é
+        removida e o erro é propagado para quem consome as páginas.
+        """
+        for compression, suffix in _SUFFIXES.items():
+            path = self._path(key, suffix)
+            try:
+                # O arquivo fica aberto, então a leitura não é afetada se a
+                # entrada for removida pelo LRU enquanto as páginas são consumidas
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            registry.inc("kosmos_cache_requests_total", cache="extraction", result="hit")
+            return self._checked_pages(path, f, compression)
+        with self._lock:
+            self.misses += 1
+        registry.inc("kosmos_cache_requests_total", cache="extraction", result="miss")
+        return None
+
+    def _checked_pages(self, path, f, compression):
+        try:
+            yield from read_pages(f, compression)
+        except (OSError, ValueError, EOFError, zlib.error) as e:
+            print(f"Entrada de cache corrompida '{path}', descartando: {e}")
+            self._remove(path)
+            raise
+
+    def entry_path(self, key):
+        """
+        Caminho em que uma entrada nova para `key` é gravada, por exemplo por
+        `write_pages` em outro processo (ver `add_entry`).
+        """
+        return self._path(key, _SUFFIXES[self.compression])
+
+    def add_entry(self, key):
+        """
+        Contabiliza uma entrada gravada diretamente em `entry_path(key)` e
+        aplica o limite de tamanho.
+        """
+        self._account(os.path.getsize(self.entry_path(key)), 0)
+
+    def put(self, key, text):
+        """
+        Armazena o texto para `key` de forma atômica e aplica o limite de tamanho.
+        """
+        data = self._compress(text.encode("utf-8"))
+        path = self._path(key, _SUFFIXES[self.compression])
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._account(len(data), previous)
+
+    def _account(self, size, previous):
+        with self._lock:
+            self._total_bytes += size - previous
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def stats(self):
+        """
+        Retorna as estatísticas de uso do cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "size_bytes": self._total_bytes,
+            }
+
+    def _evict(self):
+        """
+        Remove as entradas menos recentemente usadas até ficar em 90% do limite,
+        evitando varrer o diretório a cada escrita.
+        """
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+        with self._lock:
+            self._total_bytes = total
+
+    def _entries(self):
+        """
+        Lista (caminho, tamanho, mtime) de todas as entradas.
+        """
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _compress(self, data):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        if self.compression == "gzip":
+            return gzip.compress(data, compresslevel=6)
+        return data
+
+    @staticmethod
+    def _read(path, compression):
+        """
+        Lê uma entrada mapeando o arquivo em memória; a descompressão opera
+        diretamente sobre o mapa.
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                data = b""
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if compression == "zstd":
+                        if zstandard is None:
+                            raise ValueError("entrada zstd sem o pacote zstandard instalado")
+                        # decompressobj aceita frames sem o tamanho no cabeçalho,
+                        # como os gravados em streaming por `write_pages`
+                        data = zstandard.ZstdDecompressor().decompressobj().decompress(mapped)
+                    elif compression == "gzip":
+                        data = gzip.decompress(mapped)
+                    else:
+                        data = bytes(mapped)
+        return data.decode("utf-8")
@@ -5,78 +5,247 @@ Módulo para interação com a API do Google Gemini.
 Responsabilidades:
 - Configurar a API com a chave de acesso.
 - Enviar prompts para o modelo generativo.
-- Gerar respostas, hipóteses e sumarizações com base no contexto fornecido.
+- Gerar respostas, hipóteses e sumarizações com base no contexto fornecido,
+  de uma vez ou em streaming (texto parcial à medida que é gerado).
 - Formatar as citações com base nos documentos recuperados.
+- Reaproveitar respostas já geradas para perguntas equivalentes (ver `response_cache`).
+- Sintetizar muitos papers em etapas (map-reduce) antes de gerar hipóteses,
+  com os resumos intermediários em cache (ver `summary_cache`).
 """
 
+import asyncio
+import hashlib
+import json
 import os
-import google.generativeai as genai
+import threading
+import time
 from dotenv import load_dotenv
+from chunker import estimate_tokens
+from context_packer import format_citation
+from metrics import registry
+from startup_timing import startup_timer
+from summary_cache import summary_key
+
+PREFERRED_MODELS = [
+    'models/gemini-1.5-pro-latest',
+    'gemini-1.5-pro',
+    'gemini-pro'
+]
+
+def record_tokens(prompt, text, usage=None):
+    """
+    Contabiliza os tokens enviados e recebidos, usando os números devolvidos
+    pela API (`usage_metadata`) quando disponíveis, ou uma estimativa.
+    """
+    sent = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+    received = getattr(usage, "candidates_token_count", None) or estimate_tokens(text)
+    registry.inc("kosmos_gemini_tokens_total", sent, direction="sent")
+    registry.inc("kosmos_gemini_tokens_total", received, direction="received")
+
+
+class GenerationError(str):
+    """
+    Mensagem de erro devolvida no lugar do texto quando a geração falha.
+
+    Por ser uma `str`, pode ser exibida como qualquer resposta (ex.: na
+    interface); quem precisa distinguir a falha, como o `api_server`, testa
+    `isinstance(text, GenerationError)`.
+    """
+
+
+class GenerationStream:
+    """
+    Trechos de texto de uma geração em streaming, retornados por
+    `generate_response(..., stream=True)` e afins.
+
+    `ttft` guarda o tempo até o primeiro token (s) desta geração, disponível
+    depois do primeiro trecho (0.0 para respostas vindas do cache). Fica no
+    próprio stream, e não no `GeminiAPI`, que é compartilhado por sessões e
+    requisições concorrentes. `failed` passa a True quando o stream entrega
+    uma `GenerationError`.
+    """
+    def __init__(self, parts=(), ttft=None):
+        self.parts = iter(parts)
+        self.ttft = ttft
+        self.failed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        part = next(self.parts)
+        if isinstance(part, GenerationError):
+            self.failed = True
+        return part
+
 
 class GeminiAPI:
     """
     Encapsula a lógica de chamada à API do Gemini.
+
+    O SDK do Gemini só é importado, e o modelo só é escolhido, no primeiro uso
+    de `model` (ou em `warmup`). A lista de modelos disponíveis é guardada em
+    disco por `models_cache_ttl` segundos, evitando `list_models()` a cada
+    inicialização.
     """
-    def __init__(self):
+    def __init__(self, response_cache=None, models_cache_path="data/cache/gemini_models.json",
+                 models_cache_ttl=24 * 3600, summary_cache=None, synthesis_concurrency=8,
+                 synthesis_requests_per_minute=300):
         """
-        Carrega a chave da API e configura o modelo.
+        Carrega a chave da API.
+
+        Args:
+            response_cache (SemanticResponseCache): Cache opcional de respostas.
+            models_cache_path (str): Arquivo com a lista de modelos disponíveis.
+                                     None desativa o cache.
+            models_cache_ttl (float): Validade (s) da lista em cache.
+            summary_cache (SummaryCache): Cache opcional dos resumos da
+                                          síntese hierárquica.
+            synthesis_concurrency (int): Chamadas simultâneas ao modelo na
+                                         síntese hierárquica, somando todas
+                                         as sínteses em andamento.
+            synthesis_requests_per_minute (float): Cota de requisições por
+                                                   minuto da síntese, também
+                                                   compartilhada.
         """
         load_dotenv()
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("A chave da API da Gemini não foi encontrada. Defina GEMINI_API_KEY no arquivo .env.")
 
-        genai.configure(api_key=api_key)
+        self._api_key = api_key
+        self.models_cache_path = models_cache_path
+        self.models_cache_ttl = models_cache_ttl
+        self._model = None
+        self._model_name = None
+        self._model_lock = threading.Lock()
+        self.response_cache = response_cache
+        self.summary_cache = summary_cache
+        self.synthesis_concurrency = synthesis_concurrency
+        self.synthesis_requests_per_minute = synthesis_requests_per_minute
+        self._synthesis_client = None
+        self._synthesis_loop = None
+        self._synthesis_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """
+        O modelo generativo, configurado no primeiro acesso.
+        """
+        if self._model is None:
+            self._load_model()
+        return self._model
 
-        # Lógica para selecionar um modelo compatível dinamicamente
-        # Permite override via variável de ambiente
+    @model.setter
+    def model(self, model):
+        # Permite injetar um modelo (ex.: um modelo falso em testes e benchmarks)
+        self._model = model
+        self._model_name = getattr(model, "model_name", None) or self._model_name or "custom"
+
+    @property
+    def model_name(self):
+        if self._model_name is None:
+            self._load_model()
+        return self._model_name
+
+    def warmup(self, background=True):
+        """
+        Importa o SDK e escolhe o modelo antecipadamente, opcionalmente em uma
+        thread, para que a primeira pergunta não pague esse custo.
+        """
+        if background:
+            threading.Thread(target=self._warmup, name="gemini-warmup", daemon=True).start()
+        else:
+            self._warmup()
+
+    def _warmup(self):
+        try:
+            if self._model is None:
+                self._load_model()
+        except Exception as e:
+            print(f"Erro ao preparar o modelo da Gemini: {e}")
+
+    def _load_model(self):
+        with self._model_lock:
+            if self._model is not None:
+                return
+            with startup_timer.span("gemini:import"):
+                import google.generativeai as genai
+            genai.configure(api_key=self._api_key)
+
+            with startup_timer.span("gemini:model_discovery"):
+                model_name = self._select_model(genai)
+            if not model_name:
+                raise ValueError("Nenhum modelo compatível para geração de conteúdo foi determinado.")
+
+            print(f"Kosmos-Synesis usando o modelo: {model_name}")
+            self._model_name = model_name
+            self._model = genai.GenerativeModel(model_name)
+
+    def _select_model(self, genai):
+        """
+        Lógica para selecionar um modelo compatível dinamicamente.
+        Permite override via variável de ambiente.
+        """
         env_model = os.getenv("GEMINI_MODEL_NAME")
-        preferred_models = [
-            env_model,
-            'models/gemini-1.5-pro-latest',
-            'gemini-1.5-pro',
-            'gemini-pro'
-        ]
-        model_name = None
+        preferred_models = [env_model] + PREFERRED_MODELS
         try:
-            available_models = [
-                m.name for m in genai.list_models()
-                if hasattr(m, 'supported_generation_methods') and 'generateContent' in m.supported_generation_methods
-            ]
-            for candidate in filter(None, preferred_models):
-                if candidate in available_models:
-                    model_name = candidate
-                    break
-            # fallback: escolhe primeiro disponível contendo 'gemini'
-            if not model_name and available_models:
-                model_name = next((m for m in available_models if 'gemini' in m), available_models[0])
+            available_models = self._available_models(genai)
         except Exception:
             # Em caso de falha ao listar modelos (offline/permissões), usa preferências estáticas
-            model_name = env_model or 'models/gemini-1.5-pro-latest'
-
-        if not model_name:
-            raise ValueError("Nenhum modelo compatível para geração de conteúdo foi determinado.")
+            return env_model or 'models/gemini-1.5-pro-latest'
 
-        print(f"Kosmos-Synesis usando o modelo: {model_name}")
-        self.model = genai.GenerativeModel(model_name)
+        for candidate in filter(None, preferred_models):
+            if candidate in available_models:
+                return candidate
+        # fallback: escolhe primeiro disponível contendo 'gemini'
+        if available_models:
+            return next((m for m in available_models if 'gemini' in m), available_models[0])
+        return None
 
-    def generate_response(self, query, context_docs):
+    def _available_models(self, genai):
         """
-        Gera uma resposta aumentada por retrieval (RAG).
+        Lista os modelos com suporte a `generateContent`, usando o cache em disco
+        quando ele é recente e pertence à mesma chave de API.
+        """
+        key_hash = hashlib.sha256(self._api_key.encode("utf-8")).hexdigest()
+        if self.models_cache_path and os.path.exists(self.models_cache_path):
+            try:
+                with open(self.models_cache_path, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+                if cached.get("key_hash") == key_hash and time.time() - cached["fetched_at"] < self.models_cache_ttl:
+                    return cached["models"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Cache de modelos ilegível, consultando a API: {e}")
 
-        Args:
-            query (str): A pergunta do usuário.
-            context_docs (list): Lista de documentos (chunks) recuperados do ChromaDB.
+        available_models = [
+            m.name for m in genai.list_models()
+            if hasattr(m, 'supported_generation_methods') and 'generateContent' in m.supported_generation_methods
+        ]
+        if self.models_cache_path:
+            try:
+                directory = os.path.dirname(self.models_cache_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_path = f"{self.models_cache_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"key_hash": key_hash, "fetched_at": time.time(), "models": available_models}, f)
+                os.replace(tmp_path, self.models_cache_path)
+            except OSError as e:
+                print(f"Não foi possível salvar o cache de modelos: {e}")
+        return available_models
 
-        Returns:
-            str: A resposta gerada pelo modelo.
+    @staticmethod
+    def build_response_prompt(query, context_docs):
+        """
+        Monta o prompt de resposta RAG a partir da pergunta e dos trechos.
         """
-        # Constrói o prompt com o contexto
         context_str = "\n\n".join(context_docs)
-        prompt = f"""
+        return f"""
         Com base nos seguintes trechos de artigos científicos, responda à pergunta.
         Se a resposta não estiver nos trechos, indique que a informação não foi encontrada.
-        Sempre cite as fontes (metadados) dos trechos que você usar.
+        Sempre cite as fontes dos trechos que você usar, pelo número entre colchetes
+        (ex.: [2]) que precede cada trecho.
 
         Contexto:
         ---
@@ -88,19 +257,13 @@ class GeminiAPI:
         Resposta:
         """
 
-        try:
-            response = self.model.generate_content(prompt)
-            return getattr(response, 'text', str(response))
-        except Exception as e:
-            print(f"Erro ao gerar resposta com a API da Gemini: {e}")
-            return "Ocorreu um erro ao contatar a API da Gemini."
-
-    def generate_hypothesis(self, topic, context_docs):
+    @staticmethod
+    def build_hypothesis_prompt(topic, context_docs):
         """
-        Gera uma nova hipótese de pesquisa com base em um tópico e contexto.
+        Monta o prompt de geração de hipótese a partir do tópico e dos trechos.
         """
         context_str = "\n\n".join(context_docs)
-        prompt = f"""
+        return f"""
         Você é um assistente de pesquisa criativo. Com base nos seguintes trechos
         de artigos sobre '{topic}', gere uma nova e interessante hipótese de pesquisa
         que conecte ou estenda as ideias apresentadas.
@@ -112,12 +275,417 @@ class GeminiAPI:
 
         Nova Hipótese de Pesquisa:
         """
+
+    @staticmethod
+    def build_summary_prompt(title, text):
+        """
+        Monta o prompt de sumarização de um paper.
+        """
+        return f"""
+        Resuma o artigo científico abaixo em um parágrafo conciso, destacando o
+        problema abordado, o método proposto e os principais resultados.
+
+        Título: {title}
+
+        Texto:
+        ---
+        {text}
+        ---
+
+        Resumo:
+        """
+
+    @staticmethod
+    def build_notes_prompt(title, text):
+        """
+        Monta o prompt da etapa "map" da síntese: resumo dos trechos de um paper.
+        Não depende da pergunta, para que o resumo seja reaproveitado entre buscas.
+        """
+        return f"""
+        Resuma o que os trechos abaixo, todos do mesmo artigo científico, dizem
+        sobre o problema abordado, o método, os resultados e as limitações.
+        Seja conciso e não acrescente informações ausentes dos trechos.
+
+        Título: {title}
+
+        Trechos:
+        ---
+        {text}
+        ---
+
+        Resumo:
+        """
+
+    @staticmethod
+    def build_synthesis_prompt(topic, notes):
+        """
+        Monta o prompt da etapa "reduce": síntese de notas de vários papers.
+        """
+        notes_str = "\n\n".join(notes)
+        return f"""
+        Você está preparando material para propor hipóteses de pesquisa sobre
+        '{topic}'. Combine as notas abaixo, de vários artigos, em uma única
+        síntese: pontos em comum, divergências, lacunas e oportunidades.
+        Mantenha em cada afirmação a citação da fonte, no formato [n].
+
+        Notas:
+        ---
+        {notes_str}
+        ---
+
+        Síntese:
+        """
+
+    def generate_response(self, query, context_docs, stream=False, query_embedding=None, chunk_ids=None):
+        """
+        Gera uma resposta aumentada por retrieval (RAG).
+
+        Args:
+            query (str): A pergunta do usuário.
+            context_docs (list): Lista de documentos (chunks) recuperados do ChromaDB.
+            stream (bool): Se True, retorna um gerador de trechos de texto à
+                           medida que o modelo os produz.
+            query_embedding (list): Embedding da pergunta (`RAGEngine.embed_query`).
+            chunk_ids (list): IDs dos chunks em `context_docs`. Com o embedding,
+                              habilita o cache de respostas.
+
+        Returns:
+            str: A resposta gerada pelo modelo (ou um `GenerationStream`, se `stream`).
+                 Se a chamada falhar, uma `GenerationError` com a mensagem de erro.
+        """
+        # Constrói o prompt com o contexto
+        with registry.span("prompt_build"):
+            prompt = self.build_response_prompt(query, context_docs)
+        return self._generate(
+            prompt, self.build_response_prompt, context_docs, stream, query_embedding, chunk_ids,
+            "Erro ao gerar resposta com a API da Gemini", "Ocorreu um erro ao contatar a API da Gemini."
+        )
+
+    def generate_hypothesis(self, topic, context_docs, stream=False, query_embedding=None, chunk_ids=None):
+        """
+        Gera uma nova hipótese de pesquisa com base em um tópico e contexto.
+        Com `stream=True`, retorna um `GenerationStream`. `query_embedding`
+        e `chunk_ids` habilitam o cache de respostas, como em `generate_response`.
+        """
+        with registry.span("prompt_build"):
+            prompt = self.build_hypothesis_prompt(topic, context_docs)
+        return self._generate(
+            prompt, self.build_hypothesis_prompt, context_docs, stream, query_embedding, chunk_ids,
+            "Erro ao gerar hipótese com a API da Gemini", "Ocorreu um erro ao gerar a hipótese."
+        )
+
+    def synthesize_context(self, topic, results, map_tokens=4000, reduce_tokens=8000, min_summary_tokens=400,
+                           max_levels=3):
+        """
+        Condensa muitos chunks recuperados em poucas notas, por map-reduce:
+
+        1. map: os chunks de cada paper são resumidos em paralelo, um resumo
+           por paper (independente de `topic`, logo reaproveitável entre buscas
+           que recuperem os mesmos trechos); papers com menos de
+           `min_summary_tokens` de trechos entram sem resumo;
+        2. reduce: enquanto as notas não cabem em `reduce_tokens`, grupos de
+           notas são combinados em paralelo em sínteses entre papers.
+
+        Os resumos e sínteses ficam em `summary_cache`, se houver. Uma chamada
+        que falha não interrompe a síntese: o paper entra com o seu trecho
+        mais relevante, e um grupo segue sem ser combinado.
+
+        As chamadas paralelas usam um único `AsyncGeminiAPI` por `GeminiAPI`
+        (ver `synthesis_client`), de modo que os limites de concorrência e de
+        cota valem para todas as rodadas e para todas as sínteses em
+        andamento (ex.: requisições simultâneas ao serviço HTTP). A thread que
+        chama este método fica bloqueada até as chamadas terminarem.
+
+        Args:
+            topic (str): Tópico ou pergunta da pesquisa.
+            results (dict): Resultado de `RAGEngine.retrieve`.
+            map_tokens (int): Orçamento de tokens dos trechos de cada paper.
+            reduce_tokens (int): Orçamento de tokens das notas finais (e de
+                                 cada grupo combinado).
+            min_summary_tokens (int): Abaixo disso, os trechos de um paper não
+                                      são resumidos.
+            max_levels (int): Máximo de rodadas de reduce.
+
+        Returns:
+            dict: No formato de `ContextPacker.pack`, para `generate_hypothesis`:
+                - docs (list): Notas finais, com citações [n].
+                - ids (list): IDs dos chunks resumidos.
+                - citations (list): Citação de cada paper, na ordem de [n].
+                - papers (int), model_calls (int), cache_hits (int), failed (int),
+                  reduce_levels (int): Estatísticas da síntese.
+                - tokens_sent (int): Tokens (estimados) enviados nas etapas
+                  intermediárias.
+                - tokens_dropped (int): Tokens de trechos fora do orçamento do map.
+        """
+        synthesis = {
+            "docs": [], "ids": [], "citations": [], "papers": 0, "model_calls": 0, "cache_hits": 0,
+            "failed": 0, "reduce_levels": 0, "tokens_sent": 0, "tokens_dropped": 0,
+        }
+        papers = self._group_by_paper(results)
+        if not papers:
+            return synthesis
+        try:
+            client = self.synthesis_client()
+        except Exception as e:
+            # Sem modelo, a síntese segue como se todas as chamadas falhassem
+            print(f"Erro na síntese com a API da Gemini: {e}")
+            client = None
+
+        # map: um resumo por paper com trechos suficientes para valer a chamada
+        prompts, excerpts = [], []
+        for paper in papers:
+            texts, used = [], 0
+            for chunk_id, document in paper["chunks"]:
+                n_tokens = estimate_tokens(document)
+                if texts and used + n_tokens > map_tokens:
+                    synthesis["tokens_dropped"] += n_tokens
+                    continue
+                texts.append(document)
+                used += n_tokens
+                synthesis["ids"].append(chunk_id)
+            excerpt = "\n\n".join(texts)
+            summarize = used >= min_summary_tokens
+            excerpts.append((excerpt, summarize))
+            if summarize:
+                prompts.append(self.build_notes_prompt(paper["title"], excerpt))
+        with registry.span("synthesis_map"):
+            summaries = iter(self._summarize(client, prompts, self.build_notes_prompt("", ""), synthesis))
+        notes = []
+        for n, (paper, (excerpt, summarize)) in enumerate(zip(papers, excerpts), start=1):
+            synthesis["citations"].append(paper["citation"])
+            text = excerpt
+            if summarize:
+                # Sem resumo (falha na chamada), o paper entra com o seu trecho mais relevante
+                text = next(summaries) or paper["best_chunk"]
+            notes.append(f"[{n}] ({paper['citation']})\n{text}")
+        synthesis["papers"] = len(papers)
+
+        # reduce: combina grupos de notas até caberem no orçamento
+        template = self.build_synthesis_prompt("", [])
+        while (client is not None and len(notes) > 1 and synthesis["reduce_levels"] < max_levels
+               and estimate_tokens("\n\n".join(notes)) > reduce_tokens):
+            groups, group, used = [], [], 0
+            for note in notes:
+                n_tokens = estimate_tokens(note)
+                if len(group) >= 2 and used + n_tokens > reduce_tokens:
+                    groups.append(group)
+                    group, used = [], 0
+                group.append(note)
+                used += n_tokens
+            groups.append(group)
+            with registry.span("synthesis_reduce"):
+                combined = self._summarize(client, [self.build_synthesis_prompt(topic, group) for group in groups],
+                                           template, synthesis)
+            notes = [text if text else "\n\n".join(group) for group, text in zip(groups, combined)]
+            synthesis["reduce_levels"] += 1
+
+        # Se as rodadas se esgotarem, as notas menos relevantes ficam de fora
+        used = 0
+        for note in notes:
+            n_tokens = estimate_tokens(note)
+            if synthesis["docs"] and used + n_tokens > reduce_tokens:
+                synthesis["tokens_dropped"] += n_tokens
+                continue
+            synthesis["docs"].append(note)
+            used += n_tokens
+        print(f"Síntese: {synthesis['papers']} papers, {synthesis['model_calls']} chamadas ao modelo, "
+              f"{synthesis['cache_hits']} resumos do cache, {synthesis['failed']} falhas, "
+              f"{synthesis['reduce_levels']} rodadas de reduce.")
+        return synthesis
+
+    def synthesize_hypothesis(self, topic, results, stream=False, query_embedding=None, **kwargs):
+        """
+        Gera uma hipótese a partir de muitos chunks, via `synthesize_context`.
+
+        Args:
+            topic (str): Tópico da pesquisa.
+            results (dict): Resultado de `RAGEngine.retrieve` (ex.: 100 chunks).
+            stream (bool): Como em `generate_hypothesis`.
+            query_embedding (list): Habilita o cache de respostas da etapa final.
+            **kwargs: Repassados a `synthesize_context`.
+
+        Returns:
+            tuple: (hipótese ou `GenerationStream`, dicionário da síntese).
+        """
+        synthesis = self.synthesize_context(topic, results, **kwargs)
+        if not synthesis["docs"]:
+            message = "Não há trechos suficientes para gerar uma hipótese."
+            return (GenerationStream([message]) if stream else message), synthesis
+        output = self.generate_hypothesis(topic, synthesis["docs"], stream=stream,
+                                          query_embedding=query_embedding, chunk_ids=synthesis["ids"])
+        return output, synthesis
+
+    @staticmethod
+    def _group_by_paper(results):
+        """
+        Agrupa os chunks recuperados por paper, na ordem do paper mais relevante.
+        Dentro de cada paper, os chunks seguem a ordem do texto.
+        """
+        if not results or not results.get("ids") or not results["ids"][0]:
+            return []
+        metadatas = (results.get("metadatas") or [[None] * len(results["ids"][0])])[0]
+        papers = {}
+        for chunk_id, document, metadata in zip(results["ids"][0], results["documents"][0], metadatas):
+            metadata = metadata or {}
+            paper_id = metadata.get("paper_id") or chunk_id.rsplit("_", 1)[0]
+            paper = papers.get(paper_id)
+            if paper is None:
+                paper = papers[paper_id] = {
+                    "title": metadata.get("title", ""),
+                    "citation": format_citation({"title": metadata.get("title"), "paper_id": paper_id}),
+                    "best_chunk": document,
+                    "chunks": [],
+                }
+            paper["chunks"].append((chunk_id, document))
+
+        def position(chunk):
+            suffix = chunk[0].rsplit("_", 1)[-1]
+            return int(suffix) if suffix.isdigit() else 0
+
+        for paper in papers.values():
+            paper["chunks"].sort(key=position)
+        return list(papers.values())
+
+    def synthesis_client(self):
+        """
+        O `AsyncGeminiAPI` da síntese hierárquica, criado no primeiro uso.
+
+        Ele roda em um event loop próprio, em uma thread de fundo, e é
+        compartilhado por todas as sínteses deste `GeminiAPI`: como o semáforo
+        e o token bucket pertencem ao loop, um loop por chamada (`asyncio.run`)
+        daria a cada rodada e a cada requisição a cota inteira.
+        """
+        from async_gemini import AsyncGeminiAPI
+
+        # O modelo é resolvido antes do lock, pois o seu carregamento pode falhar
+        model = self.model
+        with self._synthesis_lock:
+            if self._synthesis_client is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gemini-synthesis", daemon=True).start()
+                self._synthesis_loop = loop
+                self._synthesis_client = AsyncGeminiAPI(
+                    model=model, max_concurrency=self.synthesis_concurrency,
+                    requests_per_minute=self.synthesis_requests_per_minute
+                )
+            # Acompanha um modelo injetado depois da criação (ex.: em testes)
+            self._synthesis_client.model = model
+            return self._synthesis_client
+
+    def _summarize(self, client, prompts, template, synthesis):
+        """
+        Resolve os prompts pelo cache de resumos e envia os demais em paralelo.
+        Retorna os textos na ordem dos prompts (None para os que falharam).
+        Sem `client` (o modelo não pôde ser carregado), todos falham.
+        """
+        if client is None:
+            synthesis["failed"] += len(prompts)
+            return [None] * len(prompts)
+        template = hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+        keys = [summary_key(self.model_name, template, prompt) for prompt in prompts]
+        texts = [self.summary_cache.get(key) if self.summary_cache is not None else None for key in keys]
+        missing = [i for i, text in enumerate(texts) if text is None]
+        synthesis["cache_hits"] += len(prompts) - len(missing)
+        if not missing:
+            return texts
+        generated = asyncio.run_coroutine_threadsafe(
+            client.generate_batch([prompts[i] for i in missing]), self._synthesis_loop
+        ).result()
+        synthesis["model_calls"] += len(missing)
+        for i, result in zip(missing, generated):
+            synthesis["tokens_sent"] += estimate_tokens(prompts[i])
+            if isinstance(result, Exception) or not result:
+                print(f"Erro na síntese com a API da Gemini: {result}")
+                synthesis["failed"] += 1
+                continue
+            texts[i] = result
+            if self.summary_cache is not None:
+                self.summary_cache.put(keys[i], result)
+        return texts
+
+    def _generate(self, prompt, prompt_builder, context_docs, stream, query_embedding, chunk_ids, log_message,
+                  error_message):
+        """
+        Consulta o cache de respostas e, em caso de falha, chama o modelo e
+        armazena a resposta obtida com sucesso. O texto de `context_docs`
+        entra na chave do cache, então uma resposta não é reaproveitada se os
+        chunks mudaram.
+        """
+        try:
+            # O modelo é carregado no primeiro uso, o que pode falhar (ex.:
+            # nenhum modelo compatível disponível)
+            model_name = self.model_name
+        except Exception as e:
+            registry.inc("kosmos_errors_total", stage="gemini_generate")
+            print(f"{log_message}: {e}")
+            error = GenerationError(error_message)
+            return GenerationStream([error]) if stream else error
+
+        cache_key = None
+        if self.response_cache is not None and query_embedding is not None and chunk_ids:
+            # O template entra na chave: mudar o prompt invalida as respostas antigas
+            template = hashlib.sha1(prompt_builder("", []).encode("utf-8")).hexdigest()[:16]
+            cache_key = (model_name, template, query_embedding, chunk_ids)
+            cached = self.response_cache.lookup(*cache_key, documents=context_docs)
+            if cached is not None:
+                if stream:
+                    return GenerationStream([cached], ttft=0.0)
+                return cached
+
+        def store(text):
+            if cache_key is not None:
+                self.response_cache.store(*cache_key, text, documents=context_docs)
+
+        if stream:
+            result = GenerationStream()
+            result.parts = self._stream(prompt, log_message, error_message, on_complete=store,
+                                        on_first_token=lambda ttft: setattr(result, "ttft", ttft))
+            return result
+        try:
+            with registry.span("gemini_generate"):
+                response = self.model.generate_content(prompt)
+            text = getattr(response, 'text', str(response))
+        except Exception as e:
+            print(f"{log_message}: {e}")
+            return GenerationError(error_message)
+        record_tokens(prompt, text, getattr(response, "usage_metadata", None))
+        store(text)
+        return text
+
+    def _stream(self, prompt, log_message, error_message, on_complete=None, on_first_token=None):
+        """
+        Gera os trechos de texto de uma resposta em streaming. `on_first_token`
+        recebe o tempo até o primeiro token (s) e `on_complete`, o texto
+        completo, se a geração terminar sem erro. Em caso de erro, o último
+        trecho é uma `GenerationError`.
+        """
+        started = time.perf_counter()
+        parts = []
+        usage = None
         try:
-            response = self.model.generate_content(prompt)
-            return getattr(response, 'text', str(response))
+            for chunk in self.model.generate_content(prompt, stream=True):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = getattr(chunk, 'text', '')
+                if not text:
+                    continue
+                if not parts:
+                    ttft = time.perf_counter() - started
+                    registry.observe("kosmos_span_seconds", ttft, span="gemini_ttft")
+                    print(f"Tempo até o primeiro token: {ttft:.2f}s")
+                    if on_first_token is not None:
+                        on_first_token(ttft)
+                parts.append(text)
+                yield text
         except Exception as e:
-            print(f"Erro ao gerar hipótese com a API da Gemini: {e}")
-            return "Ocorreu um erro ao gerar a hipótese."
+            registry.inc("kosmos_errors_total", stage="gemini_generate")
+            print(f"{log_message}: {e}")
+            yield GenerationError(error_message)
+            return
+        # Inclui o tempo gasto pelo consumidor entre os trechos
+        registry.observe("kosmos_span_seconds", time.perf_counter() - started, span="gemini_stream")
+        record_tokens(prompt, "".join(parts), usage)
+        if on_complete is not None:
+            on_complete("".join(parts))
 
 if __name__ == '__main__':
     # Exemplo de uso simples (requer uma chave de API válida no .env)
@@ -0,0 +1,528 @@
+# src/ingestion_jobs.py
+"""
+Jobs de ingestão executados fora da thread do Streamlit.
+
+Responsabilidades:
+- Encapsular o pipeline busca/download (`ArxivProcessor`) → extração →
+  indexação (`RAGEngine`) como um job.
+- Usar um pool próprio por estágio: threads para download, processos para
+  extração e uma thread de embedding/indexação que consome a extração em lotes.
+- Expor o progresso de cada estágio para a interface consultar.
+- Permitir cancelamento e novas tentativas. O pipeline é idempotente: PDFs já
+  baixados, textos já extraídos e chunks já indexados são reaproveitados.
+- No modo de sincronização, processar apenas as novidades de uma busca salva
+  e reindexar papers com nova versão (ver `ArxivProcessor.sync_and_download`).
+
+Há dois backends: `LocalJobBackend` (threads no próprio processo, sem Redis,
+usado nos testes e por padrão) e `CeleryJobBackend` (workers Celery com Redis,
+configurados por CELERY_BROKER_URL / CELERY_RESULT_BACKEND).
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+STAGES = ("download", "extract", "index")
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """
+    Sinaliza que o job foi cancelado durante a execução.
+    """
+
+
+def new_progress():
+    """
+    Estrutura de progresso inicial de um job.
+    """
+    progress = {stage: {"done": 0, "total": 0, "errors": 0} for stage in STAGES}
+    progress["chunks_indexed"] = 0
+    progress["chunks_skipped"] = 0
+    return progress
+
+
+def chunk_metadata(paper):
+    """
+    Metadados do paper copiados para os chunks. A data de publicação e a
+    categoria também definem a partição de um índice particionado.
+    """
+    metadata = {"title": paper["title"]}
+    if paper.get("published"):
+        published = paper["published"]
+        metadata["published"] = published.isoformat() if hasattr(published, "isoformat") else published
+    if paper.get("primary_category"):
+        metadata["primary_category"] = paper["primary_category"]
+    return metadata
+
+
+def run_ingestion_pipeline(arxiv_proc, rag_eng, query, max_results, progress,
+                           on_progress=None, stop_event=None, download_workers=4,
+                           extract_workers=None, sync=False):
+    """
+    Executa o pipeline completo de ingestão para uma busca.
+
+    Args:
+        arxiv_proc (ArxivProcessor): Busca, download e extração.
+        rag_eng (RAGEngine): Chunking e indexação.
+        query (str): Termos de busca no arXiv.
+        max_results (int): Número máximo de papers.
+        progress (dict): Estrutura de `new_progress`, atualizada no lugar.
+        on_progress (callable): Chamado sem argumentos após cada atualização.
+        stop_event (threading.Event): Cancela o job quando sinalizado.
+        download_workers (int): Threads de download.
+        extract_workers (int): Processos de extração (None = número de CPUs).
+        sync (bool): Se True, processa só os papers novos ou atualizados desde
+                     a última sincronização da busca e, se tudo der certo,
+                     avança a marca d'água da busca.
+
+    Returns:
+        list: Metadados dos papers baixados (datas em ISO 8601).
+
+    Raises:
+        JobCancelled: Se `stop_event` for sinalizado.
+    """
+    notify = on_progress or (lambda: None)
+
+    def check_cancelled():
+        if stop_event is not None and stop_event.is_set():
+            raise JobCancelled()
+
+    # Estágio 1: busca e download (pool de threads com rate limit)
+    progress["download"]["total"] = max_results
+
+    def on_download(status):
+        progress["download"]["done"] += 1
+        if status == "error":
+            progress["download"]["errors"] += 1
+        notify()
+
+    if sync:
+        papers, watermark = arxiv_proc.sync_and_download(
+            query, max_results, max_workers=download_workers,
+            on_result=on_download, stop_event=stop_event
+        )
+    else:
+        papers = arxiv_proc.search_and_download(
+            query, max_results, max_workers=download_workers,
+            on_result=on_download, stop_event=stop_event
+        )
+    check_cancelled()
+    store = arxiv_proc.store
+    progress["download"]["total"] = progress["download"]["done"]
+    progress["extract"]["total"] = len(papers)
+    progress["index"]["total"] = len(papers)
+    notify()
+
+    # Estágios 2 e 3: a extração (pool de processos) alimenta a indexação em
+    # lotes, de modo que os dois estágios se sobrepõem
+    papers_by_path = {paper["filepath"]: paper for paper in papers}
+    # Nova versão de um paper conhecido: id da nova -> id da anterior
+    replaced = {paper["id"]: paper["replaces"] for paper in papers
+                if paper.get("replaces") and paper["replaces"] != paper["id"]}
+
+    def prepared_papers():
+        for filepath, pages in arxiv_proc.extract_pages_parallel(papers_by_path, max_workers=extract_workers):
+            check_cancelled()
+            paper = papers_by_path[filepath]
+            progress["extract"]["done"] += 1
+            if pages is None:
+                progress["extract"]["errors"] += 1
+                if store is not None:
+                    store.set_index_status(paper["id"], "error")
+                notify()
+                continue
+            notify()
+            # As páginas são lidas e chunkadas à medida que o `ingest` consome os chunks
+            yield rag_eng.prepare_pages(paper["id"], pages, chunk_metadata(paper))
+
+    def on_indexed(paper_id, ok):
+        # Chamado só depois que os lotes com os chunks do paper foram gravados
+        progress["index"]["done"] += 1
+        if not ok:
+            progress["index"]["errors"] += 1
+        if ok and paper_id in replaced:
+            # Os chunks da versão anterior só saem do índice depois que os da
+            # nova foram gravados; se a nova falhar, a anterior continua
+            # disponível para as buscas
+            rag_eng.delete_paper(replaced[paper_id])
+        if store is not None:
+            store.set_index_status(paper_id, "indexed" if ok else "error")
+        notify()
+
+    stats = rag_eng.ingest(prepared_papers(), on_paper=on_indexed)
+    progress["chunks_indexed"] += stats["chunks_indexed"]
+    progress["chunks_skipped"] += stats["chunks_skipped"]
+    if sync:
+        failed = any(progress[stage]["errors"] for stage in STAGES)
+        # Com falhas, a marca d'água fica onde estava e a próxima sincronização
+        # refaz o que faltou (os papers já indexados são pulados)
+        store.set_watermark(query, None if failed else watermark)
+    notify()
+
+    for paper in papers:
+        for key in ("published", "updated"):
+            if hasattr(paper.get(key), "isoformat"):
+                paper[key] = paper[key].isoformat()
+    return papers
+
+
+class IngestionJob:
+    """
+    Estado de um job de ingestão no backend local.
+    """
+    def __init__(self, query, max_results, sync=False):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.max_results = max_results
+        self.sync = sync
+        self.status = "queued"
+        self.progress = new_progress()
+        self.papers = []
+        self.error = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        """
+        Retrato do job para consulta pela interface.
+        """
+        with self.lock:
+            return {
+                "id": self.id,
+                "query": self.query,
+                "max_results": self.max_results,
+                "sync": self.sync,
+                "status": self.status,
+                "progress": {key: dict(value) if isinstance(value, dict) else value
+                             for key, value in self.progress.items()},
+                "papers": list(self.papers),
+                "error": self.error,
+                "attempts": self.attempts,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class LocalJobBackend:
+    """
+    Executa jobs em threads do próprio processo, sem dependências externas.
+    """
+    def __init__(self, arxiv_proc, rag_eng, max_concurrent_jobs=1, max_attempts=3, retry_delay=5.0):
+        """
+        Args:
+            arxiv_proc (ArxivProcessor): Componente de busca e extração.
+            rag_eng (RAGEngine): Componente de indexação.
+            max_concurrent_jobs (int): Jobs executados ao mesmo tempo.
+            max_attempts (int): Tentativas por job antes de marcá-lo como falho.
+            retry_delay (float): Espera (s) entre tentativas.
+        """
+        self.arxiv_proc = arxiv_proc
+        self.rag_eng = rag_eng
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="ingestion")
+
+    def submit(self, query, max_results, sync=False):
+        job = IngestionJob(query, max_results, sync)
+        self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job.stop_event.set()
+        with job.lock:
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+        return True
+
+    def list_jobs(self):
+        return [job.to_dict() for job in sorted(self._jobs.values(), key=lambda job: job.created_at)]
+
+    def _run(self, job):
+        while True:
+            with job.lock:
+                if job.stop_event.is_set():
+                    job.status = "cancelled"
+                    job.finished_at = time.time()
+                    return
+                job.status = "running"
+                job.attempts += 1
+                # Cada tentativa recomeça o progresso; o trabalho já feito é pulado
+                job.progress = new_progress()
+            try:
+                papers = run_ingestion_pipeline(
+                    self.arxiv_proc, self.rag_eng, job.query, job.max_results,
+                    job.progress, stop_event=job.stop_event, sync=job.sync
+                )
+            except JobCancelled:
+                with job.lock:
+                    job.status = "cancelled"
+                    job.finished_at = time.time()
+                return
+            except Exception as e:
+                traceback.print_exc()
+                with job.lock:
+                    job.error = str(e)
+                    if job.attempts >= self.max_attempts:
+                        job.status = "failed"
+                        job.finished_at = time.time()
+                        return
+                print(f"Job {job.id} falhou ({e}); nova tentativa em {self.retry_delay:.0f}s.")
+                job.stop_event.wait(self.retry_delay)
+                continue
+            with job.lock:
+                job.papers = papers
+                job.status = "completed"
+                job.error = None
+                job.finished_at = time.time()
+            return
+
+
+# --- Backend Celery -----------------------------------------------------------
+
+_celery = {}
+
+
+def get_celery_app():
+    """
+    Cria (uma vez) o app Celery e registra a task de ingestão.
+    O import do Celery é adiado até aqui para não pesar na inicialização.
+
+    Raises:
+        ImportError: Se o pacote `celery` não estiver instalado.
+    """
+    if "app" in _celery:
+        return _celery["app"]
+    from celery import Celery
+
+    broker_url = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+    app = Celery("kosmos_synesis", broker=broker_url,
+                 backend=os.getenv("CELERY_RESULT_BACKEND", broker_url))
+    app.conf.task_track_started = True
+    # Guarda os argumentos das tasks, usados por `JobManager.retry`
+    app.conf.result_extended = True
+    # O pipeline é idempotente, então é seguro reexecutar após a queda de um worker
+    app.conf.task_acks_late = True
+
+    worker_components = {}
+
+    def components():
+        """
+        Componentes criados uma vez por processo worker.
+        """
+        if not worker_components:
+            from arxiv_processor import ArxivProcessor
+            from rag_engine import RAGEngine
+            worker_components["arxiv_proc"] = ArxivProcessor(
+                data_path=os.getenv("PAPERS_DATA_PATH", "data/papers"))
+            worker_components["rag_eng"] = RAGEngine(
+                db_path=os.getenv("CHROMADB_PATH", "data/embeddings"))
+        return worker_components["arxiv_proc"], worker_components["rag_eng"]
+
+    @app.task(bind=True, name="kosmos_synesis.ingest", autoretry_for=(Exception,),
+              dont_autoretry_for=(JobCancelled,), retry_backoff=True, max_retries=2)
+    def ingest_task(self, query, max_results, sync=False):
+        """
+        Task Celery que executa o pipeline e publica o progresso no backend de resultados.
+        """
+        arxiv_proc, rag_eng = components()
+        progress = new_progress()
+        last_update = [0.0]
+
+        def publish():
+            now = time.monotonic()
+            if now - last_update[0] >= 1.0:
+                last_update[0] = now
+                self.update_state(state="PROGRESS", meta={"progress": progress})
+
+        papers = run_ingestion_pipeline(arxiv_proc, rag_eng, query, max_results, progress,
+                                        on_progress=publish, sync=sync)
+        return {"progress": progress, "papers": papers}
+
+    _celery["app"] = app
+    _celery["ingest_task"] = ingest_task
+    return app
+
+
+def __getattr__(name):
+    # Permite `celery -A ingestion_jobs.celery_app worker` sem importar o
+    # Celery quando o módulo é usado apenas com o backend local.
+    if name == "celery_app":
+        return get_celery_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class CeleryJobBackend:
+    """
+    Executa jobs em workers Celery (broker e resultados em Redis).
+
+    Inicie os workers com:
+        celery -A ingestion_jobs.celery_app worker --workdir src
+    """
+    _STATES = {
+        "PENDING": "queued", "RECEIVED": "queued", "STARTED": "running",
+        "PROGRESS": "running", "RETRY": "running", "SUCCESS": "completed",
+        "FAILURE": "failed", "REVOKED": "cancelled",
+    }
+    # Conjunto ordenado no Redis com os IDs dos jobs submetidos, pelo horário
+    # de submissão: o Celery não oferece uma forma de listar as tasks
+    JOBS_KEY = "kosmos_synesis:ingestion_jobs"
+    MAX_LISTED_JOBS = 1000
+
+    def __init__(self):
+        try:
+            self.app = get_celery_app()
+        except ImportError as e:
+            raise ImportError("O backend Celery requer o pacote 'celery' instalado.") from e
+        self._redis_client = None
+
+    def submit(self, query, max_results, sync=False):
+        job_id = _celery["ingest_task"].delay(query, max_results, sync).id
+        redis = self._redis()
+        redis.zadd(self.JOBS_KEY, {job_id: time.time()})
+        redis.zremrangebyrank(self.JOBS_KEY, 0, -self.MAX_LISTED_JOBS - 1)
+        return job_id
+
+    def _redis(self):
+        if self._redis_client is None:
+            # O mesmo Redis do backend de resultados (ver `get_celery_app`)
+            import redis
+            broker_url = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+            self._redis_client = redis.Redis.from_url(os.getenv("CELERY_RESULT_BACKEND", broker_url))
+        return self._redis_client
+
+    def get(self, job_id):
+        result = self.app.AsyncResult(job_id)
+        info = result.info if isinstance(result.info, dict) else {}
+        error = None
+        if result.state == "FAILURE":
+            error = str(result.info)
+        args = tuple(result.args or ()) + (None, None, False)
+        return {
+            "id": job_id,
+            "query": args[0],
+            "max_results": args[1],
+            "sync": bool(args[2]),
+            "status": self._STATES.get(result.state, "running"),
+            "progress": info.get("progress", new_progress()),
+            "papers": info.get("papers", []),
+            "error": error,
+        }
+
+    def cancel(self, job_id):
+        # O pipeline é idempotente e grava arquivos de forma atômica, então
+        # interromper o worker no meio do job não deixa estado corrompido.
+        self.app.control.revoke(job_id, terminate=True)
+        return True
+
+    def list_jobs(self):
+        jobs = []
+        for job_id, created_at in self._redis().zrange(self.JOBS_KEY, 0, -1, withscores=True):
+            job = self.get(job_id.decode("utf-8") if isinstance(job_id, bytes) else job_id)
+            job["created_at"] = created_at
+            jobs.append(job)
+        return jobs
+
+
+class JobManager:
+    """
+    Fachada usada pela interface para submeter e acompanhar jobs de ingestão.
+    """
+    def __init__(self, backend):
+        """
+        Args:
+            backend: `LocalJobBackend` ou `CeleryJobBackend`.
+        """
+        self.backend = backend
+
+    @classmethod
+    def from_env(cls, arxiv_proc, rag_eng):
+        """
+        Escolhe o backend pela variável INGESTION_BACKEND ("local" ou "celery").
+        """
+        if os.getenv("INGESTION_BACKEND", "local").lower() == "celery":
+            return cls(CeleryJobBackend())
+        return cls(LocalJobBackend(arxiv_proc, rag_eng))
+
+    def submit(self, query, max_results, sync=False):
+        """
+        Enfileira um job de ingestão e retorna seu ID.
+
+        Args:
+            query (str): Termos de busca no arXiv.
+            max_results (int): Número máximo de papers.
+            sync (bool): Se True, sincroniza só as novidades desde a última
+                         sincronização da busca.
+        """
+        return self.backend.submit(query, max_results, sync)
+
+    def get(self, job_id):
+        """
+        Retorna o estado do job (status, progresso por estágio, papers, erro).
+        """
+        return self.backend.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Solicita o cancelamento do job.
+        """
+        return self.backend.cancel(job_id)
+
+    def list_jobs(self):
+        """
+        Lista os jobs submetidos, do mais antigo ao mais recente.
+        """
+        return self.backend.list_jobs()
+
+    def retry(self, job_id):
+        """
+        Reexecuta um job com os mesmos parâmetros. O trabalho já concluído é
+        reaproveitado, então a nova execução só faz o que faltou.
+        """
+        job = self.get(job_id)
+        if job is None or job.get("query") is None:
+            raise ValueError(f"Job desconhecido ou sem parâmetros: {job_id}")
+        return self.submit(job["query"], job["max_results"], job.get("sync", False))
+
+
+if __name__ == '__main__':
+    # Sincronização das buscas salvas, por exemplo em um cron noturno:
+    #   python src/ingestion_jobs.py --all
+    #   python src/ingestion_jobs.py "quantum computing" --max-results 200
+    import argparse
+    from arxiv_processor import ArxivProcessor
+    from rag_engine import RAGEngine
+
+    parser = argparse.ArgumentParser(description="Sincroniza buscas do arXiv com o índice local.")
+    parser.add_argument("queries", nargs="*", help="Buscas a sincronizar.")
+    parser.add_argument("--all", action="store_true", help="Sincroniza todas as buscas salvas.")
+    parser.add_argument("--max-results", type=int, default=1000)
+    args = parser.parse_args()
+
+    arxiv_proc = ArxivProcessor(data_path=os.getenv("PAPERS_DATA_PATH", "data/papers"))
+    rag_eng = RAGEngine(db_path=os.getenv("CHROMADB_PATH", "data/embeddings"))
+    queries = list(args.queries)
+    if args.all:
+        queries += [saved["query"] for saved in arxiv_proc.store.saved_queries() if saved["query"] not in queries]
+    for query in queries:
+        started = time.perf_counter()
+        progress = new_progress()
+        papers = run_ingestion_pipeline(arxiv_proc, rag_eng, query, args.max_results, progress, sync=True)
+        print(f"'{query}': {len(papers)} papers novos ou atualizados, {progress['chunks_indexed']} chunks "
+              f"indexados em {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,118 @@
+# src/load_test.py
+"""
+Teste de carga do serviço HTTP (`api_server`).
+
+Simula muitos pesquisadores fazendo perguntas ao mesmo tempo: cada cliente
+envia requisições em sequência, e os clientes rodam em paralelo. São medidos
+a vazão, a latência p50/p95/p99 das respostas com sucesso e o número de
+requisições recusadas por sobrecarga (503) ou com erro.
+
+Uso:
+    python src/api_server.py --port 8000 &
+    python src/load_test.py --url http://127.0.0.1:8000 --endpoint retrieve --clients 200 --requests 5000
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_utils import build_corpus, percentile
+
+
+def send(url, payload, timeout=60.0):
+    """
+    Envia uma requisição POST com corpo JSON.
+
+    Returns:
+        tuple: (status HTTP ou None em caso de erro de conexão, segundos).
+    """
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = None
+    return status, time.perf_counter() - started
+
+
+def run_load_test(url, endpoint, queries, clients=100, requests=1000, mode="hybrid", n_results=5):
+    """
+    Dispara `requests` requisições com `clients` clientes concorrentes.
+
+    Returns:
+        dict: Vazão, latências (ms) das respostas 200 e contagem por status.
+    """
+    target = f"{url.rstrip('/')}/{endpoint}"
+    statuses = {}
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            status, seconds = send(target, {"query": queries[i % len(queries)], "mode": mode,
+                                            "n_results": n_results})
+            with lock:
+                key = str(status) if status is not None else "connection_error"
+                statuses[key] = statuses.get(key, 0) + 1
+                if status == 200:
+                    latencies.append(seconds)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        for _ in range(clients):
+            executor.submit(client)
+    seconds = time.perf_counter() - started
+
+    report = {
+        "endpoint": endpoint,
+        "clients": clients,
+        "requests": requests,
+        "seconds": seconds,
+        "requests_per_sec": requests / seconds if seconds else 0.0,
+        "ok_per_sec": len(latencies) / seconds if seconds else 0.0,
+        "statuses": statuses,
+    }
+    if latencies:
+        for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            report[f"{name}_ms"] = percentile(latencies, fraction) * 1000
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Teste de carga do serviço HTTP do Kosmos-Synesis.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["retrieve", "answer", "hypothesis"], default="retrieve")
+    parser.add_argument("--clients", type=int, default=100, help="Clientes concorrentes.")
+    parser.add_argument("--requests", type=int, default=1000, help="Total de requisições.")
+    parser.add_argument("--mode", choices=["vector", "lexical", "hybrid"], default="hybrid")
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--queries", help="Arquivo com uma pergunta por linha (padrão: perguntas sintéticas).")
+    parser.add_argument("--output", help="Grava o relatório em JSON.")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        _, queries = build_corpus(n_docs=0, n_queries=500, seed=29)
+
+    report = run_load_test(args.url, args.endpoint, queries, clients=args.clients, requests=args.requests,
+                           mode=args.mode, n_results=args.n_results)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
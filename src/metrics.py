@@ -0,0 +1,238 @@
+# src/metrics.py
+"""
+Instrumentação dos caminhos críticos: spans de tempo, contadores e rastros.
+
+- `registry.span(nome)` mede um trecho e alimenta o histograma
+  `kosmos_span_seconds{span="nome"}`; exceções que atravessam o span contam em
+  `kosmos_errors_total{stage="nome"}`.
+- `registry.inc(nome, valor, **rótulos)` incrementa um contador.
+- `registry.render()` gera o formato de texto do Prometheus, servido em
+  `/metrics` por `start_exporter` (ou pela API HTTP).
+- `trace(nome)` abre um rastro por requisição: os spans e contadores
+  registrados no mesmo contexto (mesma thread ou tarefa) entram no rastro,
+  que mostra para onde foi o tempo de uma consulta.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites (s) dos buckets dos histogramas de duração
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_HELP = {
+    "kosmos_span_seconds": "Duração dos trechos instrumentados.",
+    "kosmos_errors_total": "Erros por etapa.",
+    "kosmos_download_bytes_total": "Bytes de PDF baixados.",
+    "kosmos_downloads_total": "PDFs processados pelo downloader, por status.",
+    "kosmos_pages_extracted_total": "Páginas de PDF extraídas.",
+    "kosmos_chunks_indexed_total": "Chunks embutidos e gravados no índice.",
+    "kosmos_chunks_skipped_total": "Chunks ignorados por já estarem indexados.",
+    "kosmos_gemini_tokens_total": "Tokens enviados e recebidos da API do Gemini.",
+    "kosmos_cache_requests_total": "Consultas aos caches, por resultado (hit/miss).",
+    "kosmos_query_embedding_batches_total": "Chamadas ao modelo para embutir lotes de queries.",
+    "kosmos_query_embedding_batched_total": "Queries embutidas em lote.",
+    "kosmos_api_requests_total": "Requisições à API HTTP, por endpoint e status.",
+}
+
+_current_trace = contextvars.ContextVar("kosmos_trace", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class Trace:
+    """
+    Rastro de uma requisição: spans (com início relativo) e contadores.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+        self.counters = {}
+
+    def add_span(self, name, started, seconds, labels):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round(seconds * 1000, 3),
+            **labels,
+        })
+
+    def add_counter(self, name, value, labels):
+        key = name + _format_labels(_label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        seconds = self.seconds if self.seconds is not None else time.perf_counter() - self.started
+        return {
+            "name": self.name,
+            "total_ms": round(seconds * 1000, 3),
+            "spans": list(self.spans),
+            "counters": dict(self.counters),
+        }
+
+
+@contextmanager
+def trace(name):
+    """
+    Abre um rastro para a requisição atual.
+
+    Exemplo:
+        with trace("query") as t:
+            ...
+        print(t.to_dict())
+    """
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - current.started
+        _current_trace.reset(token)
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas em memória, seguros entre threads.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Incrementa o contador `name` com os rótulos informados.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        current = _current_trace.get()
+        if current is not None:
+            current.add_counter(name, value, labels)
+
+    def observe(self, name, seconds, **labels):
+        """
+        Registra uma duração no histograma `name`.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Mede o bloco `with` como o span `name`.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("kosmos_errors_total", stage=name)
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe("kosmos_span_seconds", seconds, span=name, **labels)
+            current = _current_trace.get()
+            if current is not None:
+                current.add_span(name, started, seconds, labels)
+
+    def snapshot(self):
+        """
+        Retorna os contadores e o resumo (contagem, soma) dos histogramas.
+        """
+        with self._lock:
+            return {
+                "counters": {name + _format_labels(labels): value
+                             for (name, labels), value in sorted(self._counters.items())},
+                "spans": {name + _format_labels(labels): {"count": histogram[2], "sum": round(histogram[1], 6)}
+                          for (name, labels), histogram in sorted(self._histograms.items())},
+            }
+
+    def render(self):
+        """
+        Gera as métricas no formato de texto do Prometheus.
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, [list(value[0]), value[1], value[2]])
+                                for key, value in self._histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), (bucket_counts, total, count) in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {bucket_count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+def start_exporter(port=9108, host="127.0.0.1"):
+    """
+    Serve `registry.render()` em http://host:port/metrics, em uma thread.
+
+    Returns:
+        ThreadingHTTPServer: O servidor (use `shutdown()` para pará-lo).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    print(f"Métricas disponíveis em http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,274 @@
+# src/paper_store.py
+"""
+Índice local e persistente dos metadados de todos os papers já vistos.
+
+Responsabilidades:
+- Guardar ID, versão, título, autores, datas, caminho do PDF e status de
+  indexação de cada paper, em SQLite.
+- Detectar novas versões de papers já conhecidos (ex.: 2305.12345v1 → v2).
+- Associar papers às buscas salvas e guardar a marca d'água (maior data de
+  atualização já sincronizada) de cada busca, usada pela sincronização
+  incremental (`ArxivProcessor.sync_and_download`).
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+_VERSION_RE = re.compile(r"^(.+?)v(\d+)$")
+
+INDEX_STATUSES = ("pending", "indexed", "error")
+
+
+def split_entry_id(entry_id):
+    """
+    Separa um ID do arXiv (ou a URL `entry_id`) em ID sem versão e versão.
+
+    Ex.: "http://arxiv.org/abs/2305.12345v2" → ("2305.12345", 2).
+    IDs sem versão são tratados como versão 1.
+    """
+    short_id = entry_id.split("/abs/")[-1]
+    match = _VERSION_RE.match(short_id)
+    if match:
+        return match.group(1), int(match.group(2))
+    return short_id, 1
+
+
+def _query_key(query):
+    # Só os espaços são normalizados: a caixa importa na sintaxe do arXiv (AND, OR)
+    return " ".join(query.split())
+
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+class PaperStore:
+    """
+    Metadados de papers e estado de sincronização das buscas, em SQLite.
+    """
+    def __init__(self, path="data/papers.sqlite3"):
+        """
+        Args:
+            path (str): Caminho do arquivo SQLite.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                paper_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                entry_id TEXT NOT NULL,
+                title TEXT,
+                summary TEXT,
+                authors TEXT,
+                published TEXT,
+                updated TEXT,
+                filepath TEXT,
+                index_status TEXT NOT NULL DEFAULT 'pending',
+                indexed_at REAL,
+                first_seen REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS papers_published ON papers (published);
+            CREATE TABLE IF NOT EXISTS query_papers (
+                query TEXT NOT NULL,
+                paper_id TEXT NOT NULL,
+                PRIMARY KEY (query, paper_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sync_state (
+                query TEXT PRIMARY KEY,
+                watermark TEXT,
+                last_sync REAL
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def record(self, paper, query=None):
+        """
+        Insere ou atualiza um paper (dicionário no formato de
+        `ArxivProcessor.search_and_download`).
+
+        Uma versão mais nova de um paper conhecido substitui a anterior e volta
+        ao status "pending". Versões mais antigas que a registrada são ignoradas.
+
+        Args:
+            paper (dict): Metadados do paper (id, title, summary, authors,
+                          published, updated, filepath).
+            query (str): Busca à qual o paper é associado.
+
+        Returns:
+            tuple: (situação, entry_id_anterior), com situação "new",
+                   "new_version" ou "unchanged". `entry_id_anterior` só é
+                   preenchido para "new_version".
+        """
+        paper_id, version = split_entry_id(paper["id"])
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT version, entry_id FROM papers WHERE paper_id = ?", (paper_id,)
+            ).fetchone()
+            if row is None:
+                status, previous = "new", None
+            elif version > row[0]:
+                status, previous = "new_version", row[1]
+            else:
+                status, previous = "unchanged", None
+
+            values = (
+                paper["id"], paper.get("title"), paper.get("summary"),
+                json.dumps(paper.get("authors") or []), _isoformat(paper.get("published")),
+                _isoformat(paper.get("updated")), paper.get("filepath"),
+            )
+            if status == "new":
+                self._conn.execute(
+                    "INSERT INTO papers (entry_id, title, summary, authors, published, updated, filepath, "
+                    "paper_id, version, first_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    values + (paper_id, version, time.time())
+                )
+            elif status == "new_version":
+                self._conn.execute(
+                    "UPDATE papers SET entry_id = ?, title = ?, summary = ?, authors = ?, published = ?, "
+                    "updated = ?, filepath = ?, version = ?, index_status = 'pending', indexed_at = NULL "
+                    "WHERE paper_id = ?",
+                    values + (version, paper_id)
+                )
+            elif version == row[0] and paper.get("filepath"):
+                self._conn.execute("UPDATE papers SET filepath = ? WHERE paper_id = ?",
+                                   (paper["filepath"], paper_id))
+            if query is not None:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO query_papers (query, paper_id) VALUES (?, ?)",
+                    (_query_key(query), paper_id)
+                )
+        return status, previous
+
+    def get(self, paper_id):
+        """
+        Retorna os metadados de um paper (com ou sem versão no ID), ou None.
+        """
+        base_id, _ = split_entry_id(paper_id)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM papers WHERE paper_id = ?", (base_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def is_indexed(self, entry_id):
+        """
+        Indica se esta versão (ou uma mais nova) do paper já foi indexada.
+        """
+        paper_id, version = split_entry_id(entry_id)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, index_status FROM papers WHERE paper_id = ?", (paper_id,)
+            ).fetchone()
+        if row is None:
+            return False
+        return row[0] > version or (row[0] == version and row[1] == "indexed")
+
+    def set_index_status(self, entry_id, status):
+        """
+        Atualiza o status de indexação ("pending", "indexed" ou "error") de
+        uma versão de um paper.
+        """
+        if status not in INDEX_STATUSES:
+            raise ValueError(f"Status de indexação desconhecido: {status}")
+        paper_id, version = split_entry_id(entry_id)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE papers SET index_status = ?, indexed_at = ? WHERE paper_id = ? AND version = ?",
+                (status, time.time() if status == "indexed" else None, paper_id, version)
+            )
+
+    def list_papers(self, query=None, limit=None):
+        """
+        Lista papers, do mais ao menos recente, opcionalmente só os de uma busca.
+
+        Returns:
+            list: Dicionários no formato de `search_and_download`, com
+                  `version`, `updated` e `index_status` adicionais.
+        """
+        sql = f"SELECT {self._COLUMNS} FROM papers"
+        params = []
+        if query is not None:
+            sql += " WHERE paper_id IN (SELECT paper_id FROM query_papers WHERE query = ?)"
+            params.append(_query_key(query))
+        sql += " ORDER BY published DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count(self):
+        """
+        Número de papers conhecidos.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def get_watermark(self, query):
+        """
+        Retorna a marca d'água (datetime) da busca, ou None se nunca sincronizada.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark FROM sync_state WHERE query = ?", (_query_key(query),)
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def set_watermark(self, query, watermark):
+        """
+        Salva a marca d'água da busca e o horário da sincronização.
+        Se `watermark` for None, só o horário é atualizado.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (query, watermark, last_sync) VALUES (?, ?, ?) "
+                "ON CONFLICT (query) DO UPDATE SET "
+                "watermark = COALESCE(excluded.watermark, watermark), last_sync = excluded.last_sync",
+                (_query_key(query), _isoformat(watermark), time.time())
+            )
+
+    def saved_queries(self):
+        """
+        Lista as buscas já sincronizadas, com marca d'água e último horário de sincronização.
+
+        Returns:
+            list: Dicionários com query, watermark e last_sync.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, watermark, last_sync FROM sync_state ORDER BY query"
+            ).fetchall()
+        return [{"query": query, "watermark": watermark, "last_sync": last_sync}
+                for query, watermark, last_sync in rows]
+
+    _COLUMNS = ("entry_id, paper_id, version, title, summary, authors, published, updated, "
+                "filepath, index_status")
+
+    @staticmethod
+    def _to_dict(row):
+        entry_id, paper_id, version, title, summary, authors, published, updated, filepath, index_status = row
+        return {
+            "id": entry_id,
+            "paper_id": paper_id,
+            "version": version,
+            "title": title,
+            "summary": summary,
+            "authors": json.loads(authors) if authors else [],
+            "published": published,
+            "updated": updated,
+            "filepath": filepath,
+            "index_status": index_status,
+        }
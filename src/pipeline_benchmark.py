@@ -0,0 +1,341 @@
+# src/pipeline_benchmark.py
+"""
+Benchmark de ponta a ponta do pipeline de ingestão e consulta.
+
+Roda offline: os PDFs são gerados localmente (PyMuPDF), os embeddings vêm de
+um backend de hashing determinístico (ou de um backend real, com `--backend`)
+e o Gemini é substituído por um modelo falso com latência configurável.
+
+Métricas:
+- extração: páginas/s de `ArxivProcessor.extract_texts_parallel`;
+- ingestão: chunks embutidos e indexados/s de `RAGEngine.ingest`;
+- tamanho do índice em disco (ChromaDB + BM25) em cada escala;
+- latência de busca p50/p95/p99 por modo em cada escala (padrão: 10k, 100k e 1M chunks);
+- latência de ponta a ponta de uma pergunta (busca + empacotamento + geração).
+
+Os resultados são gravados em JSON com métricas planas ("nome@escala"). Com
+`--baseline`, cada métrica é comparada à de uma execução anterior e o
+processo termina com código 1 se alguma piorar além da tolerância.
+
+Uso:
+    python src/pipeline_benchmark.py --output bench.json
+    python src/pipeline_benchmark.py --quick --baseline bench.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from contextlib import redirect_stdout
+
+import numpy
+
+from arxiv_processor import ArxivProcessor
+from benchmark_utils import build_corpus, percentile
+from bm25_index import tokenize
+from context_packer import ContextPacker
+from embedding_backends import EmbeddingBackend, create_backend
+from rag_engine import RAGEngine
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+# Métricas em que um valor maior é melhor; nas demais, menor é melhor
+HIGHER_IS_BETTER = ("_per_sec",)
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Backend de embedding determinístico e sem modelo (feature hashing dos
+    termos), para medir o pipeline sem o custo nem o download de um modelo.
+    """
+    def __init__(self, dimension=384, **kwargs):
+        super().__init__("hashing", **kwargs)
+        self.dimension = dimension
+        self.name = "hash"
+
+    def _load(self):
+        # Não há modelo: `embed` calcula os vetores diretamente
+        return None
+
+    def embed(self, texts):
+        vectors = numpy.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                digest = zlib.crc32(term.encode("utf-8"))
+                vectors[row, digest % self.dimension] += 1.0 if digest & 1 else -1.0
+        norms = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(self.dtype)
+
+
+class FakeGeminiModel:
+    """
+    Substitui o modelo do Gemini, com latência fixa e resposta proporcional ao prompt.
+    """
+    model_name = "fake-gemini"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def generate_content(self, prompt, stream=False):
+        time.sleep(self.latency)
+        response = type("Response", (), {"text": f"Resposta sintética para um prompt de {len(prompt)} caracteres [1]."})()
+        return [response] if stream else response
+
+
+def latency_summary(seconds, prefix, metrics, suffix=""):
+    """
+    Grava p50/p95/p99 (em ms) de uma lista de durações em `metrics`.
+    """
+    for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        metrics[f"{prefix}.{name}_ms{suffix}"] = percentile(seconds, fraction) * 1000
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+
+def generate_pdfs(directory, n_pdfs=20, pages_per_pdf=10, seed=7):
+    """
+    Gera PDFs sintéticos com seções numeradas e parágrafos de texto científico.
+
+    Returns:
+        list: Caminhos dos PDFs gerados.
+    """
+    import fitz  # PyMuPDF
+
+    passages, _ = build_corpus(n_docs=n_pdfs * pages_per_pdf * 3, n_queries=0, seed=seed)
+    paths = []
+    for pdf_index in range(n_pdfs):
+        doc = fitz.open()
+        for page_index in range(pages_per_pdf):
+            start = (pdf_index * pages_per_pdf + page_index) * 3
+            text = f"{page_index + 1} Section {page_index + 1}\n\n" + "\n\n".join(passages[start:start + 3])
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=10)
+        path = os.path.join(directory, f"synthetic-{pdf_index:04d}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def synthetic_papers(start, stop, chunks_per_paper=100, seed=11):
+    """
+    Gera papers (paper_id, chunks, metadados) no formato de `RAGEngine.ingest`,
+    com os chunks de número `start` a `stop - 1`.
+    """
+    passages, _ = build_corpus(n_docs=5000, n_queries=0, seed=seed)
+    rng = random.Random(seed + start)
+    for first in range(start, stop, chunks_per_paper):
+        paper_id = f"synthetic/{first // chunks_per_paper:07d}"
+        count = min(chunks_per_paper, stop - first)
+        chunks = [f"{rng.choice(passages)} (chunk {first + i})" for i in range(count)]
+        # Dez anos de publicação, para exercitar os índices particionados por período
+        published = f"{2015 + first // chunks_per_paper % 10}-01-01T00:00:00+00:00"
+        metadatas = [{"paper_id": paper_id, "title": f"Synthetic paper {paper_id}", "chunk_index": i,
+                      "published": published}
+                     for i in range(count)]
+        yield paper_id, chunks, metadatas
+
+
+def bench_extraction(workdir, metrics, n_pdfs, pages_per_pdf, workers):
+    print(f"Gerando {n_pdfs} PDFs sintéticos de {pages_per_pdf} páginas...")
+    pdf_dir = os.path.join(workdir, "pdfs")
+    os.makedirs(pdf_dir)
+    paths = generate_pdfs(pdf_dir, n_pdfs, pages_per_pdf)
+
+    processor = ArxivProcessor(data_path=pdf_dir, cache_dir=None, store_path=None)
+    started = time.perf_counter()
+    texts = {filepath: text for filepath, text in processor.extract_texts_parallel(paths, max_workers=workers)}
+    seconds = time.perf_counter() - started
+    pages = sum(text.count("\f") + 1 for text in texts.values() if text)
+    metrics["extraction.pages_per_sec"] = pages / seconds if seconds else 0.0
+    return texts, pages
+
+
+def bench_ingest_pdfs(rag, texts, metrics):
+    papers = (rag.prepare_text(os.path.basename(filepath), text, {"title": os.path.basename(filepath)})
+              for filepath, text in texts.items() if text)
+    stats = rag.ingest(papers)
+    metrics["ingest.pdf_chunks_per_sec"] = stats["chunks_per_sec"]
+    return stats["chunks_indexed"]
+
+
+def bench_retrieval(rag, queries, metrics, scale, n_results=5):
+    runs = [(mode, mode, None) for mode in RETRIEVAL_MODES]
+    # Num índice particionado, mede também as buscas restritas a uma partição
+    # (a mais recente), o caso que o particionamento acelera
+    partitions = rag.partitions()
+    if partitions:
+        runs += [(f"{mode}_one_partition", mode, partitions[-1:]) for mode in ("vector", "hybrid")]
+    for name, mode, restrict_to in runs:
+        latencies = []
+        for query in queries:
+            # Sem cache: cada busca paga o embedding da query e a consulta ao índice
+            rag.retrieval_cache.clear()
+            rag.query_embedding_cache.clear()
+            started = time.perf_counter()
+            rag.retrieve(query, n_results=n_results, mode=mode, partitions=restrict_to)
+            latencies.append(time.perf_counter() - started)
+        latency_summary(latencies, f"retrieval.{name}", metrics, f"@{scale}")
+
+
+def bench_end_to_end(rag, gemini, queries, metrics, scale):
+    packer = ContextPacker(max_tokens=3000)
+    latencies = []
+    for query in queries:
+        rag.retrieval_cache.clear()
+        rag.query_embedding_cache.clear()
+        started = time.perf_counter()
+        # O relatório impresso a cada pergunta pelo empacotador não interessa aqui
+        with redirect_stdout(io.StringIO()):
+            results = rag.retrieve(query, n_results=5, mode="hybrid")
+            packed = packer.pack(results)
+            gemini.generate_response(query, packed["docs"])
+        latencies.append(time.perf_counter() - started)
+    latency_summary(latencies, "query.end_to_end", metrics, f"@{scale}")
+
+
+def make_gemini(latency):
+    from gemini_api import GeminiAPI
+    # O modelo falso dispensa a chave, mas o construtor ainda a exige
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    gemini = GeminiAPI(models_cache_path=None)
+    gemini.model = FakeGeminiModel(latency)
+    return gemini
+
+
+def run_benchmark(args):
+    """
+    Executa todas as etapas e retorna o relatório (metadados + métricas).
+    """
+    workdir = tempfile.mkdtemp(prefix="kosmos-bench-")
+    metrics = {}
+    counts = {}
+    try:
+        backend = HashingBackend() if args.backend == "hash" else create_backend(args.backend)
+        hnsw = {"M": args.hnsw_m, "ef_search": args.hnsw_ef_search}
+        rag = RAGEngine(db_path=os.path.join(workdir, "embeddings"), embedding_backend=backend,
+                        partition_by=args.partition_by,
+                        hnsw={key: value for key, value in hnsw.items() if value is not None})
+        gemini = make_gemini(args.gemini_latency)
+        _, queries = build_corpus(n_docs=0, n_queries=args.queries, seed=23)
+
+        texts, counts["pages"] = bench_extraction(workdir, metrics, args.pdfs, args.pages, args.workers)
+        counts["pdf_chunks"] = bench_ingest_pdfs(rag, texts, metrics)
+
+        indexed = rag.collection.count()
+        for scale in sorted(args.scales):
+            if scale > indexed:
+                print(f"Indexando chunks sintéticos até {scale}...")
+                stats = rag.ingest(synthetic_papers(indexed, scale), report=False)
+                metrics[f"ingest.chunks_per_sec@{scale}"] = stats["chunks_per_sec"]
+                indexed = rag.collection.count()
+            metrics[f"index.size_bytes@{scale}"] = directory_size(rag.db_path)
+            print(f"Medindo buscas com {indexed} chunks...")
+            bench_retrieval(rag, queries, metrics, scale)
+            bench_end_to_end(rag, gemini, queries, metrics, scale)
+    finally:
+        if args.keep:
+            print(f"Arquivos do benchmark mantidos em {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "counts": counts,
+        },
+        "metrics": metrics,
+    }
+
+
+def compare_to_baseline(current, baseline, tolerance=0.10):
+    """
+    Compara as métricas com as de uma execução anterior.
+
+    Returns:
+        list: Dicionários (metric, baseline, current, change, regression),
+              com `change` relativo e `regression` True quando a métrica
+              piorou mais que `tolerance`.
+    """
+    rows = []
+    for name, value in sorted(current["metrics"].items()):
+        old = baseline.get("metrics", {}).get(name)
+        if old is None or not old:
+            continue
+        change = (value - old) / old
+        higher_is_better = any(marker in name for marker in HIGHER_IS_BETTER)
+        worse = -change if higher_is_better else change
+        rows.append({"metric": name, "baseline": old, "current": value,
+                     "change": change, "regression": worse > tolerance})
+    return rows
+
+
+def print_report(report, comparison=None):
+    print("\nResultados:")
+    for name, value in sorted(report["metrics"].items()):
+        print(f"  {name:<45}{value:>14.2f}")
+    if comparison:
+        print("\nComparação com a linha de base:")
+        for row in comparison:
+            flag = "  << REGRESSÃO" if row["regression"] else ""
+            print(f"  {row['metric']:<45}{row['baseline']:>14.2f}{row['current']:>14.2f}"
+                  f"{row['change']:>+9.1%}{flag}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de ingestão e consulta.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="Tamanhos do índice (em chunks) em que as buscas são medidas.")
+    parser.add_argument("--pdfs", type=int, default=50, help="Número de PDFs sintéticos.")
+    parser.add_argument("--pages", type=int, default=10, help="Páginas por PDF.")
+    parser.add_argument("--workers", type=int, help="Processos de extração (padrão: número de CPUs).")
+    parser.add_argument("--queries", type=int, default=200, help="Buscas por modo e escala.")
+    parser.add_argument("--backend", default="hash",
+                        help="Backend de embedding: 'hash' (offline) ou um de embedding_backends.BACKENDS.")
+    parser.add_argument("--partition-by", choices=["category", "year", "month"],
+                        help="Particiona o índice vetorial (ver vector_index).")
+    parser.add_argument("--hnsw-m", type=int, help="Parâmetro M do HNSW.")
+    parser.add_argument("--hnsw-ef-search", type=int, help="ef de busca do HNSW.")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="Latência (s) do Gemini falso.")
+    parser.add_argument("--quick", action="store_true", help="Execução curta (1k e 10k chunks, 10 PDFs).")
+    parser.add_argument("--keep", action="store_true", help="Mantém os PDFs e o índice gerados.")
+    parser.add_argument("--output", help="Grava o relatório em JSON.")
+    parser.add_argument("--baseline", help="Relatório JSON anterior para comparação.")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Piora relativa tolerada antes de acusar regressão.")
+    args = parser.parse_args()
+    if args.quick:
+        args.scales, args.pdfs, args.queries = [1000, 10000], 10, 50
+
+    report = run_benchmark(args)
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison = compare_to_baseline(report, json.load(f), args.tolerance)
+        report["baseline"] = {"path": args.baseline, "tolerance": args.tolerance, "comparison": comparison}
+    print_report(report, comparison)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if comparison and any(row["regression"] for row in comparison):
+        sys.exit(1)
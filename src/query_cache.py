@@ -0,0 +1,92 @@
+# src/query_cache.py
+"""
+Cache em memória (LRU + TTL) para embeddings de queries e resultados de busca.
+
+Cada entrada guarda quanto tempo custou para ser calculada, o que permite
+reportar a latência economizada pelos acertos.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import registry
+
+
+def normalize_query(query):
+    """
+    Normaliza uma query para uso como chave de cache: ignora caixa e espaços extras.
+    """
+    return " ".join(query.casefold().split())
+
+
+class TTLCache:
+    """
+    Cache LRU com expiração por tempo, seguro para uso entre threads.
+    """
+    def __init__(self, maxsize=1024, ttl=3600, name=None):
+        """
+        Args:
+            maxsize (int): Número máximo de entradas.
+            ttl (float): Tempo de vida (s) de cada entrada. None desativa a expiração.
+            name (str): Nome usado nas métricas (`kosmos_cache_requests_total`).
+                        Se None, o cache não é contabilizado nas métricas.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        """
+        Retorna o valor de `key` ou None se ausente ou expirado.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (self.ttl is None or now - entry[1] <= self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[2]
+                value = entry[0]
+            else:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                value = None
+        if self.name is not None:
+            registry.inc("kosmos_cache_requests_total", cache=self.name,
+                         result="miss" if value is None else "hit")
+        return value
+
+    def put(self, key, value, cost=0.0):
+        """
+        Armazena `value`; `cost` é o tempo (s) gasto para calculá-lo.
+        """
+        with self._lock:
+            self._data[key] = (value, time.monotonic(), cost)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Retorna acertos, falhas, taxa de acerto e latência economizada.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
@@ -3,21 +3,49 @@
 Módulo do motor RAG (Retrieval-Augmented Generation).
 
 Responsabilidades:
-- Gerar embeddings para o texto dos papers usando um modelo apropriado.
-- Indexar os embeddings em um banco de dados vetorial (ChromaDB).
+- Dividir o texto dos papers em chunks (ver `chunker`).
+- Gerar embeddings para o texto dos papers com um backend plugável (ver
+  `embedding_backends`), por exemplo ONNX Runtime ou int8 em CPU.
+- Indexar os embeddings em um banco de dados vetorial (ChromaDB), em lotes
+  grandes e sem reembutir chunks já indexados.
 - Realizar buscas de similaridade para encontrar os trechos mais relevantes
-  para uma dada query.
+  para uma dada query, com cache de embeddings de queries e de resultados.
+- Manter um índice BM25 ao lado do ChromaDB e combinar as buscas lexical e
+  vetorial (reciprocal rank fusion).
+- Opcionalmente, particionar o índice vetorial por categoria ou período (ver
+  `vector_index`), com buscas em paralelo nos shards.
+
+O cliente do ChromaDB e o modelo de embedding só são carregados no primeiro
+uso (ou em `warmup`), o que mantém a inicialização rápida.
 """
 
-import chromadb
-from chromadb.utils import embedding_functions
+import hashlib
 import os
+import threading
+import time
+from bm25_index import BM25Index
+from chunker import TextChunker
+from embedding_backends import backend_from_env, create_backend
+from metrics import registry
+from query_cache import TTLCache, normalize_query
+from startup_timing import startup_timer
+from vector_index import (DEFAULT_COLLECTION, ShardedCollection, describe_index, hnsw_from_env,
+                          load_index_config, open_collection, save_index_config)
+
+
+def content_hash(text):
+    """
+    Hash do conteúdo de um chunk, usado para evitar reembutir texto inalterado.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
 
 class RAGEngine:
     """
     Gerencia a indexação e retrieval de documentos.
     """
-    def __init__(self, embedding_model_name="all-MiniLM-L6-v2", db_path="data/embeddings"):
+    def __init__(self, embedding_model_name="all-MiniLM-L6-v2", db_path="data/embeddings", chunker=None,
+                 embedding_backend=None, partition_by=None, hnsw=None, shard_workers=None):
         """
         Inicializa o motor RAG.
 
@@ -26,23 +54,142 @@ class RAGEngine:
                                         Pode ser um modelo do sentence-transformers ou
                                         integrado com a API da Gemini no futuro.
             db_path (str): Caminho para o armazenamento do ChromaDB.
+            chunker (TextChunker): Chunker usado por `index_text`. Se None, usa
+                                   um `TextChunker` com a configuração padrão.
+            embedding_backend (str | EmbeddingBackend): Backend de embedding, por
+                                   nome (ver `embedding_backends.BACKENDS`) ou
+                                   instância. Se None, é escolhido pelas variáveis
+                                   de ambiente EMBEDDING_* (padrão "torch").
+            partition_by (str): Particionamento de um índice novo: "category",
+                                "year", "month" ou None (uma coleção só). Se
+                                None, usa a variável VECTOR_PARTITION_BY.
+            hnsw (dict): Parâmetros do HNSW de um índice novo (space, M,
+                         ef_construction, ef_search). Se None, usa as
+                         variáveis CHROMA_HNSW_*.
+            shard_workers (int): Threads das buscas em paralelo nos shards.
+
+        Um índice existente segue a configuração gravada em `index_config.json`;
+        para mudá-la, use `python src/vector_index.py rebuild`.
         """
         if not os.path.exists(db_path):
             os.makedirs(db_path)
 
-        self.client = chromadb.PersistentClient(path=db_path)
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model_name
-        )
-        self.collection = self.client.get_or_create_collection(
-            name="arxiv_papers",
-            embedding_function=self.embedding_function
-        )
+        self.db_path = db_path
+        self.embedding_model_name = embedding_model_name
+        self.chunker = chunker or TextChunker()
+        if embedding_backend is None:
+            embedding_backend = backend_from_env(embedding_model_name)
+        elif isinstance(embedding_backend, str):
+            embedding_backend = create_backend(embedding_backend, model_name=embedding_model_name)
+        self.embedding_backend = embedding_backend
+        self.partition_by = partition_by if partition_by is not None else os.getenv("VECTOR_PARTITION_BY") or None
+        self.hnsw = hnsw if hnsw is not None else hnsw_from_env()
+        self.shard_workers = shard_workers
+        self.index_config = None
+        self._client = None
+        self._collection = None
+        self._load_lock = threading.RLock()
+
+        # Índice lexical persistido ao lado do ChromaDB
+        self.lexical_index = BM25Index(os.path.join(db_path, "bm25.sqlite3"))
+
+        # Caches de busca. A versão da coleção entra na chave dos resultados e é
+        # incrementada a cada escrita, invalidando os resultados antigos.
+        self.collection_version = 0
+        self.query_embedding_cache = TTLCache(maxsize=4096, ttl=3600, name="query_embedding")
+        self.retrieval_cache = TTLCache(maxsize=512, ttl=600, name="retrieval")
+        # Funções chamadas com os IDs dos chunks alterados a cada escrita
+        self._change_listeners = []
+
+    @property
+    def client(self):
+        """
+        Cliente persistente do ChromaDB, aberto no primeiro acesso.
+        """
+        if self._client is None:
+            with self._load_lock:
+                if self._client is None:
+                    with startup_timer.span("rag:chromadb_client"):
+                        import chromadb
+                        self._client = chromadb.PersistentClient(path=self.db_path)
+        return self._client
+
+    @property
+    def collection(self):
+        """
+        Coleção de chunks. No primeiro acesso, o índice lexical é reconstruído
+        se estiver vazio e a coleção não (bancos anteriores à busca híbrida).
+        """
+        if self._collection is None:
+            with self._load_lock:
+                if self._collection is None:
+                    self.index_config = self._resolve_index_config()
+                    collection = open_collection(self.client, self.index_config,
+                                                 max_workers=self.shard_workers)
+                    self._collection = collection
+                    if self.lexical_index.count() == 0 and collection.count() > 0:
+                        self.rebuild_lexical_index()
+        return self._collection
+
+    def _resolve_index_config(self):
+        """
+        Lê a configuração do índice ou, em um índice novo, grava a pedida.
+        Bancos anteriores ao particionamento seguem com a coleção única.
+        """
+        requested = {"collection": DEFAULT_COLLECTION, "partition_by": self.partition_by, "hnsw": self.hnsw}
+        config = load_index_config(self.db_path)
+        if config is None:
+            existing = [getattr(collection, "name", collection) for collection in self.client.list_collections()]
+            config = requested
+            if DEFAULT_COLLECTION in existing:
+                config = {"collection": DEFAULT_COLLECTION, "partition_by": None, "hnsw": {}}
+            save_index_config(self.db_path, config)
+        if (config.get("partition_by"), config.get("hnsw") or {}) != (self.partition_by, self.hnsw or {}):
+            if self.partition_by is not None or self.hnsw:
+                print(f"O índice em {self.db_path} usa partition_by={config.get('partition_by')} e "
+                      f"hnsw={config.get('hnsw')}; use `python src/vector_index.py rebuild` para mudar.")
+        return config
+
+    def partitions(self):
+        """
+        Lista as partições do índice vetorial (vazia se ele não for particionado).
+        """
+        if isinstance(self.collection, ShardedCollection):
+            return self.collection.partitions()
+        return []
+
+    def index_info(self):
+        """
+        Configuração do índice vetorial e número de chunks (por partição, se houver).
+        """
+        summary = describe_index(self.collection)
+        return {"config": self.index_config, **summary}
+
+    def warmup(self, background=True):
+        """
+        Carrega o modelo de embedding e abre o ChromaDB antecipadamente,
+        opcionalmente em uma thread, para que a primeira busca não pague esse custo.
+        """
+        if background:
+            threading.Thread(target=self._warmup, name="rag-warmup", daemon=True).start()
+        else:
+            self._warmup()
+
+    def _warmup(self):
+        try:
+            with startup_timer.span("rag:warmup"):
+                self.collection.count()
+                self.embedding_backend.embed(["warmup"])
+        except Exception as e:
+            print(f"Erro ao preparar o motor RAG: {e}")
 
     def index_paper(self, paper_id, text_chunks, metadata_chunks):
         """
         Indexa os chunks de texto de um paper.
 
+        Chunks já indexados com o mesmo conteúdo são ignorados; os demais são
+        inseridos ou atualizados (upsert), então reindexar um paper é seguro.
+
         Args:
             paper_id (str): Identificador único do paper.
             text_chunks (list): Lista de trechos de texto do paper.
@@ -52,40 +199,439 @@ class RAGEngine:
             print(f"Nenhum chunk de texto para indexar para o paper {paper_id}.")
             return
 
-        # Gera IDs únicos para cada chunk
-        chunk_ids = [f"{paper_id}_{i}" for i in range(len(text_chunks))]
+        stats = self.ingest([(paper_id, text_chunks, metadata_chunks)], report=False)
+        if stats["errors"]:
+            print(f"Erro ao indexar o paper {paper_id}.")
+        else:
+            print(f"Paper {paper_id} indexado com {len(text_chunks)} chunks "
+                  f"({stats['chunks_skipped']} já presentes).")
+
+    def ingest(self, papers, batch_size=None, report=True, on_paper=None):
+        """
+        Indexa chunks de muitos papers em lotes grandes de embedding.
+
+        Os chunks de papers consecutivos são agrupados até `batch_size`, os que
+        já estão indexados com o mesmo hash de conteúdo são descartados, e o
+        restante é embutido em uma única chamada ao modelo e gravado com upsert.
+        Chunks de uma indexação anterior de um paper além do número atual de
+        chunks (o paper foi re-chunkado em menos chunks) são removidos.
+
+        Args:
+            papers (iterable): Tuplas (paper_id, text_chunks, metadata_chunks),
+                               por exemplo geradas por `prepare_text`, ou
+                               (paper_id, chunks), com os chunks como um
+                               iterável de pares (texto, metadados) consumido
+                               à medida que os lotes são gravados (ver
+                               `prepare_pages`).
+            batch_size (int): Chunks por lote de embedding. Se None, usa
+                              `64 * número de CPUs`.
+            report (bool): Se True, imprime a vazão ao final.
+            on_paper (callable): Chamado com (paper_id, ok) depois que os lotes
+                                 com os chunks de um paper foram gravados; `ok`
+                                 é False se algum desses lotes falhou.
+
+        Returns:
+            dict: Estatísticas (chunks_total, chunks_indexed, chunks_skipped,
+                  chunks_removed, errors, seconds, chunks_per_sec).
+        """
+        batch_size = batch_size or 64 * (os.cpu_count() or 1)
+        stats = {"chunks_total": 0, "chunks_indexed": 0, "chunks_skipped": 0, "chunks_removed": 0, "errors": 0}
+        started = time.perf_counter()
+
+        batch = []
+        # Papers com chunks no lote atual e papers com algum lote que falhou
+        batch_papers, failed = set(), set()
+        # Papers cujos chunks já estão todos no lote atual ou em lotes gravados
+        finished = []
+
+        def flush():
+            if batch:
+                ids, documents, metadatas = (list(values) for values in zip(*batch))
+                if not self._ingest_batch(ids, documents, metadatas, stats):
+                    failed.update(batch_papers)
+                batch.clear()
+                batch_papers.clear()
+            if finished:
+                self._remove_stale_chunks(dict(finished), stats)
+                if on_paper is not None:
+                    for paper_id, _ in finished:
+                        on_paper(paper_id, paper_id not in failed)
+                finished.clear()
+
+        for paper in papers:
+            paper_id, chunks = paper[0], paper[1] if len(paper) == 2 else zip(paper[1], paper[2])
+            n_chunks = 0
+            for i, (text, metadata) in enumerate(chunks):
+                metadata = dict(metadata)
+                metadata["content_hash"] = content_hash(text)
+                # Gera IDs únicos para cada chunk
+                batch.append((f"{paper_id}_{i}", text, metadata))
+                batch_papers.add(paper_id)
+                n_chunks = i + 1
+                if len(batch) >= batch_size:
+                    flush()
+            finished.append((paper_id, n_chunks))
+        flush()
+
+        stats["seconds"] = time.perf_counter() - started
+        stats["chunks_per_sec"] = stats["chunks_indexed"] / stats["seconds"] if stats["seconds"] else 0.0
+        if report:
+            print(f"Ingestão: {stats['chunks_indexed']} chunks indexados, "
+                  f"{stats['chunks_skipped']} já presentes, {stats['errors']} com erro "
+                  f"em {stats['seconds']:.1f}s ({stats['chunks_per_sec']:.1f} chunks/s).")
+        return stats
+
+    def _ingest_batch(self, ids, documents, metadatas, stats):
+        """
+        Embute e grava um lote, ignorando chunks cujo conteúdo não mudou.
+        Retorna False se o lote falhar.
+        """
+        stats["chunks_total"] += len(ids)
+        try:
+            with registry.span("chroma_get"):
+                existing = self.collection.get(ids=ids, include=["metadatas"])
+            indexed_hashes = {
+                chunk_id: (metadata or {}).get("content_hash")
+                for chunk_id, metadata in zip(existing["ids"], existing["metadatas"])
+            }
+            keep = [
+                i for i, chunk_id in enumerate(ids)
+                if indexed_hashes.get(chunk_id) != metadatas[i]["content_hash"]
+            ]
+            stats["chunks_skipped"] += len(ids) - len(keep)
+            registry.inc("kosmos_chunks_skipped_total", len(ids) - len(keep))
+            if not keep:
+                return True
+            documents = [documents[i] for i in keep]
+            with registry.span("embed", backend=self.embedding_backend.name):
+                embeddings = self.embedding_backend(documents)
+            # O BM25 é gravado antes do ChromaDB: um chunk só é considerado
+            # indexado (e pulado nas próximas ingestões) quando seu hash está no
+            # ChromaDB, então uma falha em qualquer das gravações faz o lote
+            # inteiro ser refeito na próxima vez
+            with registry.span("bm25_add"):
+                self.lexical_index.add_documents([ids[i] for i in keep], documents)
+            with registry.span("chroma_upsert"):
+                self.collection.upsert(
+                    ids=[ids[i] for i in keep],
+                    embeddings=embeddings,
+                    documents=documents,
+                    metadatas=[metadatas[i] for i in keep]
+                )
+            self.collection_version += 1
+            self._notify_change([ids[i] for i in keep])
+            stats["chunks_indexed"] += len(keep)
+            registry.inc("kosmos_chunks_indexed_total", len(keep))
+            return True
+        except Exception as e:
+            stats["errors"] += len(ids)
+            registry.inc("kosmos_errors_total", stage="index")
+            print(f"Erro ao indexar lote de {len(ids)} chunks: {e}")
+            return False
+
+    def _remove_stale_chunks(self, chunk_counts, stats):
+        """
+        Remove os chunks `{paper_id}_{i}` com `i` além do número atual de
+        chunks de cada paper, que sobram quando um paper é re-chunkado em
+        menos chunks.
 
+        Args:
+            chunk_counts (dict): Número de chunks de cada paper (por paper_id).
+        """
+        paper_ids = list(chunk_counts)
+        where = {"paper_id": {"$in": paper_ids}} if len(paper_ids) > 1 else {"paper_id": paper_ids[0]}
         try:
-            self.collection.add(
-                documents=text_chunks,
-                metadatas=metadata_chunks,
-                ids=chunk_ids
-            )
-            print(f"Paper {paper_id} indexado com {len(text_chunks)} chunks.")
+            found = self.collection.get(where=where, include=[])["ids"]
+            stale = []
+            for chunk_id in found:
+                paper_id, _, position = chunk_id.rpartition("_")
+                if paper_id in chunk_counts and position.isdigit() and int(position) >= chunk_counts[paper_id]:
+                    stale.append(chunk_id)
+            if not stale:
+                return
+            self.collection.delete(ids=stale)
+            self.lexical_index.delete_documents(stale)
+            self.collection_version += 1
+            self._notify_change(stale)
+            stats["chunks_removed"] += len(stale)
         except Exception as e:
-            print(f"Erro ao indexar o paper {paper_id}: {e}")
+            print(f"Erro ao remover chunks antigos de {len(paper_ids)} papers: {e}")
 
-    def retrieve(self, query, n_results=5):
+    def delete_paper(self, paper_id):
+        """
+        Remove todos os chunks de um paper, por exemplo de uma versão
+        substituída por outra mais nova.
+
+        Args:
+            paper_id (str): O `paper_id` gravado nos metadados dos chunks.
+
+        Returns:
+            int: Número de chunks removidos.
+        """
+        try:
+            ids = self.collection.get(where={"paper_id": paper_id}, include=[])["ids"]
+            if not ids:
+                return 0
+            self.collection.delete(ids=ids)
+            self.lexical_index.delete_documents(ids)
+            self.collection_version += 1
+            self._notify_change(ids)
+            print(f"Paper {paper_id} removido do índice ({len(ids)} chunks).")
+            return len(ids)
+        except Exception as e:
+            print(f"Erro ao remover o paper {paper_id}: {e}")
+            return 0
+
+    def add_change_listener(self, listener):
+        """
+        Registra uma função chamada com a lista de IDs de chunks inseridos,
+        alterados ou removidos, por exemplo `SemanticResponseCache.invalidate_chunks`.
+        """
+        self._change_listeners.append(listener)
+
+    def _notify_change(self, chunk_ids):
+        for listener in self._change_listeners:
+            try:
+                listener(chunk_ids)
+            except Exception as e:
+                print(f"Erro ao notificar alteração de chunks: {e}")
+
+    def prepare_text(self, paper_id, text, metadata=None):
+        """
+        Divide o texto de um paper em chunks, no formato aceito por `ingest`.
+
+        Args:
+            paper_id (str): Identificador único do paper.
+            text (str): Texto extraído por `ArxivProcessor.extract_text_from_pdf`.
+            metadata (dict): Metadados do paper copiados para todos os chunks
+                             (ex.: title). `paper_id` é incluído automaticamente.
+
+        Returns:
+            tuple: (paper_id, text_chunks, metadata_chunks).
+        """
+        base_metadata = {"paper_id": paper_id}
+        base_metadata.update(metadata or {})
+        text_chunks, metadata_chunks = self.chunker.chunk_text(text, base_metadata)
+        return paper_id, text_chunks, metadata_chunks
+
+    def index_text(self, paper_id, text, metadata=None):
+        """
+        Divide o texto completo de um paper em chunks e os indexa.
+
+        Args:
+            paper_id (str): Identificador único do paper.
+            text (str): Texto extraído por `ArxivProcessor.extract_text_from_pdf`.
+            metadata (dict): Metadados do paper copiados para todos os chunks
+                             (ex.: title). `paper_id` é incluído automaticamente.
+
+        Returns:
+            int: Número de chunks gerados.
+        """
+        _, text_chunks, metadata_chunks = self.prepare_text(paper_id, text, metadata)
+        self.index_paper(paper_id, text_chunks, metadata_chunks)
+        return len(text_chunks)
+
+    def prepare_pages(self, paper_id, pages, metadata=None):
+        """
+        Como `prepare_text`, mas consome um iterável de páginas (ex.:
+        `ArxivProcessor.iter_pages` ou `extract_pages_parallel`). Os chunks são
+        gerados sob demanda, durante o `ingest`, sem montar o texto completo
+        nem a lista de chunks do paper.
+
+        Returns:
+            tuple: (paper_id, chunks), com os chunks como um gerador de pares
+                   (texto, metadados).
+        """
+        base_metadata = {"paper_id": paper_id}
+        base_metadata.update(metadata or {})
+        return paper_id, self.chunker.iter_chunks(pages, base_metadata)
+
+    def index_pages(self, paper_id, pages, metadata=None):
+        """
+        Como `index_text`, mas consome um iterável de páginas, por exemplo
+        `ArxivProcessor.iter_pages`, chunkando cada página assim que é extraída.
+
+        Args:
+            paper_id (str): Identificador único do paper.
+            pages (iterable): Pares (número_da_página, texto_da_página).
+            metadata (dict): Metadados do paper copiados para todos os chunks.
+
+        Returns:
+            int: Número de chunks gerados.
+        """
+        stats = self.ingest([self.prepare_pages(paper_id, pages, metadata)], report=False)
+        if stats["errors"]:
+            print(f"Erro ao indexar o paper {paper_id}.")
+        else:
+            print(f"Paper {paper_id} indexado com {stats['chunks_total']} chunks "
+                  f"({stats['chunks_skipped']} já presentes).")
+        return stats["chunks_total"]
+
+    def embed_query(self, query):
+        """
+        Retorna o embedding de uma query (lista de floats), usando o cache
+        quando possível. O cache guarda os vetores no tipo do backend (float16
+        por padrão).
+        """
+        key = normalize_query(query)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is None:
+            started = time.perf_counter()
+            with registry.span("embed_query", backend=self.embedding_backend.name):
+                embedding = self.embedding_backend.embed([query])[0]
+            self.query_embedding_cache.put(key, embedding, cost=time.perf_counter() - started)
+        return embedding.tolist()
+
+    def embed_queries(self, queries):
+        """
+        Como `embed_query`, para várias queries: as que não estão no cache são
+        embutidas em uma única chamada ao modelo.
+
+        Returns:
+            list: Um embedding (lista de floats) por query.
+        """
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [self.query_embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            started = time.perf_counter()
+            with registry.span("embed_query", backend=self.embedding_backend.name):
+                computed = self.embedding_backend.embed([queries[i] for i in missing])
+            cost = (time.perf_counter() - started) / len(missing)
+            registry.inc("kosmos_query_embedding_batches_total")
+            registry.inc("kosmos_query_embedding_batched_total", len(missing))
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                self.query_embedding_cache.put(keys[i], embedding, cost=cost)
+        return [embedding.tolist() for embedding in embeddings]
+
+    def retrieve(self, query, n_results=5, mode="vector", partitions=None, query_embedding=None):
         """
         Busca os chunks mais relevantes para uma query.
 
+        Resultados para a mesma query normalizada, o mesmo `n_results`, o mesmo
+        modo e a mesma versão da coleção vêm do cache. O dicionário retornado é
+        compartilhado com o cache e não deve ser modificado.
+
         Args:
             query (str): A pergunta ou termo de busca.
             n_results (int): Número de resultados a serem retornados.
+            mode (str): "vector" (apenas ChromaDB), "lexical" (apenas BM25) ou
+                        "hybrid" (fusão das duas listas por reciprocal rank fusion).
+            partitions (list): Restringe a busca a estas partições de um índice
+                               particionado (ex.: ["2023", "2024"]). O BM25 não é
+                               particionado: nos modos "lexical" e "hybrid", os
+                               chunks de outras partições são descartados depois
+                               do ranqueamento.
+            query_embedding (list): Embedding da query já calculado (ex.: por
+                                    `embed_queries`), dispensando `embed_query`.
 
         Returns:
-            dict: Dicionário com os resultados da busca.
+            dict: Dicionário com os resultados da busca, no formato do ChromaDB.
+                  Nos modos "lexical" e "hybrid", `distances` é substituído por
+                  `scores` (maior é melhor).
         """
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"Modo de busca desconhecido: {mode}")
+        if partitions is not None:
+            partitions = tuple(sorted(partitions))
+        key = (normalize_query(query), n_results, mode, partitions, self.collection_version)
+        results = self.retrieval_cache.get(key)
+        if results is not None:
+            return results
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
+            started = time.perf_counter()
+            with registry.span("retrieve", mode=mode):
+                if mode == "vector":
+                    results = self._vector_search(query, n_results, partitions, query_embedding)
+                else:
+                    results = self._fused_search(query, n_results, mode, partitions, query_embedding)
+            self.retrieval_cache.put(key, results, cost=time.perf_counter() - started)
             return results
         except Exception as e:
             print(f"Erro durante a busca: {e}")
             return None
 
+    def _partition_filter(self, partitions):
+        if partitions is None:
+            return {}
+        if not isinstance(self.collection, ShardedCollection):
+            raise ValueError("A busca por partições exige um índice particionado.")
+        return {"partitions": partitions}
+
+    def _vector_search(self, query, n_results, partitions=None, query_embedding=None):
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        with registry.span("chroma_query"):
+            return self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                **self._partition_filter(partitions)
+            )
+
+    def _fused_search(self, query, n_results, mode, partitions=None, query_embedding=None, rrf_k=60):
+        """
+        Busca lexical ou híbrida. No modo híbrido, cada lista contribui com
+        1 / (rrf_k + posição) para a pontuação de cada chunk.
+        """
+        candidates = max(n_results * 4, 20) if mode == "hybrid" or partitions is not None else n_results
+        scores = {}
+        with registry.span("bm25_search"):
+            lexical = self.lexical_index.search(query, candidates)
+        for rank, (chunk_id, _) in enumerate(lexical):
+            scores[chunk_id] = 1.0 / (rrf_k + rank + 1)
+        if mode == "hybrid":
+            vector_ids = self._vector_search(query, candidates, partitions, query_embedding)["ids"][0]
+            for rank, chunk_id in enumerate(vector_ids):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if partitions is None:
+            ranked = ranked[:n_results]
+        found = {"ids": []}
+        if ranked:
+            with registry.span("chroma_get"):
+                found = self.collection.get(ids=ranked, include=["documents", "metadatas"],
+                                            **self._partition_filter(partitions))
+        by_id = {
+            chunk_id: (document, metadata)
+            for chunk_id, document, metadata in zip(found["ids"], found.get("documents", []), found.get("metadatas", []))
+        }
+        # Com partições, os candidatos de fora delas não são encontrados e saem aqui
+        ranked = [chunk_id for chunk_id in ranked if chunk_id in by_id][:n_results]
+        return {
+            "ids": [ranked],
+            "documents": [[by_id[chunk_id][0] for chunk_id in ranked]],
+            "metadatas": [[by_id[chunk_id][1] for chunk_id in ranked]],
+            "scores": [[scores[chunk_id] for chunk_id in ranked]],
+        }
+
+    def rebuild_lexical_index(self, page_size=1000):
+        """
+        Reconstrói o índice BM25 a partir dos documentos do ChromaDB, por
+        exemplo para bancos criados antes da busca híbrida.
+        """
+        print("Reconstruindo o índice lexical a partir do ChromaDB...")
+        self.lexical_index.clear()
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.lexical_index.add_documents(page["ids"], page["documents"])
+            offset += len(page["ids"])
+        self.collection_version += 1
+        print(f"Índice lexical reconstruído com {offset} chunks.")
+
+    def cache_stats(self):
+        """
+        Retorna as estatísticas dos caches de embedding de query e de resultados.
+        """
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "retrieval": self.retrieval_cache.stats(),
+        }
+
 if __name__ == '__main__':
     # Exemplo de uso
     rag = RAGEngine()
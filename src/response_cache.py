@@ -0,0 +1,214 @@
+# src/response_cache.py
+"""
+Cache semântico e persistente das respostas geradas pelo Gemini.
+
+Cada entrada é indexada por (modelo, template do prompt, embedding da query,
+IDs e hash do texto dos chunks recuperados, na ordem em que entraram no
+prompt). Uma consulta é atendida pelo cache quando:
+- o embedding da query é idêntico (acerto exato), ou
+- modelo, template e sequência de chunks (IDs e textos) são os mesmos e a
+  similaridade de cosseno entre os embeddings é maior que o limiar
+  configurado (acerto próximo).
+
+Como o texto dos chunks entra na chave, uma resposta nunca é reaproveitada
+para chunks que mudaram, qualquer que seja o processo que os reescreveu (ex.:
+um worker Celery ou a sincronização noturna). As entradas antigas saem por TTL
+ou por LRU acima do tamanho máximo; `invalidate_chunks` as remove na hora
+quando registrado em `RAGEngine.add_change_listener`.
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from metrics import registry
+
+
+# Versão do esquema (PRAGMA user_version). Bancos com versão anterior são
+# descartados na abertura: até a versão 1, a chave ignorava a ordem dos chunks,
+# e até a versão 2, o texto deles.
+SCHEMA_VERSION = 3
+
+
+def _chunk_key(chunk_ids, documents=None):
+    # A ordem importa: as citações [n] da resposta seguem a posição dos chunks
+    # no prompt, então os mesmos chunks em outra ordem são outra entrada
+    digest = hashlib.sha1("\n".join(chunk_ids).encode("utf-8"))
+    for document in documents or []:
+        digest.update(b"\0" + hashlib.sha1(document.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticResponseCache:
+    """
+    Cache de respostas em SQLite com busca por similaridade de query.
+    """
+    def __init__(self, path="data/cache/responses.sqlite3", similarity_threshold=0.95,
+                 ttl=7 * 24 * 3600, max_entries=10000):
+        """
+        Args:
+            path (str): Caminho do arquivo SQLite.
+            similarity_threshold (float): Similaridade de cosseno mínima para um
+                                          acerto próximo. 1.0 aceita apenas acertos exatos.
+            ttl (float): Tempo de vida (s) das entradas.
+            max_entries (int): Número máximo de entradas.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._conn.executescript(
+                f"""
+                DROP TABLE IF EXISTS response_chunks;
+                DROP TABLE IF EXISTS responses;
+                PRAGMA user_version = {SCHEMA_VERSION};
+                """
+            )
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL,
+                template TEXT NOT NULL,
+                chunk_key TEXT NOT NULL,
+                query_hash TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_key ON responses (model, template, chunk_key);
+            CREATE TABLE IF NOT EXISTS response_chunks (
+                response_id INTEGER NOT NULL REFERENCES responses (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS response_chunks_chunk ON response_chunks (chunk_id);
+            CREATE INDEX IF NOT EXISTS response_chunks_response ON response_chunks (response_id);
+            """
+        )
+        self._conn.execute("PRAGMA foreign_keys=ON")
+
+    def lookup(self, model, template, query_embedding, chunk_ids, documents=None):
+        """
+        Procura uma resposta armazenada.
+
+        Args:
+            model (str): Modelo que gerou a resposta.
+            template (str): Hash do template do prompt.
+            query_embedding (list): Embedding da query.
+            chunk_ids (list): IDs dos chunks, na ordem do prompt.
+            documents (list): Textos dos chunks enviados no prompt. Uma entrada
+                              só é encontrada se os textos forem os mesmos.
+
+        Returns:
+            str: A resposta, ou None se não houver entrada válida.
+        """
+        vector = array("f", query_embedding)
+        query_hash = hashlib.sha1(vector.tobytes()).hexdigest()
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, query_hash, embedding, response FROM responses "
+                "WHERE model = ? AND template = ? AND chunk_key = ? AND created_at >= ?",
+                (model, template, _chunk_key(chunk_ids, documents), now - self.ttl)
+            ).fetchall()
+            best_id, best_response, best_similarity = None, None, -1.0
+            for row_id, row_hash, blob, response in rows:
+                if row_hash == query_hash:
+                    best_id, best_response, best_similarity = row_id, response, 1.0
+                    break
+                similarity = _cosine(vector, array("f", blob))
+                if similarity > best_similarity:
+                    best_id, best_response, best_similarity = row_id, response, similarity
+            if best_id is None or best_similarity < self.similarity_threshold:
+                self.misses += 1
+                registry.inc("kosmos_cache_requests_total", cache="response", result="miss")
+                return None
+            if best_similarity == 1.0:
+                self.exact_hits += 1
+                registry.inc("kosmos_cache_requests_total", cache="response", result="hit")
+            else:
+                self.near_hits += 1
+                registry.inc("kosmos_cache_requests_total", cache="response", result="near_hit")
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE id = ?", (now, best_id))
+            return best_response
+
+    def store(self, model, template, query_embedding, chunk_ids, response, documents=None):
+        """
+        Armazena uma resposta e aplica TTL e tamanho máximo. Os argumentos são
+        os de `lookup`.
+        """
+        vector = array("f", query_embedding)
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO responses (model, template, chunk_key, query_hash, embedding, response, "
+                "created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (model, template, _chunk_key(chunk_ids, documents), hashlib.sha1(vector.tobytes()).hexdigest(),
+                 vector.tobytes(), response, now, now)
+            )
+            # Os chunks são registrados na ordem do prompt, a mesma da chave
+            self._conn.executemany(
+                "INSERT INTO response_chunks (response_id, position, chunk_id) VALUES (?, ?, ?)",
+                ((cursor.lastrowid, position, chunk_id) for position, chunk_id in enumerate(chunk_ids))
+            )
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE id IN (SELECT id FROM responses ORDER BY last_access DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def invalidate_chunks(self, chunk_ids):
+        """
+        Remove as respostas que usaram qualquer um dos chunks informados.
+        Pode ser registrado em `RAGEngine.add_change_listener`; sem isso, as
+        respostas de chunks alterados deixam de ser encontradas (o texto entra
+        na chave), mas só saem do banco por TTL ou LRU.
+        """
+        chunk_ids = list(chunk_ids)
+        with self._lock, self._conn:
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(
+                    f"DELETE FROM responses WHERE id IN (SELECT response_id FROM response_chunks "
+                    f"WHERE chunk_id IN ({placeholders}))",
+                    batch
+                )
+
+    def stats(self):
+        """
+        Retorna acertos (exatos e próximos), falhas e número de entradas.
+        """
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "entries": entries,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,68 @@
+# src/startup_timing.py
+"""
+Medição do tempo de inicialização (cold start) da aplicação.
+
+Os componentes registram trechos nomeados da inicialização no
+`startup_timer` global; o relatório resultante permite acompanhar
+regressões de cold start entre deploys.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+_PROCESS_START = time.perf_counter()
+
+
+class StartupTimer:
+    """
+    Registra a duração de cada etapa de inicialização.
+    Cada etapa é registrada apenas na primeira vez em que ocorre.
+    """
+    def __init__(self):
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        """
+        Mede o bloco `with` como a etapa `name`.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, started - _PROCESS_START)
+
+    def record(self, name, seconds, offset=None):
+        """
+        Registra uma etapa medida externamente.
+        """
+        with self._lock:
+            if name not in self._spans:
+                self._spans[name] = {"seconds": seconds, "offset": offset}
+
+    def report(self):
+        """
+        Retorna as etapas em ordem de início, com duração e instante (s desde o
+        início do processo).
+        """
+        with self._lock:
+            spans = sorted(self._spans.items(), key=lambda item: item[1]["offset"] or 0.0)
+            return {
+                "since_process_start": time.perf_counter() - _PROCESS_START,
+                "spans": [
+                    {"name": name, "seconds": round(span["seconds"], 4),
+                     "started_at": round(span["offset"], 4) if span["offset"] is not None else None}
+                    for name, span in spans
+                ],
+            }
+
+    def print_report(self):
+        report = self.report()
+        print("Tempo de inicialização:")
+        for span in report["spans"]:
+            print(f"  {span['name']}: {span['seconds']:.3f}s")
+
+
+startup_timer = StartupTimer()
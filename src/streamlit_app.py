@@ -10,25 +10,186 @@ Permite ao usuário:
 - Gerar novas hipóteses de pesquisa.
 """
 
+import os
 import streamlit as st
+from metrics import registry, start_exporter, trace
+from startup_timing import startup_timer
 from arxiv_processor import ArxivProcessor
 from rag_engine import RAGEngine
 from gemini_api import GeminiAPI
+from context_packer import ContextPacker
+from ingestion_jobs import FINAL_STATUSES, STAGES, JobManager
+from response_cache import SemanticResponseCache
+from summary_cache import SummaryCache
+
+# Orçamentos de tokens do contexto enviado ao Gemini
+ANSWER_CONTEXT_TOKENS = 3000
+HYPOTHESIS_CONTEXT_TOKENS = 12000
+# Chunks recuperados para a síntese hierárquica (map-reduce) de hipóteses
+SYNTHESIS_CHUNKS = 100
 
 # Inicialização dos componentes (pode ser otimizado com cache do Streamlit)
 @st.cache_resource
 def init_components():
     """Inicializa e retorna os componentes principais da aplicação."""
     st.write("Inicializando componentes... (isso só acontece uma vez)")
-    arxiv_proc = ArxivProcessor()
-    rag_eng = RAGEngine()
+    with startup_timer.span("init:arxiv_processor"):
+        arxiv_proc = ArxivProcessor()
+    with startup_timer.span("init:rag_engine"):
+        rag_eng = RAGEngine()
+    # Respostas em cache são invalidadas quando os chunks que as embasaram mudam
+    with startup_timer.span("init:response_cache"):
+        response_cache = SemanticResponseCache()
+    rag_eng.add_change_listener(response_cache.invalidate_chunks)
     try:
-        gemini_api = GeminiAPI()
+        with startup_timer.span("init:gemini_api"):
+            gemini_api = GeminiAPI(response_cache=response_cache, summary_cache=SummaryCache())
     except ValueError as e:
         st.error(f"Erro de inicialização: {e}")
         st.stop()
+    # Exportador Prometheus opcional (ex.: METRICS_PORT=9108)
+    if os.getenv("METRICS_PORT"):
+        try:
+            start_exporter(int(os.getenv("METRICS_PORT")))
+        except OSError as e:
+            print(f"Não foi possível iniciar o exportador de métricas: {e}")
+    # Modelos pesados são carregados em segundo plano enquanto a página renderiza
+    rag_eng.warmup(background=True)
+    gemini_api.warmup(background=True)
     return arxiv_proc, rag_eng, gemini_api
 
+@st.cache_resource
+def init_job_manager(_arxiv_proc, _rag_eng):
+    """
+    Cria o gerenciador de jobs de ingestão, compartilhado entre sessões. Os
+    jobs continuam rodando mesmo se o navegador se desconectar.
+    """
+    return JobManager.from_env(_arxiv_proc, _rag_eng)
+
+STAGE_LABELS = {"download": "Download", "extract": "Extração", "index": "Indexação"}
+
+def render_job(job_manager, job_id, paper_store=None):
+    """
+    Exibe o progresso de um job de ingestão.
+    Retorna True enquanto o job ainda está em andamento.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return False
+    progress = job["progress"]
+    for stage in STAGES:
+        counts = progress[stage]
+        total = counts["total"] or 1
+        label = f"{STAGE_LABELS[stage]}: {counts['done']}/{counts['total']}"
+        if counts["errors"]:
+            label += f" ({counts['errors']} erros)"
+        st.progress(min(counts["done"] / total, 1.0), text=label)
+
+    if job["status"] not in FINAL_STATUSES:
+        if st.button("Cancelar ingestão"):
+            job_manager.cancel(job_id)
+        return True
+    if job["status"] == "completed":
+        # Com o índice de metadados, a lista inclui os papers de sincronizações anteriores
+        if paper_store is not None:
+            st.session_state.papers_meta = paper_store.list_papers(query=job["query"])
+        else:
+            st.session_state.papers_meta = job["papers"]
+        if job.get("sync"):
+            st.success(f"Sincronização concluída: {len(job['papers'])} papers novos ou atualizados; "
+                       f"{progress['chunks_indexed']} chunks indexados.")
+        elif not job["papers"]:
+            st.warning("Nenhum paper encontrado ou erro no download.")
+        else:
+            st.success(f"{len(job['papers'])} papers baixados; {progress['chunks_indexed']} chunks indexados, "
+                       f"{progress['chunks_skipped']} já presentes.")
+    elif job["status"] == "failed":
+        st.error(f"A ingestão falhou: {job['error']}")
+        if st.button("Tentar novamente"):
+            st.session_state.job_id = job_manager.retry(job_id)
+            # Recarrega a página para voltar a acompanhar o progresso
+            st.rerun()
+    else:
+        st.info("Ingestão cancelada.")
+    return False
+
+def render_ingestion(job_manager, paper_store=None):
+    """
+    Exibe o progresso do job de ingestão da sessão e os papers encontrados.
+
+    Roda como um fragmento (`st.fragment`) que se atualiza sozinho enquanto o
+    job está em andamento, sem reexecutar o resto da página, para não apagar
+    uma resposta ou hipótese já exibida.
+    """
+    had_papers = bool(st.session_state.get("papers_meta"))
+    if 'job_id' in st.session_state:
+        running = render_job(job_manager, st.session_state.job_id, paper_store)
+        if not running and st.session_state.get("ingestion_polling"):
+            # O job terminou, mas `run_every` só é reavaliado em uma execução
+            # completa da página: sem ela, o fragmento continuaria se
+            # atualizando a cada segundo
+            st.session_state.ingestion_polling = False
+            st.rerun(scope="app")
+
+    if st.session_state.get("papers_meta"):
+        st.subheader("Papers Encontrados:")
+        for paper in st.session_state.papers_meta:
+            with st.expander(f"**{paper['title']}**"):
+                st.write(f"**ID:** {paper['id']}")
+                st.write(f"**Autores:** {', '.join(paper['authors'])}")
+                st.write(f"**Publicado:** {paper['published']}")
+                st.write(f"**Resumo:** {paper['summary']}")
+        if not had_papers:
+            # A seção de perguntas só aparece quando há papers: recarrega a
+            # página uma vez (ainda não há resposta na tela para perder)
+            st.rerun()
+
+def render_stream(stream):
+    """
+    Exibe o texto de uma geração em streaming (`GenerationStream`) à medida
+    que chega e, ao final, o tempo até o primeiro token.
+    """
+    placeholder = st.empty()
+    text = ""
+    for part in stream:
+        text += part
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    if getattr(stream, "ttft", None) is not None:
+        st.caption(f"Tempo até o primeiro token: {stream.ttft:.2f}s")
+    return text
+
+def render_packing_report(packed):
+    """
+    Exibe as fontes enviadas ao modelo e o uso do orçamento de tokens.
+    """
+    st.caption(f"Contexto: {packed['tokens_sent']} tokens enviados, {packed['tokens_dropped']} descartados "
+               f"({packed['duplicates_dropped']} duplicatas, {packed['budget_dropped']} fora do orçamento).")
+    with st.expander("Fontes"):
+        for i, citation in enumerate(packed["citations"], start=1):
+            st.write(f"[{i}] {citation}")
+
+def render_synthesis_report(synthesis):
+    """
+    Exibe os papers sintetizados e o custo da síntese hierárquica.
+    """
+    st.caption(f"Síntese: {synthesis['papers']} papers, {synthesis['model_calls']} chamadas ao modelo, "
+               f"{synthesis['cache_hits']} resumos do cache, {synthesis['failed']} falhas, "
+               f"{synthesis['reduce_levels']} rodadas de reduce, "
+               f"{synthesis['tokens_sent']} tokens nas etapas intermediárias.")
+    with st.expander("Fontes"):
+        for i, citation in enumerate(synthesis["citations"], start=1):
+            st.write(f"[{i}] {citation}")
+
+def render_trace(request_trace):
+    """
+    Exibe para onde foi o tempo de uma consulta (spans e contadores).
+    """
+    report = request_trace.to_dict()
+    with st.expander(f"Rastro da consulta ({report['total_ms']:.0f} ms)"):
+        st.dataframe(report["spans"], use_container_width=True)
+        st.json(report["counters"])
+
 def run():
     """
     Executa a aplicação Streamlit.
@@ -37,44 +198,35 @@ def run():
     st.title("🌌 Kosmos-Synesis: RAG para Pesquisa Científica no arXiv")
 
     arxiv_proc, rag_eng, gemini_api = init_components()
+    job_manager = init_job_manager(arxiv_proc, rag_eng)
+
+    with st.sidebar.expander("Estatísticas de cache"):
+        st.json(rag_eng.cache_stats())
+        if gemini_api.response_cache is not None:
+            st.json({"responses": gemini_api.response_cache.stats()})
+    with st.sidebar.expander("Tempo de inicialização"):
+        st.json(startup_timer.report())
+    with st.sidebar.expander("Métricas"):
+        st.json(registry.snapshot())
 
     # --- Seção 1: Busca e Processamento de Papers ---
     st.header("1. Buscar e Processar Papers do arXiv")
     query = st.text_input("Termos de busca para o arXiv (ex: 'quantum computing')", "large language models")
     max_results = st.slider("Número máximo de papers para buscar", 1, 1000, 10)
+    sync = st.checkbox("Apenas novidades desde a última sincronização desta busca",
+                       disabled=arxiv_proc.store is None)
 
     if st.button("Buscar no arXiv"):
-        with st.spinner("Buscando e baixando papers..."):
-            papers_meta = arxiv_proc.search_and_download(query, max_results)
-            st.session_state.papers_meta = papers_meta
-
-            if not papers_meta:
-                st.warning("Nenhum paper encontrado ou erro no download.")
-            else:
-                st.success(f"{len(papers_meta)} papers baixados e prontos para indexação.")
-                # Indexação automática após o download
-                for paper in papers_meta:
-                    text = arxiv_proc.extract_text_from_pdf(paper["filepath"])
-                    if text:
-                        # Simplificação: usando o texto inteiro como um único chunk
-                        # Em um sistema real, o texto seria dividido em chunks menores
-                        rag_eng.index_paper(
-                            paper_id=paper["id"],
-                            text_chunks=[text],
-                            metadata_chunks=[{"paper_id": paper["id"], "title": paper["title"]}]
-                        )
-                st.info("Papers indexados no banco de dados vetorial.")
-
-
-    if 'papers_meta' in st.session_state and st.session_state.papers_meta:
-        st.subheader("Papers Encontrados:")
-        for paper in st.session_state.papers_meta:
-            with st.expander(f"**{paper['title']}**"):
-                st.write(f"**ID:** {paper['id']}")
-                st.write(f"**Autores:** {', '.join(paper['authors'])}")
-                st.write(f"**Publicado:** {paper['published']}")
-                st.write(f"**Resumo:** {paper['summary']}")
+        # Busca, download, extração e indexação rodam como um job em segundo
+        # plano; a página apenas acompanha o progresso
+        st.session_state.job_id = job_manager.submit(query, max_results, sync=sync)
 
+    # Enquanto houver ingestão em andamento, só o fragmento do progresso é
+    # reexecutado a cada segundo
+    job = job_manager.get(st.session_state.job_id) if 'job_id' in st.session_state else None
+    job_running = job is not None and job["status"] not in FINAL_STATUSES
+    st.session_state.ingestion_polling = job_running
+    st.fragment(render_ingestion, run_every=1.0 if job_running else None)(job_manager, arxiv_proc.store)
 
     # --- Seção 2: Query RAG e Geração de Hipóteses ---
     st.header("2. Interagir com os Papers Indexados")
@@ -82,30 +234,58 @@ def run():
         rag_query = st.text_input("Faça uma pergunta sobre os papers acima", "What are the main challenges of LLMs?")
 
         if st.button("Obter Resposta (RAG)"):
-            with st.spinner("Buscando informações e gerando resposta..."):
-                # 1. Retrieval
-                retrieved_results = rag_eng.retrieve(rag_query, n_results=3)
+            with trace("answer") as request_trace:
+                with st.spinner("Buscando informações..."):
+                    # 1. Retrieval
+                    retrieved_results = rag_eng.retrieve(rag_query, n_results=5, mode="hybrid")
                 if not retrieved_results or not retrieved_results['documents'][0]:
                     st.warning("Não foi possível encontrar informações relevantes nos papers indexados.")
                 else:
-                    context_docs = retrieved_results['documents'][0]
-                    # 2. Augmentation + Generation
-                    response = gemini_api.generate_response(rag_query, context_docs)
+                    # 2. Augmentation: deduplicação e orçamento de tokens, com citações
+                    with registry.span("context_pack"):
+                        packed = ContextPacker(max_tokens=ANSWER_CONTEXT_TOKENS).pack(retrieved_results)
+                    # 3. Generation, exibida à medida que é gerada
                     st.markdown("### Resposta Gerada")
-                    st.markdown(response)
+                    render_stream(gemini_api.generate_response(
+                        rag_query, packed["docs"], stream=True,
+                        query_embedding=rag_eng.embed_query(rag_query), chunk_ids=packed["ids"]
+                    ))
+                    render_packing_report(packed)
+            render_trace(request_trace)
 
+        hierarchical = st.checkbox(
+            f"Síntese hierárquica (resume os papers de {SYNTHESIS_CHUNKS} trechos antes de gerar a hipótese)",
+            value=True
+        )
         if st.button("Gerar Nova Hipótese"):
-            with st.spinner("Gerando uma nova hipótese de pesquisa..."):
-                # Modificação: Em vez de usar todos os documentos, recuperamos os mais relevantes para a query.
-                # Isso evita exceder o limite de contexto do modelo.
-                retrieved_results = rag_eng.retrieve(rag_query, n_results=100) # Aumentado para 100 por solicitação
+            with trace("hypothesis") as request_trace:
+                with st.spinner("Buscando trechos relevantes..."):
+                    # Modificação: Em vez de usar todos os documentos, recuperamos os mais relevantes para a query.
+                    # A busca híbrida (BM25 + vetorial) dispensa o over-fetch de 100 chunks.
+                    retrieved_results = rag_eng.retrieve(rag_query, n_results=SYNTHESIS_CHUNKS if hierarchical else 30,
+                                                         mode="hybrid")
                 if not retrieved_results or not retrieved_results['documents'][0]:
                     st.warning("Não foi possível encontrar informações relevantes para gerar uma hipótese.")
+                elif hierarchical:
+                    # Resumos por paper em paralelo (map) e sínteses entre papers (reduce)
+                    with st.spinner("Sintetizando os papers..."):
+                        stream, synthesis = gemini_api.synthesize_hypothesis(
+                            rag_query, retrieved_results, stream=True,
+                            query_embedding=rag_eng.embed_query(rag_query)
+                        )
+                    st.markdown("### Hipótese Gerada")
+                    render_stream(stream)
+                    render_synthesis_report(synthesis)
                 else:
-                    context_docs = retrieved_results['documents'][0]
-                    hypothesis = gemini_api.generate_hypothesis(rag_query, context_docs)
+                    with registry.span("context_pack"):
+                        packed = ContextPacker(max_tokens=HYPOTHESIS_CONTEXT_TOKENS).pack(retrieved_results)
                     st.markdown("### Hipótese Gerada")
-                    st.markdown(hypothesis)
+                    render_stream(gemini_api.generate_hypothesis(
+                        rag_query, packed["docs"], stream=True,
+                        query_embedding=rag_eng.embed_query(rag_query), chunk_ids=packed["ids"]
+                    ))
+                    render_packing_report(packed)
+            render_trace(request_trace)
     else:
         st.info("Busque e processe alguns papers primeiro para poder interagir com eles.")
 
@@ -0,0 +1,109 @@
+# src/summary_cache.py
+"""
+Cache persistente dos resumos intermediários da síntese hierárquica
+(`GeminiAPI.synthesize_context`).
+
+Cada entrada é indexada pelo hash do modelo, do template e do texto de
+entrada do resumo (ex.: os trechos de um paper). Como o texto entra na chave,
+não há invalidação explícita: quando os chunks de um paper mudam, a chave
+muda também, e as entradas antigas saem por TTL ou por LRU.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import registry
+
+
+def summary_key(model, template, text):
+    """
+    Chave de um resumo: hash do modelo, do template do prompt e do texto resumido.
+    """
+    return hashlib.sha1("\0".join((model or "", template, text)).encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """
+    Resumos em SQLite, com TTL e tamanho máximo.
+    """
+    def __init__(self, path="data/cache/summaries.sqlite3", ttl=30 * 24 * 3600, max_entries=50000):
+        """
+        Args:
+            path (str): Caminho do arquivo SQLite.
+            ttl (float): Tempo de vida (s) das entradas.
+            max_entries (int): Número máximo de entradas.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS summaries_access ON summaries (last_access);
+            """
+        )
+
+    def get(self, key):
+        """
+        Retorna o resumo armazenado, ou None.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                registry.inc("kosmos_cache_requests_total", cache="summary", result="miss")
+                return None
+            self.hits += 1
+            registry.inc("kosmos_cache_requests_total", cache="summary", result="hit")
+            with self._conn:
+                self._conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key, summary):
+        """
+        Armazena um resumo e aplica TTL e tamanho máximo.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, summary, now, now)
+            )
+            self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_access DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        """
+        Retorna acertos, falhas e número de entradas.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
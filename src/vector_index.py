@@ -0,0 +1,489 @@
+# src/vector_index.py
+"""
+Índice vetorial particionado sobre o ChromaDB.
+
+Responsabilidades:
+- Dividir os chunks em várias coleções (shards) por categoria do arXiv ou por
+  período de publicação, para que cada grafo HNSW continue pequeno à medida
+  que o corpus cresce.
+- Configurar os parâmetros do HNSW (M, ef de construção e de busca).
+- Consultar os shards em paralelo e mesclar os top-k pela distância.
+- Reconstruir ou compactar um índice offline (`python src/vector_index.py`),
+  por exemplo para mudar o particionamento ou os parâmetros do HNSW, ou para
+  descartar o espaço deixado por chunks removidos.
+
+A configuração de um índice (particionamento e HNSW) fica em
+`index_config.json`, no diretório do ChromaDB. Depois de criado, o índice
+segue essa configuração; mudá-la exige uma reconstrução.
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import registry
+
+DEFAULT_COLLECTION = "arxiv_papers"
+CONFIG_FILE = "index_config.json"
+
+# Metadado de cada chunk usado por cada forma de particionamento
+PARTITIONERS = {
+    "category": ("primary_category", None),
+    "year": ("published", 4),
+    "month": ("published", 7),
+}
+UNKNOWN_PARTITION = "unknown"
+
+_HNSW_KEYS = {
+    "space": "hnsw:space",
+    "M": "hnsw:M",
+    "ef_construction": "hnsw:construction_ef",
+    "ef_search": "hnsw:search_ef",
+}
+_HNSW_ENV = {
+    "space": "CHROMA_HNSW_SPACE",
+    "M": "CHROMA_HNSW_M",
+    "ef_construction": "CHROMA_HNSW_EF_CONSTRUCTION",
+    "ef_search": "CHROMA_HNSW_EF_SEARCH",
+}
+_SEPARATOR = "__"
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9._-]+")
+
+
+def partition_key(partition_by, metadata):
+    """
+    Retorna a partição de um chunk a partir dos seus metadados.
+
+    Ex.: com "year", um chunk com published="2023-05-02T17:59:01+00:00" vai
+    para a partição "2023". Chunks sem o metadado vão para "unknown".
+    """
+    field, length = PARTITIONERS[partition_by]
+    value = (metadata or {}).get(field)
+    if not value:
+        return UNKNOWN_PARTITION
+    value = str(value)[:length] if length else str(value)
+    return _INVALID_NAME_CHARS.sub("-", value)
+
+
+def shard_name(base_name, key):
+    """
+    Nome da coleção do ChromaDB que guarda a partição `key`.
+    """
+    return f"{base_name}{_SEPARATOR}{key}"
+
+
+def hnsw_metadata(hnsw):
+    """
+    Converte os parâmetros do HNSW (space, M, ef_construction, ef_search) nos
+    metadados de coleção do ChromaDB. Retorna None se não houver parâmetros.
+    """
+    metadata = {_HNSW_KEYS[key]: value for key, value in (hnsw or {}).items() if value is not None}
+    return metadata or None
+
+
+def hnsw_from_env():
+    """
+    Lê os parâmetros do HNSW das variáveis de ambiente CHROMA_HNSW_*.
+    """
+    hnsw = {}
+    for key, variable in _HNSW_ENV.items():
+        value = os.getenv(variable)
+        if value:
+            hnsw[key] = value if key == "space" else int(value)
+    return hnsw
+
+
+def load_index_config(db_path):
+    """
+    Lê a configuração do índice em `db_path`, ou None se ainda não existir.
+    """
+    path = os.path.join(db_path, CONFIG_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_index_config(db_path, config):
+    path = os.path.join(db_path, CONFIG_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _is_sequence(values):
+    # O ChromaDB devolve listas na maior parte dos campos, mas arrays do numpy
+    # nos embeddings
+    return values is not None and hasattr(values, "__len__") and not isinstance(values, (str, bytes, dict))
+
+
+def _release_client(client):
+    # O ChromaDB mantém os sistemas abertos em um cache por caminho; liberá-lo
+    # fecha os arquivos do índice antes de movê-lo
+    clear_system_cache = getattr(client, "clear_system_cache", None)
+    if clear_system_cache is not None:
+        clear_system_cache()
+
+
+def _collection_names(client):
+    # list_collections retorna objetos Collection nas versões antigas e nomes nas novas
+    return [getattr(collection, "name", collection) for collection in client.list_collections()]
+
+
+class ShardedCollection:
+    """
+    Conjunto de coleções do ChromaDB com a mesma interface usada pelo
+    `RAGEngine` (count, get, upsert, delete, query).
+
+    As escritas vão para o shard da partição de cada chunk; as leituras e
+    remoções percorrem todos os shards (ou só os de `partitions`), e as
+    buscas consultam os shards em paralelo e mesclam os resultados.
+    """
+    def __init__(self, client, partition_by, base_name=DEFAULT_COLLECTION, metadata=None, max_workers=None):
+        """
+        Args:
+            client: Cliente do ChromaDB.
+            partition_by (str): Forma de particionamento (ver `PARTITIONERS`).
+            base_name (str): Prefixo do nome das coleções.
+            metadata (dict): Metadados de criação das coleções (parâmetros do HNSW).
+            max_workers (int): Threads das buscas em paralelo. Se None, usa o
+                               número de CPUs.
+        """
+        if partition_by not in PARTITIONERS:
+            raise ValueError(f"Particionamento desconhecido: {partition_by}")
+        self.client = client
+        self.partition_by = partition_by
+        self.base_name = base_name
+        self.metadata = metadata
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="shard-query")
+        prefix = base_name + _SEPARATOR
+        for name in _collection_names(client):
+            if name.startswith(prefix):
+                self._shards[name[len(prefix):]] = client.get_collection(name=name, embedding_function=None)
+
+    def partitions(self):
+        """
+        Lista as partições existentes.
+        """
+        with self._lock:
+            return sorted(self._shards)
+
+    def _shard(self, key):
+        with self._lock:
+            collection = self._shards.get(key)
+            if collection is None:
+                collection = self.client.get_or_create_collection(
+                    name=shard_name(self.base_name, key),
+                    embedding_function=None,
+                    metadata=self.metadata
+                )
+                self._shards[key] = collection
+            return collection
+
+    def _selected(self, partitions=None):
+        with self._lock:
+            if partitions is None:
+                return [(key, self._shards[key]) for key in sorted(self._shards)]
+            return [(key, self._shards[key]) for key in sorted(partitions) if key in self._shards]
+
+    def _map(self, function, shards):
+        # Com uma thread só (ou um shard só), o pool apenas somaria a troca de
+        # thread a cada shard
+        if self._max_workers == 1 or len(shards) <= 1:
+            return [function(key, collection) for key, collection in shards]
+        # O contexto é copiado para que os spans de cada shard entrem no
+        # rastro da requisição (ver `metrics.trace`)
+        futures = [self._executor.submit(contextvars.copy_context().run, function, key, collection)
+                   for key, collection in shards]
+        return [future.result() for future in futures]
+
+    def count(self):
+        return sum(collection.count() for _, collection in self._selected())
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        """
+        Grava cada chunk no shard da sua partição. Um chunk cuja partição mudou
+        (ex.: data de publicação corrigida) é removido do shard antigo, para
+        não ficar duplicado. Para isso os demais shards só são consultados
+        (sem carregar documentos ou embeddings), e a remoção só acontece nos
+        shards em que algum dos ids de fato estava.
+        """
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(partition_key(self.partition_by, metadata), []).append(i)
+
+        def remove_moved(key, collection):
+            candidates = [ids[i] for other, positions in groups.items() if other != key for i in positions]
+            if not candidates:
+                return
+            moved = collection.get(ids=candidates, include=[])["ids"]
+            if moved:
+                collection.delete(ids=moved)
+
+        self._map(remove_moved, self._selected())
+        for key, positions in groups.items():
+            self._shard(key).upsert(
+                ids=[ids[i] for i in positions],
+                embeddings=[embeddings[i] for i in positions] if embeddings is not None else None,
+                documents=[documents[i] for i in positions] if documents is not None else None,
+                metadatas=[metadatas[i] for i in positions]
+            )
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None, partitions=None):
+        """
+        Como `Collection.get`. Com `limit`/`offset`, os shards são paginados
+        em sequência, na ordem das partições.
+        """
+        kwargs = {"ids": ids, "where": where}
+        if include is not None:
+            kwargs["include"] = include
+        shards = self._selected(partitions)
+        if (limit is None and offset is None) or ids is not None or where is not None:
+            pages = self._map(lambda key, collection: collection.get(**kwargs), shards)
+            merged = self._merge_pages(pages, include)
+            if limit is not None or offset is not None:
+                stop = (offset or 0) + limit if limit is not None else None
+                merged = {field: values[offset or 0:stop] for field, values in merged.items()}
+            return merged
+
+        pages, skip, remaining = [], offset or 0, limit
+        for _, collection in shards:
+            if remaining is not None and remaining <= 0:
+                break
+            size = collection.count()
+            if skip >= size:
+                skip -= size
+                continue
+            page = collection.get(limit=remaining, offset=skip, **kwargs)
+            skip = 0
+            if remaining is not None:
+                remaining -= len(page["ids"])
+            pages.append(page)
+        return self._merge_pages(pages, include)
+
+    @staticmethod
+    def _merge_pages(pages, include):
+        # Os campos pedidos existem mesmo sem nenhum shard, como no ChromaDB
+        merged = {field: [] for field in ["ids"] + list(include or ["documents", "metadatas"])}
+        for page in pages:
+            for field, values in page.items():
+                if field != "included" and _is_sequence(values):
+                    merged.setdefault(field, []).extend(list(values))
+        return merged
+
+    def delete(self, ids=None, where=None):
+        self._map(lambda key, collection: collection.delete(ids=ids, where=where), self._selected())
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None, partitions=None):
+        """
+        Consulta os shards em paralelo e mescla, para cada query, os
+        `n_results` mais próximos pela distância.
+
+        Os shards devolvem só ids e distâncias. Os demais campos (documentos,
+        metadados...) são lidos depois, apenas dos chunks que entraram no
+        resultado, em vez de `n_results` chunks completos por shard.
+        """
+        include = list(include) if include is not None else ["documents", "metadatas", "distances"]
+        kwargs = {"query_embeddings": query_embeddings, "n_results": n_results, "include": ["distances"]}
+        if where is not None:
+            kwargs["where"] = where
+
+        def query_shard(key, collection):
+            with registry.span("chroma_query_shard", partition=key):
+                return collection.query(**kwargs)
+
+        shards = self._selected(partitions)
+        pages = self._map(query_shard, shards)
+        merged = {"ids": [], "distances": []}
+        owners = {}
+        for q in range(len(query_embeddings)):
+            candidates = sorted(
+                ((distance, chunk_id, key)
+                 for (key, _), page in zip(shards, pages)
+                 for chunk_id, distance in zip(page["ids"][q], page["distances"][q])),
+                key=lambda candidate: candidate[0]
+            )[:n_results]
+            merged["ids"].append([chunk_id for _, chunk_id, _ in candidates])
+            merged["distances"].append([distance for distance, _, _ in candidates])
+            for _, chunk_id, key in candidates:
+                owners.setdefault(key, set()).add(chunk_id)
+
+        fields = [field for field in include if field != "distances"]
+        if fields:
+            def fetch(key, collection):
+                with registry.span("chroma_fetch_shard", partition=key):
+                    return collection.get(ids=sorted(owners[key]), include=fields)
+
+            rows = {}
+            for page in self._map(fetch, [(key, collection) for key, collection in shards if key in owners]):
+                for i, chunk_id in enumerate(page["ids"]):
+                    rows[chunk_id] = [page[field][i] for field in fields]
+            for q, ids in enumerate(merged["ids"]):
+                # Um chunk removido entre as duas leituras sai do resultado
+                kept = [i for i, chunk_id in enumerate(ids) if chunk_id in rows]
+                merged["ids"][q] = [ids[i] for i in kept]
+                merged["distances"][q] = [merged["distances"][q][i] for i in kept]
+            for position, field in enumerate(fields):
+                merged[field] = [[rows[chunk_id][position] for chunk_id in ids] for ids in merged["ids"]]
+        if "distances" not in include:
+            del merged["distances"]
+        return merged
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def open_collection(client, config, max_workers=None):
+    """
+    Abre a coleção (simples ou particionada) descrita por `config`.
+
+    As coleções são abertas sem função de embedding: os embeddings são sempre
+    calculados pelo `RAGEngine` (ver `embedding_backends`) e passados
+    explicitamente em cada escrita e consulta. Assim, o backend não precisa
+    seguir o protocolo `EmbeddingFunction` do ChromaDB nem coincidir com a
+    função gravada na configuração de coleções antigas.
+    """
+    name = config.get("collection", DEFAULT_COLLECTION)
+    metadata = hnsw_metadata(config.get("hnsw"))
+    if config.get("partition_by"):
+        return ShardedCollection(client, config["partition_by"], base_name=name, metadata=metadata,
+                                 max_workers=max_workers)
+    return client.get_or_create_collection(name=name, embedding_function=None, metadata=metadata)
+
+
+def describe_index(collection):
+    """
+    Resume um índice: total de chunks e, se particionado, chunks por partição.
+    """
+    if isinstance(collection, ShardedCollection):
+        shards = {key: shard.count() for key, shard in collection._selected()}
+        return {"partition_by": collection.partition_by, "chunks": sum(shards.values()), "shards": shards}
+    return {"partition_by": None, "chunks": collection.count()}
+
+
+def rebuild_index(db_path, partition_by=None, hnsw=None, output_path=None, page_size=1000):
+    """
+    Copia todos os chunks (com os embeddings já calculados) para um índice
+    novo, com o particionamento e os parâmetros do HNSW informados. Também
+    serve para compactar: reconstruir com a mesma configuração descarta o
+    espaço ocupado por chunks removidos.
+
+    Deve rodar com o índice offline (sem ingestões ou consultas em andamento).
+
+    Args:
+        db_path (str): Diretório do ChromaDB de origem.
+        partition_by (str): Particionamento do novo índice (None para uma coleção só).
+        hnsw (dict): Parâmetros do HNSW do novo índice.
+        output_path (str): Diretório do novo índice. Se None, o índice de
+                           origem é substituído e a versão anterior fica em
+                           `db_path + ".old"`.
+        page_size (int): Chunks copiados por vez.
+
+    Returns:
+        dict: Resumo do novo índice (ver `describe_index`).
+    """
+    import chromadb
+
+    source_config = load_index_config(db_path) or {}
+    target_path = output_path or db_path.rstrip(os.sep) + ".rebuild"
+    if os.path.exists(target_path):
+        raise FileExistsError(f"O diretório de destino já existe: {target_path}")
+    config = {
+        "collection": source_config.get("collection", DEFAULT_COLLECTION),
+        "partition_by": partition_by,
+        "hnsw": hnsw or {},
+    }
+
+    source_client = chromadb.PersistentClient(path=db_path)
+    source = target_client = target = None
+    completed = False
+    os.makedirs(target_path)
+    try:
+        source = open_collection(source_client, source_config)
+        target_client = chromadb.PersistentClient(path=target_path)
+        target = open_collection(target_client, config)
+        copied, offset = 0, 0
+        while True:
+            page = source.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            target.upsert(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"],
+                          metadatas=page["metadatas"])
+            offset += len(page["ids"])
+            copied += len(page["ids"])
+            print(f"{copied} chunks copiados...")
+
+        # O índice lexical não depende do particionamento: só é copiado e compactado
+        lexical_path = os.path.join(db_path, "bm25.sqlite3")
+        if os.path.exists(lexical_path):
+            with sqlite3.connect(lexical_path) as source_db, \
+                    sqlite3.connect(os.path.join(target_path, "bm25.sqlite3")) as target_db:
+                source_db.backup(target_db)
+                target_db.execute("VACUUM")
+        save_index_config(target_path, config)
+        summary = describe_index(target)
+        completed = True
+    finally:
+        for collection in (source, target):
+            if isinstance(collection, ShardedCollection):
+                collection.close()
+        for client in (source_client, target_client):
+            if client is not None:
+                _release_client(client)
+        del source, target, source_client, target_client
+        if not completed:
+            # Um índice parcial bloquearia a próxima tentativa (FileExistsError)
+            print(f"Reconstrução interrompida; removendo o índice parcial em {target_path}.")
+            shutil.rmtree(target_path, ignore_errors=True)
+
+    if output_path is None:
+        old_path = db_path.rstrip(os.sep) + ".old"
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        os.replace(db_path, old_path)
+        os.replace(target_path, db_path)
+        print(f"Índice substituído; a versão anterior está em {old_path}.")
+    print(f"Índice reconstruído com {summary['chunks']} chunks.")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reconstrução e compactação offline do índice vetorial.")
+    parser.add_argument("command", choices=["stats", "rebuild", "compact"],
+                        help="stats: resumo do índice; rebuild: nova configuração; "
+                             "compact: reconstrói com a configuração atual.")
+    parser.add_argument("--db", default=os.getenv("CHROMADB_PATH", "data/embeddings"))
+    parser.add_argument("--partition-by", choices=["none"] + sorted(PARTITIONERS))
+    parser.add_argument("--hnsw-space", choices=["l2", "cosine", "ip"])
+    parser.add_argument("--hnsw-m", type=int)
+    parser.add_argument("--hnsw-ef-construction", type=int)
+    parser.add_argument("--hnsw-ef-search", type=int)
+    parser.add_argument("--output", help="Grava o novo índice neste diretório em vez de substituir o atual.")
+    args = parser.parse_args()
+
+    current = load_index_config(args.db) or {}
+    if args.command == "stats":
+        import chromadb
+        collection = open_collection(chromadb.PersistentClient(path=args.db), current)
+        print(json.dumps({"config": current, **describe_index(collection)}, indent=2))
+    else:
+        partition_by = current.get("partition_by")
+        hnsw = dict(current.get("hnsw") or {})
+        if args.command == "rebuild":
+            if args.partition_by is not None:
+                partition_by = None if args.partition_by == "none" else args.partition_by
+            for key, value in (("space", args.hnsw_space), ("M", args.hnsw_m),
+                               ("ef_construction", args.hnsw_ef_construction),
+                               ("ef_search", args.hnsw_ef_search)):
+                if value is not None:
+                    hnsw[key] = value
+        rebuild_index(args.db, partition_by=partition_by, hnsw=hnsw, output_path=args.output)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos de src/ importam uns aos outros pelo nome (ex.: `from metrics import registry`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
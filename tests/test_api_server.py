@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+from fastapi.testclient import TestClient
+
+from api_server import AdmissionControl, Overloaded, QueryEmbeddingBatcher, create_app
+
+
+class FakeRAG:
+    """
+    Motor de busca falso: embeddings são o tamanho da pergunta e `retrieve`
+    pode ser bloqueado por `gate`.
+    """
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def warmup(self, background=False):
+        pass
+
+    def partitions(self):
+        return []
+
+    def embed_queries(self, queries):
+        self.batches.append(list(queries))
+        return [[float(len(query))] for query in queries]
+
+    def retrieve(self, query, n_results=5, mode="hybrid", partitions=None, query_embedding=None):
+        self.started.set()
+        self.gate.wait(5)
+        return {"ids": [["p1_0"]], "documents": [[query]], "metadatas": [[{"title": "P1"}]],
+                "distances": [[query_embedding[0] if query_embedding else 0.0]]}
+
+
+class FakeGemini:
+    def warmup(self, background=False):
+        pass
+
+
+def test_admission_queues_then_rejects():
+    async def scenario():
+        admission = AdmissionControl(max_concurrent=1, max_queue=1, queue_timeout=1.0)
+        await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        assert (admission.active, admission.waiting) == (1, 1)
+
+        # Fila cheia: recusada sem esperar
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+
+        admission.release()
+        await waiting
+        assert (admission.active, admission.waiting) == (1, 0)
+        admission.release()
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_admission_queue_timeout():
+    async def scenario():
+        admission = AdmissionControl(max_concurrent=1, max_queue=4, queue_timeout=0.01)
+        await admission.acquire()
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+        assert (admission.active, admission.waiting) == (1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_batcher_groups_concurrent_queries():
+    rag = FakeRAG()
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = QueryEmbeddingBatcher(rag, executor, max_batch_size=3, max_wait_ms=50)
+            embeddings = await asyncio.gather(*(batcher.embed("q" * size) for size in range(1, 6)))
+            await batcher.close()
+        return embeddings
+
+    embeddings = asyncio.run(scenario())
+    # Cada pergunta recebe o próprio embedding, em lotes de até `max_batch_size`
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert [len(batch) for batch in rag.batches] == [3, 2]
+
+
+def test_batcher_propagates_errors_and_keeps_running():
+    class FailingRAG(FakeRAG):
+        def embed_queries(self, queries):
+            if queries == ["falha"]:
+                raise RuntimeError("modelo indisponível")
+            return super().embed_queries(queries)
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = QueryEmbeddingBatcher(FailingRAG(), executor, max_wait_ms=0)
+            with pytest.raises(RuntimeError):
+                await batcher.embed("falha")
+            embedding = await batcher.embed("ok")
+            await batcher.close()
+        return embedding
+
+    assert asyncio.run(scenario()) == [2.0]
+
+
+def test_retrieve_endpoint_and_overload():
+    rag = FakeRAG()
+    app = create_app(rag_eng=rag, gemini_api=FakeGemini(), max_concurrent=1, max_queue=0,
+                     queue_timeout=0.5, max_wait_ms=0)
+    with TestClient(app) as client:
+        response = client.post("/retrieve", json={"query": "grafos", "mode": "vector"})
+        assert response.status_code == 200
+        assert response.json()["hits"] == [
+            {"id": "p1_0", "document": "grafos", "metadata": {"title": "P1"}, "distance": 6.0}
+        ]
+
+        # Com a única vaga ocupada e sem fila, a próxima requisição recebe 503
+        rag.gate.clear()
+        rag.started.clear()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            busy = pool.submit(client.post, "/retrieve", json={"query": "lenta", "mode": "lexical"})
+            assert rag.started.wait(5)
+            rejected = client.post("/retrieve", json={"query": "outra", "mode": "lexical"})
+            assert client.get("/health").json()["active"] == 1
+            rag.gate.set()
+            assert busy.result().status_code == 200
+
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == "1"
+        assert client.get("/health").json()["active"] == 0
+        assert client.post("/retrieve", json={"query": ""}).status_code == 422
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import async_gemini
+from async_gemini import AsyncGeminiAPI, AsyncTokenBucket, is_retryable
+from gemini_api import GenerationError
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FlakyModel:
+    """
+    Modelo falso que falha nas `failures` primeiras chamadas.
+    """
+    def __init__(self, failures=0, error=None, latency=0.0):
+        self.failures = failures
+        self.error = error or APIError(503)
+        self.latency = latency
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.calls <= self.failures:
+                raise self.error
+            return type("Response", (), {"text": f"resposta: {prompt}"})()
+        finally:
+            self.active -= 1
+
+
+def client(model, **kwargs):
+    kwargs.setdefault("requests_per_minute", 60000)
+    kwargs.setdefault("base_delay", 0.001)
+    return AsyncGeminiAPI(model=model, **kwargs)
+
+
+def test_is_retryable():
+    assert is_retryable(APIError(429))
+    assert is_retryable(APIError(503))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(APIError(400))
+    assert not is_retryable(ValueError("prompt inválido"))
+
+
+def test_retries_transient_errors_until_success():
+    model = FlakyModel(failures=3)
+    assert asyncio.run(client(model, max_retries=5).generate("p")) == "resposta: p"
+    assert model.calls == 4
+
+
+def test_gives_up_after_max_retries():
+    model = FlakyModel(failures=10)
+    with pytest.raises(APIError):
+        asyncio.run(client(model, max_retries=2).generate("p"))
+    assert model.calls == 3
+
+
+def test_does_not_retry_permanent_errors():
+    model = FlakyModel(failures=1, error=APIError(400))
+    with pytest.raises(APIError):
+        asyncio.run(client(model).generate("p"))
+    assert model.calls == 1
+
+
+def test_backoff_is_exponential_and_capped(monkeypatch):
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(async_gemini.random, "uniform", uniform)
+    asyncio.run(client(FlakyModel(failures=5), max_retries=5, base_delay=1.0, max_delay=5.0).generate("p"))
+    assert bounds == [(0, 1.0), (0, 2.0), (0, 4.0), (0, 5.0), (0, 5.0)]
+
+
+def test_generate_batch_keeps_order_and_returns_errors():
+    class SelectiveModel(FlakyModel):
+        async def generate_content_async(self, prompt):
+            if prompt == "ruim":
+                raise APIError(400)
+            return await super().generate_content_async(prompt)
+
+    results = asyncio.run(client(SelectiveModel()).generate_batch(["a", "ruim", "b"]))
+    assert results[0] == "resposta: a"
+    assert isinstance(results[1], APIError)
+    assert results[2] == "resposta: b"
+
+
+def test_limits_concurrent_calls():
+    model = FlakyModel(latency=0.01)
+    asyncio.run(client(model, max_concurrency=3).generate_batch([str(i) for i in range(20)]))
+    assert model.calls == 20
+    assert model.max_active == 3
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def acquire_all(bucket, n):
+        started = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Rajada dentro da capacidade: sem espera
+    assert asyncio.run(acquire_all(AsyncTokenBucket(rate=20, capacity=5), 5)) < 0.05
+    # Além da capacidade, um token a cada 1/rate segundos
+    assert asyncio.run(acquire_all(AsyncTokenBucket(rate=20, capacity=1), 6)) >= 0.2
+
+
+def test_requests_per_minute_paces_calls():
+    model = FlakyModel()
+    started = time.monotonic()
+    # 1200/min = 20/s com rajada de 20: as 10 chamadas além da rajada levam ~0,5 s
+    asyncio.run(client(model, requests_per_minute=1200).generate_batch([str(i) for i in range(30)]))
+    assert time.monotonic() - started >= 0.45
+
+
+class BlockingModel:
+    """
+    Modelo síncrono (chamado em thread) cuja primeira chamada demora
+    `first_latency` segundos.
+    """
+    def __init__(self, first_latency):
+        self.first_latency = first_latency
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            first = self.calls == 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if first:
+                time.sleep(self.first_latency)
+            return type("Response", (), {"text": f"resposta: {prompt}"})()
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_timed_out_thread_keeps_its_concurrency_slot():
+    model = BlockingModel(first_latency=0.3)
+    started = time.monotonic()
+    result = asyncio.run(client(model, max_concurrency=1, timeout=0.05).generate("p"))
+
+    assert result == "resposta: p"
+    assert model.calls == 2
+    # A nova tentativa só começa quando a thread abandonada termina
+    assert model.max_active == 1
+    assert time.monotonic() - started >= 0.3
+
+
+def test_generate_response_returns_generation_error():
+    failing = client(FlakyModel(failures=1, error=APIError(400)))
+    answer = asyncio.run(failing.generate_response("pergunta", ["[1] contexto"]))
+    assert isinstance(answer, GenerationError)
+
+    hypothesis = asyncio.run(client(FlakyModel(failures=1, error=APIError(400))).generate_hypothesis("t", []))
+    assert isinstance(hypothesis, GenerationError)
+    assert not isinstance(asyncio.run(client(FlakyModel()).generate_response("pergunta", [])), GenerationError)
@@ -0,0 +1,113 @@
+import sqlite3
+
+import pytest
+
+from bm25_index import BM25Index, tokenize
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "bm25.sqlite3")
+
+
+def test_tokenize_keeps_technical_terms():
+    terms = tokenize("The self-attention of GPT-4 in arXiv 2305.12345v2")
+    assert "self-attention" in terms and "self" in terms and "attention" in terms
+    assert "gpt-4" in terms
+    assert "2305.12345v2" in terms and "2305.12345" in terms
+    assert "the" not in terms and "of" not in terms
+
+
+def test_search_ranks_by_bm25(path):
+    index = BM25Index(path)
+    index.add_documents(
+        ["a", "b", "c"],
+        ["transformer attention attention", "transformer convolution", "recurrent networks"]
+    )
+    results = index.search("attention transformer")
+    assert [doc_id for doc_id, _ in results] == ["a", "b"]
+    assert results[0][1] > results[1][1] > 0
+    assert index.search("unrelated") == []
+    assert index.search("the of") == []
+
+
+def test_shorter_documents_score_higher(path):
+    index = BM25Index(path)
+    index.add_documents(["short", "long"], ["graph", "graph " + "filler " * 50])
+    assert [doc_id for doc_id, _ in index.search("graph")] == ["short", "long"]
+
+
+def test_replace_and_delete_update_counts(path):
+    index = BM25Index(path)
+    index.add_documents(["a", "b"], ["alpha beta", "gamma"])
+    index.add_documents(["a"], ["delta"])
+    assert index.count() == 2
+    assert index.search("alpha") == []
+    assert [doc_id for doc_id, _ in index.search("delta")] == ["a"]
+
+    index.delete_documents(["a", "missing"])
+    assert index.count() == 1
+    index.clear()
+    assert index.count() == 0
+    assert index.search("gamma") == []
+
+
+def test_writes_from_another_instance_are_visible(path):
+    # Ex.: a interface lê enquanto um worker Celery indexa no mesmo arquivo
+    reader = BM25Index(path)
+    assert reader.search("quantum") == []
+
+    writer = BM25Index(path)
+    writer.add_documents(["a", "b"], ["quantum error correction", "surface codes"])
+    assert reader.count() == 2
+    assert [doc_id for doc_id, _ in reader.search("quantum")] == ["a"]
+    assert reader.search("quantum") == writer.search("quantum")
+
+    writer.delete_documents(["a"])
+    assert reader.search("quantum") == []
+    assert reader.count() == 1
+
+
+def test_stats_are_computed_for_existing_index(path):
+    index = BM25Index(path)
+    index.add_documents(["a", "b"], ["alpha beta", "gamma"])
+    # Índices anteriores à tabela de totais
+    index._conn.execute("DROP TABLE stats")
+    index._conn.commit()
+
+    reopened = BM25Index(path)
+    assert reopened.count() == 2
+    assert [doc_id for doc_id, _ in reopened.search("gamma")] == ["b"]
+
+
+def test_max_postings_reads_most_frequent_with_exact_idf(path):
+    texts = ["graph " * tf + "filler" for tf in range(1, 6)] + ["other"] * 5
+    doc_ids = [f"d{i}" for i in range(len(texts))]
+    BM25Index(path).add_documents(doc_ids, texts)
+
+    exact = dict(BM25Index(path, max_postings=None).search("graph"))
+    capped = BM25Index(path, max_postings=2).search("graph")
+    assert [doc_id for doc_id, _ in capped] == ["d4", "d3"]
+    # O idf vem do df total, não só dos postings lidos
+    assert all(score == pytest.approx(exact[doc_id]) for doc_id, score in capped)
+
+
+def test_index_without_schema_version_is_migrated(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL) WITHOUT ROWID;
+        CREATE TABLE postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL,
+                               PRIMARY KEY (term, doc_id)) WITHOUT ROWID;
+        INSERT INTO docs VALUES ('a', 2), ('b', 1);
+        INSERT INTO postings VALUES ('alpha', 'a', 1), ('beta', 'a', 1), ('beta', 'b', 1);
+        """
+    )
+    conn.close()
+
+    index = BM25Index(path)
+    assert index.count() == 2
+    assert [doc_id for doc_id, _ in index.search("beta")] == ["b", "a"]
+    index.delete_documents(["a"])
+    assert index.search("alpha") == []
+    assert index._conn.execute("SELECT term, df FROM terms").fetchall() == [("beta", 1)]
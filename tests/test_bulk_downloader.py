@@ -0,0 +1,115 @@
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+from bulk_downloader import BulkDownloader
+
+PDFS = {f"/{i}.pdf": b"%PDF-1.4 " + bytes([i]) * 4096 for i in range(4)}
+
+
+class PDFHandler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        PDFHandler.requests.append(self.path)
+        body = PDFS.get(self.path)
+        if body is None and self.path == "/truncated.pdf":
+            # Anuncia mais bytes do que envia, como uma conexão que caiu no meio
+            self.send_response(200)
+            self.send_header("Content-Length", "10000")
+            self.end_headers()
+            self.wfile.write(b"%PDF-1.4 incompleto")
+            return
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    PDFHandler.requests = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PDFHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def items(url, paths=PDFS):
+    return [(path.strip("/").split(".")[0], url + path, path.strip("/"), path) for path in paths]
+
+
+def test_download_all_records_manifest(tmp_path, server):
+    downloader = BulkDownloader(str(tmp_path), max_workers=2, min_interval=0)
+    results = downloader.download_all(items(server))
+
+    assert [status for _, _, status in results] == ["downloaded"] * len(PDFS)
+    for payload, filepath, _ in results:
+        with open(filepath, "rb") as f:
+            assert f.read() == PDFS[payload]
+        entry = downloader.manifest.get(payload.strip("/").split(".")[0])
+        assert entry["size"] == len(PDFS[payload])
+        assert entry["sha256"] == hashlib.sha256(PDFS[payload]).hexdigest()
+
+
+def test_resume_skips_completed_downloads(tmp_path, server):
+    stop_event = threading.Event()
+
+    def stop_after_first(payload, filepath, status):
+        stop_event.set()
+
+    first = BulkDownloader(str(tmp_path), max_workers=1, min_interval=0)
+    done = first.download_all(items(server), on_result=stop_after_first, stop_event=stop_event)
+    assert 0 < len(done) < len(PDFS)
+
+    # Uma nova execução (novo processo) retoma pelo manifesto em disco
+    PDFHandler.requests = []
+    second = BulkDownloader(str(tmp_path), max_workers=2, min_interval=0)
+    results = second.download_all(items(server))
+    statuses = {payload: status for payload, _, status in results}
+    assert [statuses[payload] for payload, _, _ in done] == ["skipped"] * len(done)
+    assert sorted(PDFHandler.requests) == sorted(set(PDFS) - {payload for payload, _, _ in done})
+
+
+def test_verify_hash_redownloads_corrupted_file(tmp_path, server):
+    downloader = BulkDownloader(str(tmp_path), min_interval=0, verify_hash=True)
+    filepath, status = downloader.download("0", server + "/0.pdf", "0.pdf")
+    assert status == "downloaded"
+    assert downloader.download("0", server + "/0.pdf", "0.pdf")[1] == "skipped"
+
+    # Mesmo tamanho, conteúdo diferente: só o SHA-256 denuncia
+    with open(filepath, "r+b") as f:
+        f.seek(100)
+        f.write(b"X")
+    assert downloader.download("0", server + "/0.pdf", "0.pdf")[1] == "downloaded"
+    with open(filepath, "rb") as f:
+        assert f.read() == PDFS["/0.pdf"]
+
+
+def test_adopts_existing_pdf_without_manifest_entry(tmp_path, server):
+    with open(tmp_path / "1.pdf", "wb") as f:
+        f.write(PDFS["/1.pdf"])
+    downloader = BulkDownloader(str(tmp_path), min_interval=0)
+    assert downloader.download("1", server + "/1.pdf", "1.pdf")[1] == "skipped"
+    assert PDFHandler.requests == []
+    assert downloader.manifest.get("1")["sha256"] == hashlib.sha256(PDFS["/1.pdf"]).hexdigest()
+
+
+def test_incomplete_download_leaves_no_file(tmp_path, server):
+    downloader = BulkDownloader(str(tmp_path), min_interval=0)
+    results = downloader.download_all([("t", server + "/truncated.pdf", "t.pdf", "t")])
+
+    assert results == [("t", None, "error")]
+    assert sorted(os.listdir(tmp_path)) == []
+    assert downloader.manifest.get("t") is None
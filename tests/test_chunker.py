@@ -0,0 +1,66 @@
+import pytest
+
+from chunker import PAGE_SEPARATOR, TextChunker, detect_heading, estimate_tokens
+
+
+def sentence(i, words=4):
+    # Sentenças de `words` palavras mais o ponto final
+    return f"Sentence{i} " + " ".join(["word"] * (words - 1)) + "."
+
+
+def test_detect_heading():
+    assert detect_heading("Introduction") == "Introduction"
+    assert detect_heading("2.1 Related Work:") == "2.1 Related Work"
+    assert detect_heading("3 Proposed Architecture") == "3 Proposed Architecture"
+    assert detect_heading("We study retrieval.") is None
+    assert detect_heading("1 2 3 4 5 6 7 8 Table values") is None
+    assert detect_heading("") is None
+
+
+def test_chunks_respect_budget_and_overlap():
+    chunker = TextChunker(max_tokens=10, overlap_tokens=5, min_tokens=1)
+    text = " ".join(sentence(i) for i in range(6))
+    chunks, metadatas = chunker.chunk_text(text)
+
+    assert all(estimate_tokens(chunk) <= 10 for chunk in chunks)
+    # Cada chunk repete a última sentença do anterior (5 tokens cabem na sobreposição)
+    assert chunks[0] == f"{sentence(0)} {sentence(1)}"
+    assert chunks[1] == f"{sentence(1)} {sentence(2)}"
+    assert [metadata["chunk_index"] for metadata in metadatas] == list(range(len(chunks)))
+    assert all(sentence(i) in " ".join(chunks) for i in range(6))
+
+
+def test_metadata_tracks_sections_pages_and_offsets():
+    text = "Abstract\nWe study retrieval. It works well.\f2 Method\nWe combine BM25 with dense vectors."
+    chunks, metadatas = TextChunker(max_tokens=50, overlap_tokens=5, min_tokens=1).chunk_text(
+        text, {"paper_id": "p"}
+    )
+
+    assert chunks == ["We study retrieval. It works well.", "We combine BM25 with dense vectors."]
+    assert [(metadata["page"], metadata["section"]) for metadata in metadatas] == [
+        (1, "Abstract"), (2, "2 Method")
+    ]
+    assert all(metadata["paper_id"] == "p" for metadata in metadatas)
+    # Os offsets apontam para o texto completo, com as páginas unidas por \f
+    for chunk, metadata in zip(chunks, metadatas):
+        assert text[metadata["char_start"]:metadata["char_end"]] == chunk
+    assert PAGE_SEPARATOR in text[:metadatas[1]["char_start"]]
+
+
+def test_long_sentence_is_split_into_windows():
+    chunker = TextChunker(max_tokens=8, overlap_tokens=2, min_tokens=1)
+    chunks, _ = chunker.chunk_text(" ".join(f"w{i}" for i in range(20)) + ".")
+
+    assert all(estimate_tokens(chunk) <= 8 for chunk in chunks)
+    assert " ".join(chunks).split()[:8] == [f"w{i}" for i in range(8)]
+    assert chunks[-1].endswith("w19.")
+
+
+def test_small_chunks_are_dropped():
+    chunks, _ = TextChunker(max_tokens=50, overlap_tokens=5, min_tokens=8).chunk_text("Introduction\nToo short.")
+    assert chunks == []
+
+
+def test_overlap_must_be_smaller_than_budget():
+    with pytest.raises(ValueError):
+        TextChunker(max_tokens=10, overlap_tokens=10)
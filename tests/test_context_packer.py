@@ -0,0 +1,73 @@
+from chunker import estimate_tokens
+from context_packer import ContextPacker, format_citation
+
+TEXT_A = "Graph neural networks aggregate messages from neighbouring nodes in every layer."
+TEXT_B = "Quantum error correction protects logical qubits with redundant physical qubits."
+
+
+def results(chunks, key="distances"):
+    """
+    Resultado no formato de `RAGEngine.retrieve`: (id, documento, metadados, distância ou score).
+    """
+    return {
+        "ids": [[chunk[0] for chunk in chunks]],
+        "documents": [[chunk[1] for chunk in chunks]],
+        "metadatas": [[chunk[2] for chunk in chunks]],
+        key: [[chunk[3] for chunk in chunks]],
+    }
+
+
+def test_format_citation():
+    metadata = {"title": "Attention", "paper_id": "http://arxiv.org/abs/1706.03762v7", "page": 3,
+                "section": "3 Model"}
+    assert format_citation(metadata) == "Attention, arXiv:1706.03762v7, p. 3, 3 Model"
+    assert format_citation({}) == "fonte desconhecida"
+    assert format_citation(None) == "fonte desconhecida"
+
+
+def test_orders_by_relevance_and_numbers_citations():
+    packed = ContextPacker().pack(results([
+        ("b", TEXT_B, {"title": "B"}, 0.4),
+        ("a", TEXT_A, {"title": "A"}, 0.1),
+    ]))
+    assert packed["ids"] == ["a", "b"]
+    assert packed["docs"][0] == f"[1] (A)\n{TEXT_A}"
+    assert packed["docs"][1].startswith("[2] (B)\n")
+    assert packed["citations"] == ["A", "B"]
+    assert packed["tokens_sent"] == sum(estimate_tokens(doc) for doc in packed["docs"])
+
+    # Com `scores` (busca híbrida), maior é mais relevante
+    scored = ContextPacker().pack(results([("b", TEXT_B, {}, 0.2), ("a", TEXT_A, {}, 0.9)], key="scores"))
+    assert scored["ids"] == ["a", "b"]
+
+
+def test_drops_near_duplicates():
+    overlap = TEXT_A.replace("every layer.", "each layer.")
+    packed = ContextPacker(dedup_threshold=0.6).pack(results([
+        ("a", TEXT_A, {}, 0.1), ("a-overlap", overlap, {}, 0.2), ("b", TEXT_B, {}, 0.3),
+    ]))
+    assert packed["ids"] == ["a", "b"]
+    assert packed["duplicates_dropped"] == 1
+    assert packed["tokens_dropped"] == estimate_tokens(overlap)
+
+
+def test_respects_budget_and_keeps_smaller_later_chunks():
+    long_text = "long " * 60
+    short_text = "Short chunk that still fits."
+    budget = estimate_tokens(f"[1] (A)\n{TEXT_A}") + estimate_tokens(f"[2] (C)\n{short_text}")
+    packed = ContextPacker(max_tokens=budget).pack(results([
+        ("a", TEXT_A, {"title": "A"}, 0.1),
+        ("long", long_text, {"title": "L"}, 0.2),
+        ("short", short_text, {"title": "C"}, 0.3),
+    ]))
+
+    assert packed["ids"] == ["a", "short"]
+    assert packed["tokens_sent"] == budget
+    assert packed["budget_dropped"] == 1
+    assert packed["tokens_dropped"] == estimate_tokens(long_text)
+
+
+def test_empty_results():
+    for empty in (None, {"ids": [[]], "documents": [[]]}):
+        packed = ContextPacker().pack(empty)
+        assert packed["docs"] == [] and packed["tokens_sent"] == 0
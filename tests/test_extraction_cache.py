@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+import extraction_cache
+from extraction_cache import ExtractionCache, read_pages, write_pages
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4 conteudo")
+    return str(path)
+
+
+def test_key_depends_on_content_and_extractor_version(tmp_path, pdf):
+    copy = tmp_path / "copia.pdf"
+    copy.write_bytes(b"%PDF-1.4 conteudo")
+    key = ExtractionCache.key_for(pdf, "pymupdf 1.24")
+
+    assert key == ExtractionCache.key_for(str(copy), "pymupdf 1.24")
+    assert key.endswith("-pymupdf_1.24")
+    assert key != ExtractionCache.key_for(pdf, "pymupdf 1.25")
+    copy.write_bytes(b"%PDF-1.4 outro conteudo")
+    assert key != ExtractionCache.key_for(str(copy), "pymupdf 1.24")
+
+
+@pytest.mark.parametrize("compression", ["gzip", None])
+def test_put_and_get_round_trip(tmp_path, compression):
+    cache = ExtractionCache(str(tmp_path / "cache"), compression=compression)
+    assert cache.get("ab12") is None
+    cache.put("ab12", "página 1\fpágina 2")
+
+    assert cache.get("ab12") == "página 1\fpágina 2"
+    assert list(cache.iter_pages("ab12")) == [(1, "página 1"), (2, "página 2")]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["size_bytes"] == os.path.getsize(cache.entry_path("ab12"))
+
+
+def test_zstd_falls_back_to_gzip_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction_cache, "zstandard", None)
+    cache = ExtractionCache(str(tmp_path / "cache"), compression="zstd")
+    assert cache.compression == "gzip"
+    cache.put("ab12", "texto")
+    assert cache.entry_path("ab12").endswith(".txt.gz")
+    assert cache.get("ab12") == "texto"
+
+    with pytest.raises(ValueError):
+        ExtractionCache(str(tmp_path / "outro"), compression="lz4")
+
+
+def test_corrupted_entry_is_discarded(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"), compression="gzip")
+    cache.put("ab12", "texto")
+    with open(cache.entry_path("ab12"), "wb") as f:
+        f.write(b"isto nao e gzip")
+
+    assert cache.get("ab12") is None
+    assert not os.path.exists(cache.entry_path("ab12"))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"), compression=None, max_bytes=250)
+    for age, key in enumerate(["aa01", "bb02"]):
+        cache.put(key, "x" * 100)
+        # mtimes explícitos: "aa01" é a mais antiga
+        os.utime(cache.entry_path(key), (1000 + age, 1000 + age))
+    cache.get("aa01")  # passa a ser a usada mais recentemente
+
+    cache.put("cc03", "x" * 100)
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") is not None and cache.get("cc03") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] == 200
+
+
+def test_size_is_recomputed_on_open(tmp_path):
+    ExtractionCache(str(tmp_path / "cache"), compression=None).put("ab12", "x" * 100)
+    assert ExtractionCache(str(tmp_path / "cache"), compression=None).stats()["size_bytes"] == 100
+
+
+@pytest.mark.parametrize("compression", ["gzip", None])
+def test_write_pages_streams_pages(tmp_path, compression):
+    path = str(tmp_path / "out" / "paper.txt")
+    pages = ["primeira", "", "terceira " * 50]
+    assert write_pages(path, iter(pages), compression=compression) == (3, sum(map(len, pages)))
+
+    read = list(read_pages(open(path, "rb"), compression=compression, block_size=16))
+    assert read == [(1, "primeira"), (2, ""), (3, "terceira " * 50)]
+    assert [name for name in os.listdir(tmp_path / "out") if name.endswith(".tmp")] == []
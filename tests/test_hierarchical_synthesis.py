@@ -0,0 +1,140 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from chunker import estimate_tokens
+from gemini_api import GeminiAPI
+
+
+class RecordingModel:
+    """
+    Modelo falso que registra os prompts e responde com "síntese <n>"
+    seguido de `response_words` palavras. Prompts que contenham
+    `fail_marker` falham.
+    """
+    model_name = "fake-gemini"
+
+    def __init__(self, fail_marker=None, response_words=0):
+        self.prompts = []
+        self.fail_marker = fail_marker
+        self.response_words = response_words
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        if self.fail_marker and self.fail_marker in prompt:
+            raise ValueError("falha simulada")
+        text = f"síntese {len(self.prompts)}" + " resumo" * self.response_words
+        return type("Response", (), {"text": text})()
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "offline-test")
+    api = GeminiAPI(models_cache_path=None)
+    api.model = RecordingModel()
+    return api
+
+
+def results(chunks):
+    """
+    Resultado no formato de `RAGEngine.retrieve`, na ordem de relevância.
+    """
+    return {
+        "ids": [[chunk_id for chunk_id, _, _ in chunks]],
+        "documents": [[document for _, document, _ in chunks]],
+        "metadatas": [[metadata for _, _, metadata in chunks]],
+    }
+
+
+def test_group_by_paper_orders_papers_by_relevance_and_chunks_by_position():
+    papers = GeminiAPI._group_by_paper(results([
+        ("b_7", "b sete", {"paper_id": "b", "title": "B"}),
+        ("a_2", "a dois", {"paper_id": "a", "title": "A"}),
+        ("b_1", "b um", {"paper_id": "b", "title": "B"}),
+        ("a_10", "a dez", {"paper_id": "a", "title": "A"}),
+        ("b_3", "b três", {"paper_id": "b", "title": "B"}),
+    ]))
+
+    assert [paper["title"] for paper in papers] == ["B", "A"]
+    assert [chunk_id for chunk_id, _ in papers[0]["chunks"]] == ["b_1", "b_3", "b_7"]
+    assert [chunk_id for chunk_id, _ in papers[1]["chunks"]] == ["a_2", "a_10"]
+    # O trecho mais relevante é o primeiro recuperado, não o primeiro do texto
+    assert papers[0]["best_chunk"] == "b sete"
+    assert papers[0]["citation"] == "B, arXiv:b"
+
+
+def test_group_by_paper_without_metadata_uses_chunk_id():
+    papers = GeminiAPI._group_by_paper({"ids": [["2401.00001_1", "2401.00001_0", "x_0"]],
+                                        "documents": [["um", "zero", "x"]]})
+    assert [[chunk_id for chunk_id, _ in paper["chunks"]] for paper in papers] == [
+        ["2401.00001_0", "2401.00001_1"], ["x_0"]
+    ]
+    assert GeminiAPI._group_by_paper({"ids": [[]], "documents": [[]]}) == []
+    assert GeminiAPI._group_by_paper(None) == []
+
+
+def many_papers(n, words=60):
+    # Trechos curtos (abaixo de `min_summary_tokens`) entram sem resumo no map
+    return results([(f"p{i}_0", f"paper{i} " + "palavra " * words, {"paper_id": f"p{i}", "title": f"P{i}"})
+                    for i in range(n)])
+
+
+def test_reduce_groups_notes_within_budget(gemini):
+    synthesis = gemini.synthesize_context("tópico", many_papers(10), min_summary_tokens=10000,
+                                          reduce_tokens=200, max_levels=1)
+    prompts = gemini.model.prompts
+
+    assert synthesis["papers"] == 10
+    assert synthesis["reduce_levels"] == 1
+    assert synthesis["model_calls"] == len(prompts) > 1
+    # Cada nota entra em exatamente um grupo, na ordem, e cada grupo junta ao menos duas
+    seen = [i for prompt in prompts for i in range(10) if f"paper{i} " in prompt]
+    assert seen == list(range(10))
+    counts = [sum(f"paper{i} " in prompt for i in range(10)) for prompt in prompts]
+    assert all(count >= 2 for count in counts)
+    # Os grupos respeitam o orçamento, salvo os de duas notas, o mínimo para combinar
+    note_tokens = estimate_tokens("[1] (P0, arXiv:p0)\npaper0 " + "palavra " * 60)
+    assert all(count == 2 or count * note_tokens <= 200 + note_tokens for count in counts)
+    assert synthesis["docs"] == [f"síntese {n}" for n in range(1, len(prompts) + 1)]
+
+
+def test_reduce_repeats_until_notes_fit(gemini):
+    # Sínteses longas demais para caberem juntas exigem uma segunda rodada
+    gemini.model = RecordingModel(response_words=40)
+    synthesis = gemini.synthesize_context("tópico", many_papers(16), min_summary_tokens=10000,
+                                          reduce_tokens=150, max_levels=5)
+    assert synthesis["reduce_levels"] >= 2
+    assert estimate_tokens("\n\n".join(synthesis["docs"])) <= 150
+    assert synthesis["tokens_dropped"] == 0
+
+
+def test_failed_group_keeps_original_notes(gemini):
+    gemini.model = RecordingModel(fail_marker="paper0 ")
+    synthesis = gemini.synthesize_context("tópico", many_papers(6), min_summary_tokens=10000,
+                                          reduce_tokens=200, max_levels=1)
+
+    assert synthesis["failed"] == 1
+    assert any("paper0 " in doc and "paper1 " in doc for doc in synthesis["docs"])
+
+
+def test_map_summarizes_only_large_papers(gemini):
+    chunks = [("big_0", "grande " * 300, {"paper_id": "big", "title": "Big"}),
+              ("small_0", "pequeno " * 20, {"paper_id": "small", "title": "Small"})]
+    synthesis = gemini.synthesize_context("tópico", results(chunks), min_summary_tokens=100)
+
+    assert synthesis["model_calls"] == 1
+    assert synthesis["docs"][0].startswith("[1] (Big, arXiv:big)\nsíntese 1")
+    assert "pequeno" in synthesis["docs"][1]
+    assert synthesis["ids"] == ["big_0", "small_0"]
+
+
+def test_limiter_is_shared_across_levels_and_calls(gemini):
+    gemini.model = RecordingModel(response_words=40)
+    gemini.synthesize_context("tópico", many_papers(16), min_summary_tokens=10000, reduce_tokens=150, max_levels=5)
+    client = gemini.synthesis_client()
+    semaphore, bucket = client._semaphore, client._bucket
+
+    gemini.synthesize_context("outro", many_papers(6), min_summary_tokens=10000, reduce_tokens=200, max_levels=1)
+    assert gemini.synthesis_client() is client
+    assert (client._semaphore, client._bucket) == (semaphore, bucket)
+    assert client.model is gemini.model
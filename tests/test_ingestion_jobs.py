@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from ingestion_jobs import FINAL_STATUSES, JobManager, LocalJobBackend
+
+
+class FakeProcessor:
+    """
+    Substitui o `ArxivProcessor`: "baixa" `max_results` papers e extrai uma
+    página de cada. As `failures` primeiras buscas falham. `replaces` mapeia
+    o id de um paper ao da versão que ele substitui.
+    """
+    store = None
+
+    def __init__(self, failures=0, gate=None, replaces=None):
+        self.failures = failures
+        self.gate = gate
+        self.replaces = replaces or {}
+        self.searches = 0
+        self.started = threading.Event()
+
+    def search_and_download(self, query, max_results, max_workers=4, on_result=None, stop_event=None):
+        self.searches += 1
+        self.started.set()
+        if self.gate is not None:
+            # Simula um download longo, interrompido pelo cancelamento
+            while not self.gate.wait(0.01):
+                if stop_event is not None and stop_event.is_set():
+                    return []
+        if self.searches <= self.failures:
+            raise ConnectionError("arXiv indisponível")
+        papers = []
+        for i in range(max_results):
+            paper = {"id": f"{query}-{i}", "title": f"Paper {i}", "filepath": f"/tmp/{query}-{i}.pdf"}
+            if paper["id"] in self.replaces:
+                paper["replaces"] = self.replaces[paper["id"]]
+            papers.append(paper)
+            if on_result is not None:
+                on_result("downloaded")
+        return papers
+
+    def extract_pages_parallel(self, filepaths, max_workers=None):
+        for filepath in filepaths:
+            yield filepath, iter([(1, f"texto de {filepath}")])
+
+
+class FakeEngine:
+    """
+    Substitui o `RAGEngine`. A indexação dos papers em `failing` falha.
+    """
+    def __init__(self, failing=()):
+        self.indexed = []
+        self.failing = set(failing)
+        self.events = []
+
+    def prepare_pages(self, paper_id, pages, metadata):
+        return paper_id, [(text, dict(metadata, page=page)) for page, text in pages]
+
+    def ingest(self, papers, on_paper=None):
+        chunks = 0
+        for paper_id, items in papers:
+            chunks += len(list(items))
+            ok = paper_id not in self.failing
+            if ok:
+                self.indexed.append(paper_id)
+            self.events.append(("indexed" if ok else "failed", paper_id))
+            if on_paper is not None:
+                on_paper(paper_id, ok)
+        return {"chunks_indexed": chunks, "chunks_skipped": 0}
+
+    def delete_paper(self, paper_id):
+        self.events.append(("deleted", paper_id))
+
+
+def wait_for(backend, job_id, statuses=FINAL_STATUSES, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = backend.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    pytest.fail(f"Job {job_id} não chegou a {statuses}: {backend.get(job_id)}")
+
+
+def test_submit_runs_pipeline():
+    engine = FakeEngine()
+    backend = LocalJobBackend(FakeProcessor(), engine, retry_delay=0)
+    job = wait_for(backend, backend.submit("llm", 3))
+
+    assert job["status"] == "completed"
+    assert job["attempts"] == 1
+    assert [paper["id"] for paper in job["papers"]] == ["llm-0", "llm-1", "llm-2"]
+    for stage in ("download", "extract", "index"):
+        assert job["progress"][stage] == {"done": 3, "total": 3, "errors": 0}
+    assert job["progress"]["chunks_indexed"] == 3
+    assert engine.indexed == ["llm-0", "llm-1", "llm-2"]
+
+
+def test_retries_failed_attempts():
+    processor = FakeProcessor(failures=2)
+    backend = LocalJobBackend(processor, FakeEngine(), max_attempts=3, retry_delay=0)
+    job = wait_for(backend, backend.submit("llm", 2))
+
+    assert job["status"] == "completed"
+    assert job["attempts"] == 3
+    assert job["error"] is None
+
+
+def test_fails_after_max_attempts():
+    backend = LocalJobBackend(FakeProcessor(failures=5), FakeEngine(), max_attempts=2, retry_delay=0)
+    job = wait_for(backend, backend.submit("llm", 2))
+
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert "arXiv indisponível" in job["error"]
+
+
+def test_cancel_running_job():
+    processor = FakeProcessor(gate=threading.Event())
+    engine = FakeEngine()
+    backend = LocalJobBackend(processor, engine, retry_delay=0)
+    job_id = backend.submit("llm", 2)
+    assert processor.started.wait(5)
+
+    assert backend.cancel(job_id)
+    job = wait_for(backend, job_id)
+    assert job["status"] == "cancelled"
+    assert engine.indexed == []
+
+
+def test_cancel_queued_job_never_runs():
+    gate = threading.Event()
+    processor = FakeProcessor(gate=gate)
+    backend = LocalJobBackend(processor, FakeEngine(), max_concurrent_jobs=1, retry_delay=0)
+    running = backend.submit("primeiro", 1)
+    assert processor.started.wait(5)
+    queued = backend.submit("segundo", 1)
+
+    assert backend.cancel(queued)
+    assert backend.get(queued)["status"] == "cancelled"
+    gate.set()
+    assert wait_for(backend, running)["status"] == "completed"
+    time.sleep(0.05)
+    assert processor.searches == 1
+    assert backend.cancel("desconhecido") is False
+
+
+def test_job_manager_retry_resubmits_same_parameters():
+    manager = JobManager(LocalJobBackend(FakeProcessor(failures=1), FakeEngine(), max_attempts=1, retry_delay=0))
+    first = manager.submit("llm", 2, sync=False)
+    assert wait_for(manager, first)["status"] == "failed"
+
+    second = manager.retry(first)
+    assert second != first
+    job = wait_for(manager, second)
+    assert job["status"] == "completed"
+    assert (job["query"], job["max_results"]) == ("llm", 2)
+    assert [listed["id"] for listed in manager.list_jobs()] == [first, second]
+    with pytest.raises(ValueError):
+        manager.retry("desconhecido")
+
+
+def test_replaced_version_is_deleted_only_after_new_one_is_indexed():
+    processor = FakeProcessor(replaces={"llm-0": "llm-0-antigo", "llm-1": "llm-1-antigo"})
+    engine = FakeEngine(failing={"llm-1"})
+    backend = LocalJobBackend(processor, engine, max_attempts=1, retry_delay=0)
+    job = wait_for(backend, backend.submit("llm", 2))
+
+    assert job["progress"]["index"]["errors"] == 1
+    # A versão anterior de llm-1 continua no índice, pois a nova falhou
+    assert engine.events == [("indexed", "llm-0"), ("deleted", "llm-0-antigo"), ("failed", "llm-1")]
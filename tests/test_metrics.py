@@ -0,0 +1,82 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import MetricsRegistry, start_exporter, trace
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(buckets=(0.1, 1.0))
+
+
+def test_render_counters(registry):
+    registry.inc("kosmos_chunks_indexed_total", 3)
+    registry.inc("kosmos_chunks_indexed_total", 2)
+    registry.inc("kosmos_cache_requests_total", cache="retrieval", result="hit")
+    registry.inc("kosmos_custom_total", path='a"b\\c\nd')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE kosmos_chunks_indexed_total counter" in lines
+    assert "# HELP kosmos_chunks_indexed_total Chunks embutidos e gravados no índice." in lines
+    assert "kosmos_chunks_indexed_total 5" in lines
+    # Rótulos em ordem alfabética
+    assert 'kosmos_cache_requests_total{cache="retrieval",result="hit"} 1' in lines
+    assert 'kosmos_custom_total{path="a\\"b\\\\c\\nd"} 1' in lines
+    # HELP e TYPE uma vez por métrica
+    assert sum(line.startswith("# TYPE kosmos_cache_requests_total") for line in lines) == 1
+
+
+def test_render_histogram_buckets_are_cumulative(registry):
+    for seconds in (0.05, 0.5, 5.0):
+        registry.observe("kosmos_span_seconds", seconds, span="embed")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE kosmos_span_seconds histogram" in lines
+    assert 'kosmos_span_seconds_bucket{span="embed",le="0.1"} 1' in lines
+    assert 'kosmos_span_seconds_bucket{span="embed",le="1.0"} 2' in lines
+    assert 'kosmos_span_seconds_bucket{span="embed",le="+Inf"} 3' in lines
+    assert 'kosmos_span_seconds_count{span="embed"} 3' in lines
+    assert 'kosmos_span_seconds_sum{span="embed"} 5.55' in lines
+
+
+def test_span_counts_errors_and_feeds_trace(registry):
+    with trace("query") as current:
+        with registry.span("retrieve", mode="hybrid"):
+            registry.inc("kosmos_cache_requests_total", cache="retrieval", result="miss")
+        with pytest.raises(RuntimeError):
+            with registry.span("generate"):
+                raise RuntimeError("falha")
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"]['kosmos_errors_total{stage="generate"}'] == 1
+    assert snapshot["spans"]['kosmos_span_seconds{mode="hybrid",span="retrieve"}']["count"] == 1
+    report = current.to_dict()
+    assert [span["name"] for span in report["spans"]] == ["retrieve", "generate"]
+    assert report["spans"][0]["mode"] == "hybrid"
+    assert report["counters"]['kosmos_cache_requests_total{cache="retrieval",result="miss"}'] == 1
+    assert report["total_ms"] >= report["spans"][1]["start_ms"]
+
+    # Fora de um rastro, nada é registrado no rastro anterior
+    registry.inc("kosmos_chunks_indexed_total")
+    assert "kosmos_chunks_indexed_total" not in current.to_dict()["counters"]
+
+
+def test_reset(registry):
+    registry.inc("kosmos_chunks_indexed_total")
+    registry.reset()
+    assert registry.render() == "\n"
+
+
+def test_exporter_serves_metrics():
+    server = start_exporter(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(url + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            response.read()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/outro")
+    finally:
+        server.shutdown()
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from paper_store import PaperStore, split_entry_id
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PaperStore(str(tmp_path / "papers.sqlite3"))
+
+
+def paper(entry_id, published="2024-01-10T00:00:00+00:00", **fields):
+    return dict({"id": entry_id, "title": f"Paper {entry_id}", "summary": "resumo", "authors": ["A. Autor"],
+                 "published": published, "updated": published, "filepath": f"/tmp/{entry_id.split('/')[-1]}.pdf"},
+                **fields)
+
+
+def test_split_entry_id():
+    assert split_entry_id("http://arxiv.org/abs/2305.12345v2") == ("2305.12345", 2)
+    assert split_entry_id("2305.12345") == ("2305.12345", 1)
+    assert split_entry_id("http://arxiv.org/abs/hep-th/9901001v3") == ("hep-th/9901001", 3)
+
+
+def test_record_detects_new_versions(store):
+    assert store.record(paper("http://arxiv.org/abs/2401.00001v1")) == ("new", None)
+    assert store.record(paper("http://arxiv.org/abs/2401.00001v1")) == ("unchanged", None)
+    assert store.record(paper("http://arxiv.org/abs/2401.00001v2", title="Revisado")) == (
+        "new_version", "http://arxiv.org/abs/2401.00001v1"
+    )
+    # Uma versão mais antiga que a registrada é ignorada
+    assert store.record(paper("http://arxiv.org/abs/2401.00001v1")) == ("unchanged", None)
+
+    saved = store.get("2401.00001")
+    assert (saved["version"], saved["title"], saved["authors"]) == (2, "Revisado", ["A. Autor"])
+    assert store.get("http://arxiv.org/abs/2401.00001v1")["id"].endswith("v2")
+    assert store.count() == 1
+
+
+def test_index_status_follows_versions(store):
+    store.record(paper("2401.00001v1"))
+    assert not store.is_indexed("2401.00001v1")
+    store.set_index_status("2401.00001v1", "indexed")
+    assert store.is_indexed("2401.00001v1")
+
+    # A nova versão volta a "pending"; a anterior conta como coberta por ela
+    store.record(paper("2401.00001v2"))
+    assert store.get("2401.00001")["index_status"] == "pending"
+    assert not store.is_indexed("2401.00001v2")
+    store.set_index_status("2401.00001v1", "indexed")  # versão antiga: sem efeito
+    assert not store.is_indexed("2401.00001v2")
+    store.set_index_status("2401.00001v2", "indexed")
+    assert store.is_indexed("2401.00001v1") and store.is_indexed("2401.00001v2")
+
+    with pytest.raises(ValueError):
+        store.set_index_status("2401.00001v2", "done")
+
+
+def test_list_papers_by_query(store):
+    store.record(paper("2401.00001v1", published="2024-01-01T00:00:00+00:00"), query="llm  agents")
+    store.record(paper("2401.00002v1", published="2024-02-01T00:00:00+00:00"), query="llm agents")
+    store.record(paper("2401.00003v1", published="2024-03-01T00:00:00+00:00"), query="graphs")
+
+    assert [listed["paper_id"] for listed in store.list_papers(query="llm agents")] == ["2401.00002", "2401.00001"]
+    assert [listed["paper_id"] for listed in store.list_papers(limit=1)] == ["2401.00003"]
+    assert store.list_papers(query="LLM agents") == []
+
+
+def test_watermark(store):
+    assert store.get_watermark("llm") is None
+    watermark = datetime(2024, 5, 2, 17, 59, tzinfo=timezone.utc)
+    store.set_watermark("llm", watermark)
+    assert store.get_watermark(" llm ") == watermark
+
+    # Sem nova marca d'água (sincronização com falhas), só o horário muda
+    store.set_watermark("llm", None)
+    assert store.get_watermark("llm") == watermark
+    [saved] = store.saved_queries()
+    assert saved["query"] == "llm" and saved["last_sync"] is not None
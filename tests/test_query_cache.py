@@ -0,0 +1,89 @@
+import pytest
+
+from query_cache import TTLCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  What IS\tRAG? ") == "what is rag?"
+
+
+def test_lru_eviction_and_stats():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.put("a", 1, cost=0.5)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" passa a ser a menos usada
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (2, 3, 1)
+    assert stats["saved_seconds"] == pytest.approx(1.0)
+
+
+def test_expired_entries_are_dropped():
+    cache = TTLCache(ttl=-1)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_clear():
+    cache = TTLCache()
+    cache.put("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    numpy = pytest.importorskip("numpy")
+    from embedding_backends import EmbeddingBackend
+    from rag_engine import RAGEngine
+
+    class WordBackend(EmbeddingBackend):
+        """
+        Embedding determinístico: presença de algumas palavras.
+        """
+        vocabulary = ["graph", "quantum", "protein", "galaxy"]
+
+        def __init__(self):
+            super().__init__("words", dtype="float32")
+            self.name = "words"
+
+        def _load(self):
+            return None
+
+        def embed(self, texts):
+            vectors = numpy.array([[1.0 if word in text.lower() else 0.0 for word in self.vocabulary] + [0.1]
+                                   for text in texts], dtype="float32")
+            return vectors / numpy.linalg.norm(vectors, axis=1, keepdims=True)
+
+    monkeypatch.delenv("VECTOR_PARTITION_BY", raising=False)
+    return RAGEngine(db_path=str(tmp_path / "embeddings"), embedding_backend=WordBackend())
+
+
+def ingest(rag, paper_id, text):
+    rag.ingest([rag.prepare_text(paper_id, text, {"title": paper_id})], report=False)
+
+
+def test_retrieval_cache_is_invalidated_by_writes(rag):
+    ingest(rag, "graphs", "Graph neural networks learn on graph structured data with message passing.")
+    first = rag.retrieve("graph networks", n_results=2)
+    assert rag.retrieve("Graph  networks", n_results=2) == first
+    assert rag.retrieval_cache.stats()["hits"] == 1
+
+    # Uma escrita muda `collection_version`, e a mesma query volta ao índice
+    version = rag.collection_version
+    ingest(rag, "more-graphs", "Graph transformers extend attention to graph structured inputs and edges.")
+    assert rag.collection_version > version
+    ids = rag.retrieve("graph networks", n_results=2)["ids"][0]
+    assert rag.retrieval_cache.stats()["hits"] == 1
+    assert any(chunk_id.startswith("more-graphs_") for chunk_id in ids)
+
+    rag.delete_paper("more-graphs")
+    ids = rag.retrieve("graph networks", n_results=2)["ids"][0]
+    assert not any(chunk_id.startswith("more-graphs_") for chunk_id in ids)
+    # O embedding da query continua válido e vem do cache
+    assert rag.query_embedding_cache.stats()["hits"] >= 2
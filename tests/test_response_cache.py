@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from response_cache import SemanticResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticResponseCache(str(tmp_path / "responses.sqlite3"), similarity_threshold=0.95)
+
+
+QUERY = [1.0, 0.0, 0.0]
+DOCS = ["[1] texto do chunk a", "[2] texto do chunk b"]
+
+
+def test_exact_and_near_hits(cache):
+    cache.store("m", "t", QUERY, ["a", "b"], "resposta", documents=DOCS)
+
+    assert cache.lookup("m", "t", QUERY, ["a", "b"], documents=DOCS) == "resposta"
+    assert cache.lookup("m", "t", [0.99, 0.05, 0.0], ["a", "b"], documents=DOCS) == "resposta"
+    assert cache.lookup("m", "t", [0.0, 1.0, 0.0], ["a", "b"], documents=DOCS) is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_key_includes_model_template_and_chunk_order(cache):
+    cache.store("m", "t", QUERY, ["a", "b"], "resposta", documents=DOCS)
+
+    assert cache.lookup("outro", "t", QUERY, ["a", "b"], documents=DOCS) is None
+    assert cache.lookup("m", "outro", QUERY, ["a", "b"], documents=DOCS) is None
+    assert cache.lookup("m", "t", QUERY, ["b", "a"], documents=DOCS[::-1]) is None
+
+
+def test_changed_chunk_text_misses(cache):
+    # Ex.: o paper foi rechunkado por outro processo, sem `invalidate_chunks`
+    cache.store("m", "t", QUERY, ["a", "b"], "resposta", documents=DOCS)
+    assert cache.lookup("m", "t", QUERY, ["a", "b"], documents=[DOCS[0], "[2] texto novo"]) is None
+
+
+def test_invalidate_chunks(cache):
+    cache.store("m", "t", QUERY, ["a", "b"], "r1", documents=DOCS)
+    cache.store("m", "t", QUERY, ["c"], "r2", documents=["[1] c"])
+
+    cache.invalidate_chunks(["b"])
+    assert cache.lookup("m", "t", QUERY, ["a", "b"], documents=DOCS) is None
+    assert cache.lookup("m", "t", QUERY, ["c"], documents=["[1] c"]) == "r2"
+    assert cache.stats()["entries"] == 1
+
+
+def test_ttl_and_max_entries(tmp_path):
+    cache = SemanticResponseCache(str(tmp_path / "r.sqlite3"), max_entries=2)
+    for i in range(3):
+        cache.store("m", "t", QUERY, [str(i)], f"r{i}")
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("m", "t", QUERY, ["0"]) is None
+
+    expired = SemanticResponseCache(str(tmp_path / "e.sqlite3"), ttl=-1)
+    expired.store("m", "t", QUERY, ["a"], "r")
+    assert expired.lookup("m", "t", QUERY, ["a"]) is None
+
+
+def test_old_schema_is_discarded(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    SemanticResponseCache(path).store("m", "t", QUERY, ["a"], "r")
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA user_version = 2")
+
+    assert SemanticResponseCache(path).stats()["entries"] == 0
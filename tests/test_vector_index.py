@@ -0,0 +1,179 @@
+import os
+
+import pytest
+
+import vector_index
+from vector_index import ShardedCollection, partition_key, shard_name
+
+
+class FakeCollection:
+    """
+    Coleção do ChromaDB em memória. Como o ChromaDB, devolve os embeddings
+    em um tipo que não é `list`.
+    """
+    def __init__(self, name, metadata=None):
+        self.name = name
+        self.metadata = metadata
+        self.rows = {}
+        self.deletes = []
+
+    def count(self):
+        return len(self.rows)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        for i, chunk_id in enumerate(ids):
+            self.rows[chunk_id] = (tuple(embeddings[i]), documents[i], metadatas[i])
+
+    def _matches(self, chunk_id, where):
+        return not where or all(self.rows[chunk_id][2].get(key) == value for key, value in where.items())
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None):
+        keys = [key for key in (ids if ids is not None else self.rows) if key in self.rows and self._matches(key, where)]
+        keys = keys[offset or 0:][:limit]
+        page = {"ids": keys, "included": list(include or ["documents", "metadatas"])}
+        fields = {"embeddings": 0, "documents": 1, "metadatas": 2}
+        for field in page["included"]:
+            page[field] = [self.rows[key][fields[field]] for key in keys]
+        if "embeddings" in page:
+            page["embeddings"] = tuple(page["embeddings"])
+        return page
+
+    def delete(self, ids=None, where=None):
+        self.deletes.append(ids)
+        for key in self.get(ids=ids, where=where)["ids"]:
+            del self.rows[key]
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in query_embeddings:
+            scored = sorted((sum((a - b) ** 2 for a, b in zip(query, row[0])), key)
+                            for key, row in self.rows.items() if self._matches(key, where))[:n_results]
+            result["ids"].append([key for _, key in scored])
+            result["documents"].append([self.rows[key][1] for _, key in scored])
+            result["metadatas"].append([self.rows[key][2] for _, key in scored])
+            result["distances"].append([distance for distance, _ in scored])
+        return result
+
+
+class FakeClient:
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, embedding_function=None, metadata=None):
+        assert embedding_function is None
+        return self.collections.setdefault(name, FakeCollection(name, metadata))
+
+    def get_collection(self, name, embedding_function=None):
+        return self.collections[name]
+
+    def list_collections(self):
+        return list(self.collections.values())
+
+
+def chunk(year, position):
+    return {"paper_id": f"p{year}", "published": f"{year}-03-01T00:00:00+00:00", "chunk_index": position}
+
+
+@pytest.fixture
+def sharded():
+    collection = ShardedCollection(FakeClient(), "year", max_workers=2)
+    # Chunk i fica a distância i da origem; os anos se alternam entre 2022 e 2023
+    ids = [f"c{i}" for i in range(8)]
+    collection.upsert(ids=ids, embeddings=[[float(i), 0.0] for i in range(8)],
+                      documents=[f"doc {i}" for i in range(8)],
+                      metadatas=[chunk(2022 + i % 2, i) for i in range(8)])
+    yield collection
+    collection.close()
+
+
+def test_partition_key():
+    assert partition_key("year", {"published": "2023-05-02T17:59:01+00:00"}) == "2023"
+    assert partition_key("month", {"published": "2023-05-02T17:59:01+00:00"}) == "2023-05"
+    assert partition_key("category", {"primary_category": "cs.CL"}) == "cs.CL"
+    assert partition_key("category", {"primary_category": "hep th/x"}) == "hep-th-x"
+    assert partition_key("year", {}) == "unknown"
+
+
+def test_upsert_routes_chunks_to_partitions(sharded):
+    assert sharded.partitions() == ["2022", "2023"]
+    assert sharded.count() == 8
+    shards = sharded.client.collections
+    assert sorted(shards[shard_name("arxiv_papers", "2022")].rows) == ["c0", "c2", "c4", "c6"]
+    assert sorted(shards[shard_name("arxiv_papers", "2023")].rows) == ["c1", "c3", "c5", "c7"]
+
+
+def test_reopening_finds_existing_shards(sharded):
+    reopened = ShardedCollection(sharded.client, "year")
+    assert reopened.partitions() == ["2022", "2023"]
+    assert reopened.count() == 8
+    reopened.close()
+
+
+def test_upsert_moves_chunk_whose_partition_changed(sharded):
+    sharded.upsert(ids=["c0"], embeddings=[[0.0, 0.0]], documents=["doc 0"], metadatas=[chunk(2024, 0)])
+    assert sharded.partitions() == ["2022", "2023", "2024"]
+    assert sharded.count() == 8
+    assert sharded.get(ids=["c0"])["metadatas"][0]["published"].startswith("2024")
+    shards = sharded.client.collections
+    assert shards[shard_name("arxiv_papers", "2022")].deletes == [["c0"]]
+    assert shards[shard_name("arxiv_papers", "2023")].deletes == []
+
+
+def test_upsert_deletes_nothing_when_no_chunk_moved(sharded):
+    sharded.upsert(ids=["c0", "c1", "c8"], embeddings=[[0.0, 0.0]] * 3, documents=["a", "b", "c"],
+                   metadatas=[chunk(2022, 0), chunk(2023, 1), chunk(2023, 8)])
+    assert sharded.count() == 9
+    assert all(not shard.deletes for shard in sharded.client.collections.values())
+
+
+def test_query_merges_top_k_across_shards(sharded):
+    result = sharded.query(query_embeddings=[[0.0, 0.0], [7.0, 0.0]], n_results=3)
+    assert result["ids"] == [["c0", "c1", "c2"], ["c7", "c6", "c5"]]
+    assert result["distances"][0] == [0.0, 1.0, 4.0]
+    assert result["documents"][1] == ["doc 7", "doc 6", "doc 5"]
+
+
+def test_query_restricted_to_partitions(sharded):
+    result = sharded.query(query_embeddings=[[0.0, 0.0]], n_results=3, partitions=["2023"])
+    assert result["ids"] == [["c1", "c3", "c5"]]
+    assert sharded.query(query_embeddings=[[0.0, 0.0]], n_results=3, partitions=["1999"])["ids"] == [[]]
+
+
+def test_get_keeps_array_fields(sharded):
+    page = sharded.get(include=["embeddings", "documents"])
+    assert len(page["embeddings"]) == 8
+    assert sorted(page["ids"]) == [f"c{i}" for i in range(8)]
+
+
+def test_get_pages_through_shards_in_order(sharded):
+    pages = [sharded.get(limit=3, offset=offset)["ids"] for offset in (0, 3, 6)]
+    assert pages == [["c0", "c2", "c4"], ["c6", "c1", "c3"], ["c5", "c7"]]
+    assert sharded.get(where={"paper_id": "p2023"}, limit=2)["ids"] == ["c1", "c3"]
+
+
+def test_delete_reaches_every_shard(sharded):
+    sharded.delete(ids=["c0", "c1"])
+    assert sharded.count() == 6
+    sharded.delete(where={"paper_id": "p2022"})
+    assert sorted(sharded.get()["ids"]) == ["c3", "c5", "c7"]
+
+
+def test_failed_rebuild_removes_partial_index(tmp_path, monkeypatch):
+    chromadb = pytest.importorskip("chromadb")
+    db_path = str(tmp_path / "embeddings")
+    collection = vector_index.open_collection(chromadb.PersistentClient(path=db_path), {})
+    collection.upsert(ids=["c0", "c1"], embeddings=[[0.0, 1.0], [1.0, 0.0]], documents=["a", "b"],
+                      metadatas=[chunk(2022, 0), chunk(2023, 1)])
+
+    def fail(collection):
+        raise RuntimeError("disco cheio")
+
+    monkeypatch.setattr(vector_index, "describe_index", fail)
+    with pytest.raises(RuntimeError):
+        vector_index.rebuild_index(db_path, partition_by="year")
+    assert not os.path.exists(db_path + ".rebuild")
+
+    monkeypatch.undo()
+    summary = vector_index.rebuild_index(db_path, partition_by="year")
+    assert summary == {"partition_by": "year", "chunks": 2, "shards": {"2022": 1, "2023": 1}}
+    assert os.path.exists(db_path + ".old")